@@ -0,0 +1,317 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import contextlib      # for hiding the crawler messages
+import json            # for the result files
+import multiprocessing # for running every case in its own process
+import os              # for path
+import platform        # for the system information
+import random          # for the synthetic corpus
+import re              # for pattern
+import resource        # for the peak memory usage
+import timeit          # for run time
+
+from .patternset     import getPatternSet
+from .scanengine     import CrawlerScanEngine
+
+## --------------------------------------------------------------------------------------------------------------------
+
+# default pattern file of the crawler
+DEFAULT_PATTERN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'pattern.ini')
+
+# ioc samples for the synthetic corpus
+IOC_SAMPLES = [b'http://evil%d.example.com/index.php?id=%d', b'10.%d.3.%d', b'user%d@mail%d.com',
+               b'HKLM\\Software\\Microsoft\\Run%d%d', b'update%d.cdn%d.org']
+
+# corpus profiles - name : (count of files, kind of the data), the size of a profile is set by the user
+CORPUS_PROFILES = {"tiny"   : (4096, "text"),    # many tiny files
+                   "huge"   : (2, "text"),       # few huge files
+                   "binary" : (16, "binary"),    # binary blobs with a few iocs
+                   "dense"  : (64, "dense")}     # ioc dense logs
+
+## --------------------------------------------------------------------------------------------------------------------
+## Creates a deterministic synthetic buffer
+#  @param sizeSrc - size of the buffer in bytes
+#  @param kindSrc - "text" for log like data with iocs, "dense" for lines with several iocs, "binary" for random
+#                   data with a few iocs
+#  @param seedSrc - seed for the random generator
+#  @return bytes
+def createSyntheticBuffer(sizeSrc:int, kindSrc:str="text", seedSrc:int=0) -> bytes:
+    rand   = random.Random(seedSrc)
+    parts  = []
+    length = 0
+    while length < sizeSrc:
+        if kindSrc == "binary":
+            part = rand.getrandbits(4096 * 8).to_bytes(4096, 'little')
+            if rand.random() < 0.1:
+                part += rand.choice(IOC_SAMPLES) % (rand.randint(0, 255), rand.randint(0, 255))
+        elif kindSrc == "dense":
+            part = b' '.join(rand.choice(IOC_SAMPLES) % (rand.randint(0, 255), rand.randint(0, 255)) for x in range(8)) + b'\n'
+        else:
+            part = b'%d-%02d-%02d INFO request from ' % (2021, rand.randint(1, 12), rand.randint(1, 28))
+            part += rand.choice(IOC_SAMPLES) % (rand.randint(0, 255), rand.randint(0, 255)) + b' done\n'
+        parts.append(part)
+        length += len(part)
+    return b''.join(parts)[:sizeSrc]
+# end def createSyntheticBuffer
+
+## Loads and compiles all patterns of a pattern file
+#  @param patternFileSrc - path to the pattern file
+#  @return dict - [KEY - IoC-Type] : VALUE - [List of compiled patterns]
+def loadPatterns(patternFileSrc:str=DEFAULT_PATTERN_FILE) -> dict:
+    patternSet = getPatternSet(patternFileSrc)
+    return patternSet.getPatterns(patternSet.getSections())
+# end def loadPatterns
+
+## Compares the per pattern search loop with the scan engine
+#  - both searches run over the same 32 KB buffers like the crawler
+#  @param patternsSrc - dict with the compiled patterns
+#  @param bufferSrc - data to search
+#  @return dict with the throughput in bytes/sec and the match count of both searches
+def benchScanEngine(patternsSrc:dict, bufferSrc:bytes, blockSizeSrc:int=32384) -> dict:
+    blocks = [bufferSrc[i:i + blockSizeSrc] for i in range(0, len(bufferSrc), blockSizeSrc)]
+    engine = CrawlerScanEngine(patternsSrc)
+
+    ## search every pattern with re.finditer
+    def _legacyLoop():
+        count = 0
+        for block in blocks:
+            for ioc_type in patternsSrc:
+                for pattern in patternsSrc[ioc_type]:
+                    for item in re.finditer(pattern, block):
+                        item.group(0)
+                        count += 1
+        return count
+
+    ## search with the scan engine
+    def _engineLoop():
+        count = 0
+        for block in blocks:
+            for ioc_type, pattern, searchRes in engine.scan(block):
+                for item in searchRes:
+                    item.group(0)
+                    count += 1
+        return count
+
+    result = {}
+    for name, func in (("legacy", _legacyLoop), ("engine", _engineLoop)):
+        start = timeit.default_timer()
+        count = func()
+        duration = timeit.default_timer() - start
+        result[name] = {"bytes/sec": len(bufferSrc) / duration if duration else 0.0, "matches": count}
+    return result
+# end def benchScanEngine
+
+## --------------------------------------------------------------------------------------------------------------------
+## Creates a deterministic synthetic corpus
+#  - the files of a profile are written to dirSrc/<profile>, an existing corpus with the same settings is reused
+#  @param dirSrc - base directory of the corpora
+#  @param profileSrc - name of the profile, see CORPUS_PROFILES
+#  @param sizeSrc - size of the corpus in bytes
+#  @param seedSrc - seed for the random generator
+#  @return dict with the path, the file count and the size of the corpus
+def createCorpus(dirSrc:str, profileSrc:str, sizeSrc:int, seedSrc:int=0) -> dict:
+    fileCount, kind = CORPUS_PROFILES[profileSrc]
+    corpusDir  = os.path.join(dirSrc, profileSrc)
+    markerFile = os.path.join(dirSrc, profileSrc + ".json")
+    fileSize   = max(1, sizeSrc // fileCount)
+    corpus     = {"profile": profileSrc, "path": corpusDir, "files": fileCount, "bytes": fileSize * fileCount,
+                  "seed": seedSrc}
+
+    # reuse the corpus if it was created with the same settings
+    if os.path.exists(markerFile):
+        with open(markerFile, 'r') as f:
+            if json.load(f) == corpus:
+                return corpus
+
+    os.makedirs(corpusDir, exist_ok=True)
+    for index in range(fileCount):
+        # tiny files are spread over several directories like in a file system
+        fileDir = os.path.join(corpusDir, "%03d" %(index // 256))
+        os.makedirs(fileDir, exist_ok=True)
+        with open(os.path.join(fileDir, "%s_%05d.bin" %(kind, index)), 'wb') as f:
+            f.write(createSyntheticBuffer(fileSize, kind, seedSrc * 100003 + index))
+    with open(markerFile, 'w') as f:
+        json.dump(corpus, f)
+    return corpus
+# end def createCorpus
+
+## Creates a deterministic whitelist with the given count of entries
+#  - the entries are built from the ioc samples, so a part of the matches of the corpus is whitelisted
+#  @param fileSrc - path of the whitelist file
+#  @param entriesSrc - count of the whitelist entries
+#  @param seedSrc - seed for the random generator
+def createWhitelist(fileSrc:str, entriesSrc:int, seedSrc:int=0) -> None:
+    rand    = random.Random(seedSrc)
+    entries = {"path" : [], "ip" : [], "domain" : []}
+    for index in range(entriesSrc):
+        kind = index % 3
+        if kind == 0:
+            entries["ip"].append("10.%d.3.%d" %(rand.randint(0, 255), rand.randint(0, 255)))
+        elif kind == 1:
+            entries["domain"].append("*.cdn%d.org" %(rand.randint(0, 255)))
+        else:
+            entries["path"].append("/tmp/not_used_%d" %(index))
+
+    with open(fileSrc, 'w') as f:
+        f.write("## Whitelist of the benchmark\n[WHITELIST_PATH]\n")
+        f.write("path :\n    %s\n\n" %("\n    ".join(entries["path"] or ["/tmp/not_used"])))
+        f.write("[WHITELIST_NETWORK]\n")
+        f.write("ip :\n    %s\n" %("\n    ".join(entries["ip"] or ["0.0.0.0/32"])))
+        f.write("domain :\n    %s\n" %("\n    ".join(entries["domain"] or ["=not.used"])))
+# end def createWhitelist
+
+## Exporter which counts the matches of the crawler
+class _CountingExporter:
+
+    def __init__(self) -> None:
+        self.matches = 0
+
+    def writeResult(self, fileResult) -> None:
+        self.matches += fileResult.getMatchCount()
+
+# end class _CountingExporter
+
+## Runs the crawler in the benchmark process and sends the result to the parent
+#  - the messages of the crawler are hidden
+def _runCase(caseSrc:dict, connSrc) -> None:
+    # imported here, the crawler is not needed for the scan engine benchmark
+    from .crawler import Crawler
+
+    result = {}
+    try:
+        exporter = _CountingExporter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = timeit.default_timer()
+            crawler = Crawler(caseSrc["path"], caseSrc["threads"], caseSrc["pattern"], False, ["path", "ioc", "match", "offset"],
+                              caseSrc["types"], False, 256, caseSrc["whitelist"])
+            crawler.do(exporter, False)
+            duration = timeit.default_timer() - start
+
+        # ru_maxrss is in KB on linux, the workers are finished at the end of do()
+        result = {"seconds"    : duration,
+                  "files"      : crawler.processedFileCount,
+                  "matches"    : exporter.matches,
+                  "whitelisted": crawler.whiteListedMatches,
+                  "rss_main_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  "rss_workers_kb" : resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+                  "stages"     : crawler.stageTimes}
+    except Exception as e:
+        result = {"error": getattr(e, 'msg', getattr(e, 'message', repr(e)))}
+    connSrc.send(result)
+    connSrc.close()
+# end def _runCase
+
+## Runs the crawler over a corpus
+#  - every run is done in a new process, so the peak memory usage is measured for this run only
+#  @param pathSrc - path of the corpus
+#  @param threadsSrc - count of the worker processes
+#  @param patternFileSrc - path of the pattern file
+#  @param typesSrc - list of the used pattern sections
+#  @param whitelistFileSrc - path of the whitelist file or None
+#  @return dict with the run time, the counts and the peak memory usage
+def runCrawler(pathSrc:str, threadsSrc:int, patternFileSrc:str, typesSrc:list, whitelistFileSrc:str=None) -> dict:
+    case = {"path": pathSrc, "threads": threadsSrc, "pattern": patternFileSrc, "types": typesSrc,
+            "whitelist": whitelistFileSrc}
+    parentConn, childConn = multiprocessing.Pipe(False)
+    # not a daemon, the crawler starts its own worker processes
+    process = multiprocessing.Process(target=_runCase, args=(case, childConn), name="CrawlerBenchmark")
+    process.start()
+    childConn.close()
+    try:
+        result = parentConn.recv()
+    except EOFError:
+        result = {"error": "Benchmark process exited with code %s" %(process.exitcode)}
+    process.join()
+    return result
+# end def runCrawler
+
+## Runs the crawler benchmark
+#  - every combination of corpus profile, process count, pattern set and whitelist size is measured
+#  @param dirSrc - directory of the corpora and the whitelists
+#  @param profilesSrc - list of corpus profiles, see CORPUS_PROFILES
+#  @param sizeSrc - size of every corpus in bytes
+#  @param threadsSrc - list of process counts
+#  @param typeSetsSrc - list of pattern sets, every set is a list of pattern sections
+#  @param whitelistSizesSrc - list of whitelist sizes, 0 disables the whitelist
+#  @param callbackSrc - is called with every case result, e.g. for printing the progress
+#  @return dict with the system information and the list of the case results
+def runBenchmark(dirSrc:str, profilesSrc:list, sizeSrc:int, threadsSrc:list, typeSetsSrc:list,
+                 whitelistSizesSrc:list, patternFileSrc:str=DEFAULT_PATTERN_FILE, seedSrc:int=0,
+                 callbackSrc=None) -> dict:
+    results = {"system": {"python"  : platform.python_version(),
+                          "platform": platform.platform(),
+                          "cpus"    : os.cpu_count()},
+               "settings": {"size": sizeSrc, "seed": seedSrc, "pattern": patternFileSrc},
+               "cases": []}
+
+    whitelists = {}
+    for entries in whitelistSizesSrc:
+        whitelists[entries] = None
+        if entries > 0:
+            whitelists[entries] = os.path.join(dirSrc, "whitelist_%d.ini" %(entries))
+            createWhitelist(whitelists[entries], entries, seedSrc)
+
+    for profile in profilesSrc:
+        corpus = createCorpus(dirSrc, profile, sizeSrc, seedSrc)
+        for threads in threadsSrc:
+            for types in typeSetsSrc:
+                for entries in whitelistSizesSrc:
+                    case = {"profile": profile, "threads": threads, "types": ",".join(types), "whitelist": entries}
+                    run = runCrawler(corpus["path"], threads, patternFileSrc, types, whitelists[entries])
+                    if "error" not in run:
+                        seconds = run["seconds"] or 1e-9
+                        run["mb/s"]      = corpus["bytes"] / seconds / 1024 / 1024
+                        run["files/s"]   = run["files"] / seconds
+                        run["matches/s"] = run["matches"] / seconds
+                    case.update(run)
+                    results["cases"].append(case)
+                    if callbackSrc:
+                        callbackSrc(case)
+                # end for
+            # end for
+        # end for
+    # end for
+    return results
+# end def runBenchmark
+
+## Writes benchmark results to a json file
+def saveResults(fileSrc:str, resultsSrc:dict) -> None:
+    with open(fileSrc, 'w') as f:
+        json.dump(resultsSrc, f, indent=2)
+
+## Reads benchmark results from a json file
+def loadResults(fileSrc:str) -> dict:
+    with open(fileSrc, 'r') as f:
+        return json.load(f)
+
+## Compares the throughput of two benchmark runs
+#  - the cases are matched by profile, process count, pattern set and whitelist size
+#  @param oldSrc - results of the previous run
+#  @param newSrc - results of the current run
+#  @return list of tuples (case key, old MB/s, new MB/s, change in percent)
+def compareResults(oldSrc:dict, newSrc:dict) -> list:
+    ## key of a case
+    def _key(case):
+        return "%s threads=%d types=%s whitelist=%d" %(case["profile"], case["threads"], case["types"], case["whitelist"])
+
+    oldCases   = {_key(case): case for case in oldSrc["cases"] if "mb/s" in case}
+    comparison = []
+    for case in newSrc["cases"]:
+        key = _key(case)
+        if key in oldCases and "mb/s" in case:
+            oldValue = oldCases[key]["mb/s"]
+            change   = (case["mb/s"] - oldValue) / oldValue * 100 if oldValue else 0.0
+            comparison.append((key, oldValue, case["mb/s"], change))
+    return comparison
+# end def compareResults
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    patterns = loadPatterns()
+    for kind in ("text", "binary"):
+        result = benchScanEngine(patterns, createSyntheticBuffer(8 * 1024 * 1024, kind))
+        print("[+] %s corpus" %(kind))
+        for name in result:
+            print(" |- %s: %.2f MB/s, %d matches" %(name, result[name]["bytes/sec"] / 1024 / 1024, result[name]["matches"]))
@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import hashlib         # for the pattern fingerprint
+import json            # for the match serialization
+import os              # for pid
+import sqlite3         # for the cache database
+import time            # for the eviction
+import zlib            # for the match compression
+
+from .crawlererr import CrawlerConfigError
+
+## --------------------------------------------------------------------------------------------------------------------
+
+# version of the cache format, it is part of the fingerprint
+CACHE_VERSION      = 1
+
+# default max size of the cache in MB
+CACHE_DEFAULT_SIZE = 1024
+
+## --------------------------------------------------------------------------------------------------------------------
+## Persistent result cache
+#  The cache stores the matches of a file range before whitelisting, so a changed whitelist is applied to the cached
+#  matches without reading the file again. An entry is only used if the path, the range, the size, the modification
+#  time, the inode and the fingerprint of the pattern are the same. Large files are split at fixed offsets if the
+#  cache is used, so the ranges do not depend on the process count (see Crawler._createBlocks).
+#
+#  Every process opens its own database connection. The entries of a process are collected and written in one
+#  transaction, so the processes do not block each other while scanning.
+class CrawlerResultCache:
+
+    ## constructor
+    #  - creates the cache database if it does not exist
+    #  @param cacheFileSrc - path of the cache database
+    #  @param fingerprintSrc - fingerprint of the pattern, see getPatternFingerprint
+    #  @param maxSizeSrc - max size of the cached matches in MB
+    def __init__(self, cacheFileSrc:str, fingerprintSrc:str, maxSizeSrc:int=CACHE_DEFAULT_SIZE) -> None:
+        self.cacheFile   = cacheFileSrc
+        self.fingerprint = fingerprintSrc
+        self.maxSize     = maxSizeSrc * 1024 * 1024
+        self.connection  = None
+        self.pid         = None
+        self.pending     = []
+
+        try:
+            connection = sqlite3.connect(self.cacheFile)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS results (path TEXT, start INTEGER, end INTEGER, "
+                               "size INTEGER, mtime INTEGER, inode INTEGER, fingerprint TEXT, data BLOB, "
+                               "dataSize INTEGER, lastUsed REAL, PRIMARY KEY (path, start, end, fingerprint))")
+            connection.commit()
+            connection.close()
+        except sqlite3.Error as e:
+            raise CrawlerConfigError("Cache file %s: %s" %(cacheFileSrc, getattr(e, 'message', repr(e))))
+    # end init
+
+    ## Returns the connection of the current process
+    def _getConnection(self) -> sqlite3.Connection:
+        if self.connection is None or self.pid != os.getpid():
+            self.connection = sqlite3.connect(self.cacheFile, timeout=60)
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.pid = os.getpid()
+            self.pending = []
+        return self.connection
+
+    ## Returns the cached entry of a file range
+    #  @param fileStatSrc - os.stat_result of the file
+    #  @return dict with the matches (list of [ioc type, match, offset]) and the count of matches above the max
+    #          match size. None if there is no valid entry.
+    def lookup(self, pathSrc:str, startSrc:int, endSrc:int, fileStatSrc) -> dict:
+        row = self._getConnection().execute("SELECT size, mtime, inode, data FROM results WHERE path=? AND start=? AND end=? "
+                                            "AND fingerprint=?", (pathSrc, startSrc, endSrc, self.fingerprint)).fetchone()
+        if row is None:
+            return None
+        if row[0] != fileStatSrc.st_size or row[1] != fileStatSrc.st_mtime_ns or row[2] != fileStatSrc.st_ino:
+            return None
+        self.pending.append(("UPDATE results SET lastUsed=? WHERE path=? AND start=? AND end=? AND fingerprint=?",
+                             (time.time(), pathSrc, startSrc, endSrc, self.fingerprint)))
+        return json.loads(zlib.decompress(row[3]))
+    # end def lookup
+
+    ## Adds an entry for a file range, the entry is written with flush()
+    #  @param entrySrc - dict with the matches and the count of matches above the max match size
+    def store(self, pathSrc:str, startSrc:int, endSrc:int, fileStatSrc, entrySrc:dict) -> None:
+        data = zlib.compress(json.dumps(entrySrc).encode('utf-8'))
+        self._getConnection()
+        self.pending.append(("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (pathSrc, startSrc, endSrc, fileStatSrc.st_size, fileStatSrc.st_mtime_ns, fileStatSrc.st_ino,
+                              self.fingerprint, data, len(data), time.time())))
+    # end def store
+
+    ## Writes the pending entries in one transaction
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        connection = self._getConnection()
+        with connection:
+            for statement, values in self.pending:
+                connection.execute(statement, values)
+        self.pending = []
+    # end def flush
+
+    ## Removes the least recently used entries until the cache is smaller then the max size
+    #  @return count of removed entries
+    def evict(self) -> int:
+        connection = self._getConnection()
+        cacheSize = connection.execute("SELECT COALESCE(SUM(dataSize), 0) FROM results").fetchone()[0]
+        if cacheSize <= self.maxSize:
+            return 0
+
+        removed = []
+        for rowid, dataSize in connection.execute("SELECT rowid, dataSize FROM results ORDER BY lastUsed"):
+            if cacheSize <= self.maxSize:
+                break
+            removed.append((rowid,))
+            cacheSize -= dataSize
+        with connection:
+            connection.executemany("DELETE FROM results WHERE rowid=?", removed)
+        connection.execute("VACUUM")
+        return len(removed)
+    # end def evict
+
+    ## Closes the connection of the current process
+    def close(self) -> None:
+        if self.connection is not None and self.pid == os.getpid():
+            self.flush()
+            self.connection.close()
+        self.connection = None
+    # end def close
+
+# end class CrawlerResultCache
+
+## --------------------------------------------------------------------------------------------------------------------
+## Returns the fingerprint of the loaded pattern and the match settings
+#  @param patternsSrc - dict with the compiled patterns
+#  @param matchSizeSrc - max match size
+#  @param beforeSrc, afterSrc - size of the match context, the cached matches contain the context
+#  @param wideSrc - the UTF-16LE variants of the patterns are searched
+#  @return hex string
+def getPatternFingerprint(patternsSrc:dict, matchSizeSrc:int, beforeSrc:int=0, afterSrc:int=0, wideSrc:bool=False) -> str:
+    fingerprint = hashlib.sha256(b'%d|%d' % (CACHE_VERSION, matchSizeSrc))
+    if beforeSrc or afterSrc:
+        fingerprint.update(b'|context|%d|%d' % (beforeSrc, afterSrc))
+    if wideSrc:
+        fingerprint.update(b'|wide')
+    for ioc_type in patternsSrc:
+        for pattern in patternsSrc[ioc_type]:
+            fingerprint.update(b'|%b|%d|%b' % (ioc_type.encode('utf-8'), pattern.flags, pattern.pattern))
+    return fingerprint.hexdigest()
+# end def getPatternFingerprint
@@ -2,51 +2,153 @@
 
 ## --------------------------------------------------------------------------------------------------------------------
 
+import hashlib         # for the fingerprint of the settings
 import logging         # for log 
 import os              # for file handling, exit
 import sys             # for exit
-import multiprocessing # for multiprocessing purpose
-import re              # for pattern
+import threading       # for reading the files while processing
+import timeit          # for the stage times
 
-from configparser    import ConfigParser, ExtendedInterpolation # for loading config files
-from .crawlererr     import CrawlerConfigError, CrawlerError, CrawlerFileReadError, CrawlerProcessError, CrawlerMatchError # ioc crawler error handling
-from .crawlerdata    import CrawlerVo, CrawlerWhitelistData # data objects
+from .crawlererr     import CrawlerConfigError, CrawlerError, CrawlerFileReadError, CrawlerProcessError # ioc crawler error handling
+from .cache          import CrawlerResultCache, getPatternFingerprint, CACHE_DEFAULT_SIZE # result cache
+from .walker         import CrawlerWalker # parallel directory listing
+from .worker         import CrawlerWorkerConfig, formatOutputLine, loadPatterns, loadWhitelist, READ_BUFFER_SIZE, CONTEXT_MAX_SIZE, PATTERN_TIMEOUT # scan settings of the workers
+from .workerpool     import CrawlerWorkerPool # worker processes
+from .patternset     import getPatternSet # compiled patterns
+from .sources        import getFileFormat, listZipMembers, ARCHIVE_ZIP # archives
+from .metrics        import CrawlerMetrics # processing metrics
+from .crawlerdata    import CrawlerUniqueData, escapeContext # unique matches
+from .dedup          import CrawlerDedupIndex # deduplication of the file contents
+from .journal        import CrawlerJournal # checkpoints of interrupted runs
+from .shard          import getShardIndex # partitioning between several nodes
+from .triage         import CrawlerTriage, TRIAGE_LAST, TRIAGE_SCAN, TRIAGE_SKIP, TRIAGE_STRINGS # content triage
 
 ## --------------------------------------------------------------------------------------------------------------------
 
 LOG = logging.getLogger('IocCrawlerLog')
 
+# scheduling of the processing blocks
+BLOCK_MIN_SIZE     = 1024 * 1024      # minimal byte size of a block
+BLOCK_MAX_FILES    = 256              # maximal file count of a block
+BLOCKS_PER_PROCESS = 8                # count of blocks per process for load balancing
+CHUNK_MIN_SIZE     = 16 * 1024 * 1024 # files above this size are split into byte ranges
+SHARD_RANGE_SIZE   = CHUNK_MIN_SIZE - CHUNK_MIN_SIZE % READ_BUFFER_SIZE # files above this size are partitioned in ranges between the shards
+CACHE_CHUNK_SIZE   = SHARD_RANGE_SIZE   # with the result cache files above this size are split at multiples of this size
+
+# reading of the file list
+WALKER_THREADS     = 8                # count of threads for listing the directories
+ENUM_BATCH_SIZE    = 64 * 1024 * 1024 # found files are added to the queue if they reach this byte size
+ENUM_BATCH_FILES   = 1024             # or this file count
+FAILED_FILES_SHOWN = 10               # count of the printed paths of a failed block
+
 ## --------------------------------------------------------------------------------------------------------------------
 
 ## Class for ioc crawling
 class Crawler():
 
     ## constructor
-    #  Init variables and read all files
+    #  Init variables, load pattern and whitelist. The files are read while processing.
+    #  @param beforeSrc, afterSrc - count of bytes before and after a match, which are reported as match context.
+    #                             The context is not used in unique mode.
+    #  @param archivesSrc - search in the members of archives and compressed files instead of the raw data
+    #  @param poolSrc - worker pool for the processing, it can be used for several crawlers. By default a pool
+    #                   with threadsSrc processes is created for every call of do().
+    #  @param metricsFileSrc - write the processing metrics as json lines to this file while processing
+    #  @param statusLineSrc - print a periodically refreshed status line with the processing metrics to stderr
+    #  @param profileDirSrc - write a cProfile dump of every worker process to this directory
+    #  @param uniqueSrc - aggregate the matches to distinct matches with count, file count and first location instead
+    #                     of reporting every match. The distinct matches are written at the end of do().
+    #  @param orderedOutputSrc - in stdout mode the lines of a file are written together and sorted by offset
+    #  @param wideSrc - search also the UTF-16LE (wide string) variants of the patterns, the matches are reported as
+    #                   decoded strings with the offset of the wide string
+    #  @param quietSrc - no program messages, e.g. if the crawler is used as library (see CrawlerScanner)
+    #  @param dedupSrc - scan hardlinks and files with the same content once, the matches are copied to every path
+    #                    (see CrawlerDedupIndex). The deduplication is not used in unique mode.
+    #  @param journalFileSrc - write a journal of the finished file ranges, so an interrupted run can be resumed (see
+    #                          CrawlerJournal). The journal requires a stream exporter with checkpoints, the unique
+    #                          mode is not supported.
+    #  @param resumeSrc - continue the run of the journal file, the finished ranges are not scanned again and the
+    #                     export file is continued at the position of the last checkpoint (see getResumePosition)
+    #  @param shardSrc - tuple (index, count), scan only the files of this shard (index 1 to count). Several nodes can
+    #                    crawl the same source, every node scans a disjoint share of the files (see getShardIndex).
+    #                    The sharding is not supported in unique mode.
+    #  @param triageSrc - policy of the content triage, dict [KEY - content class] : VALUE - action (see
+    #                     CrawlerTriage). The files are classified while listing, None searches every file completely.
+    #  @param patternTimeoutSrc - time budget of a pattern pass in seconds per MB of searched data, a pattern which
+    #                             exceeds it is skipped for the rest of the file (see CrawlerWorker). 0 disables the
+    #                             watchdog.
+    #  - the match highlighting is only used if stdout is a terminal
     def __init__(self, pathSrc:str, threadsSrc:int, patternSrc:str, printToStdoutSrc:bool, 
                  resultColumnFormatSrc:list, sectionsSrc:list, matchHighlightingSrc:bool, 
-                 matchSizeSrc:int, whitelistSrc:str=None, beforeSrc:int=0, afterSrc:int=0) -> None:
+                 matchSizeSrc:int, whitelistSrc:str=None, beforeSrc:int=0, afterSrc:int=0,
+                 cacheFileSrc:str=None, cacheSizeSrc:int=CACHE_DEFAULT_SIZE, archivesSrc:bool=False,
+                 poolSrc:CrawlerWorkerPool=None, metricsFileSrc:str=None, statusLineSrc:bool=False,
+                 profileDirSrc:str=None, uniqueSrc:bool=False, orderedOutputSrc:bool=False,
+                 wideSrc:bool=False, quietSrc:bool=False, dedupSrc:bool=True, journalFileSrc:str=None,
+                 resumeSrc:bool=False, shardSrc:tuple=None, triageSrc:dict=None,
+                 patternTimeoutSrc:float=PATTERN_TIMEOUT) -> None:
         try:
             # init
-            self.blockQueue         = multiprocessing.Queue()
-            self.sharedQueue        = multiprocessing.Queue()
-            self.processCount       = threadsSrc
-            self.processedFileCount = multiprocessing.Value('i', 0)
-            self.whiteListedMatches = multiprocessing.Value('i', 0)
-            self.overMaxMatchSize   = multiprocessing.Value('i', 0)
+            self.pool               = poolSrc
+            self.workerPool         = None
+            self.scanId             = 0
+            self.processCount       = poolSrc.processCount if poolSrc else threadsSrc
+            self.processedFileCount = 0
+            self.whiteListedMatches = 0
+            self.overMaxMatchSize   = 0
+            self.cachedRanges       = 0
+            self.submittedBlocks    = 0
+            self.fileListSize       = 0
+            self.pendingFiles       = []
+            self.archives           = archivesSrc
+            self.pendingBytes       = 0
+            self.pendingLock        = threading.Lock()
             self.rootFilePath       = ""
             self.rootRelPath        = ""
             self.printToStdOut      = printToStdoutSrc
+            self.quiet              = quietSrc
             self.resultList         = []
+            self.unique             = uniqueSrc
+            self.uniqueMatches      = None
+            self.uniqueList         = []
+            self.resultSummary      = {}
             self.whitlist           = None
             self.whitlistedFiles    = 0
+            self.whitlistedDirs     = 0
+            self.whitelistHits      = {} # [KEY - rule id] : VALUE - count of hits
+            self.dedup              = CrawlerDedupIndex() if dedupSrc and not uniqueSrc else None
+            self.duplicates         = {} # [KEY - result path of the primary file] : VALUE - list of result paths with the same content
+            self.primaryResults     = {} # [KEY - path of the primary file] : VALUE - list of results, kept while listing
+            self.primaryRanges      = {} # [KEY - result path of the primary file] : VALUE - list of finished ranges (journal)
+            self.lateDuplicates     = [] # list of tuples (path, results and ranges of the primary file), see _addDuplicate
+            self.dedupLock          = threading.Lock()
+            self.journal            = None
+            self.journalBlocks      = {} # [KEY - block id] : VALUE - block, list of tuples (path, start, end, printable only)
+            self.heldResults        = {} # [KEY - block id] : VALUE - list of results, written when the block is finished
+            self.journalWriting     = False
+            self.resumedFiles       = 0
+            self.retryBlocks        = 0
+            self.shard              = tuple(shardSrc) if shardSrc else None
+            self.otherShardFiles    = 0
+            self.fingerprint        = None
+            self.triage             = CrawlerTriage(triageSrc) if triageSrc is not None else None
+            self.deferredFiles      = [] # list of tuples (path, size), files which are searched after all other files
+            self.patternTimeouts    = [] # list of tuples (path, pattern name, seconds), stopped by the watchdog
+            self.failedBlocks       = [] # list of tuples (block id, error, relative paths), failed or lost blocks
+            self.orderedOutput      = orderedOutputSrc
             self.result_columns     = resultColumnFormatSrc
             self.sectionsForResult  = sectionsSrc
-            self.matchHighligting   = matchHighlightingSrc
-            self.before             = beforeSrc
-            self.after              = afterSrc
+            self.matchHighligting   = matchHighlightingSrc and sys.stdout.isatty()
+            self.before             = 0 if uniqueSrc else beforeSrc
+            self.after              = 0 if uniqueSrc else afterSrc
             self.matchSize          = matchSizeSrc
             self.beginnRootRelPath  = 0
+            self.resultCache        = None
+            self.stageTimes         = {}
+            self.metricsFile        = metricsFileSrc
+            self.statusLine         = statusLineSrc
+            self.metrics            = None
+            self.metricsSummary     = None
 
             self._printCrawlerMessage('[+] Init Crawler')
             LOG.debug("Init Crawler")
@@ -73,26 +175,67 @@ class Crawler():
             if self.matchSize < 5:
                 raise CrawlerConfigError("Match size have to be greater then 5")
 
-            # load pattern
-            self.patterns = self._loadPattern(patternSrc)
+            # Check pattern timeout
+            if patternTimeoutSrc < 0:
+                raise CrawlerConfigError("Pattern timeout have to be 0 (disabled) or greater")
+
+            # Check context size
+            if not 0 <= self.before <= CONTEXT_MAX_SIZE or not 0 <= self.after <= CONTEXT_MAX_SIZE:
+                raise CrawlerConfigError("Context size have to be between 0 and %d" %(CONTEXT_MAX_SIZE))
+
+            # load pattern - the pattern are checked here, the workers inherit or load the cached pattern set
+            self.patterns = loadPatterns(patternSrc, self.sectionsForResult)
             LOG.debug('Pattern loaded: ' + str(len(self.patterns)))
+            if wideSrc:
+                patternSet = getPatternSet(patternSrc)
+                for ioc_type in self.patterns:
+                    for pattern in self.patterns[ioc_type]:
+                        patternSet.getWidePattern(pattern)
+                patternSet.save()
+
+            # open result cache
+            if cacheFileSrc:
+                fingerprint = getPatternFingerprint(self.patterns, self.matchSize, self.before, self.after, wideSrc)
+                self.resultCache = CrawlerResultCache(cacheFileSrc, fingerprint, cacheSizeSrc)
+                self._printCrawlerMessage('[+] Result cache is enabled')
             
             # load whitelist
             if whitelistSrc:
-                self.whitlist = self._loadWhitelist(whitelistSrc)
+                self.whitlist = loadWhitelist(whitelistSrc)
                 self._printCrawlerMessage('[+] Whitelisting is enabled')
             else:
                 self._printCrawlerMessage('[+] Whitelisting is disabled')
-            
-            # check files
-            self._printCrawlerMessage('[+] Checking files')
-            self.fileList = self._readFiles(self.rootFilePath, self.rootRelPath)
-            self.fileListSize = len(self.fileList)
-            if self.whitlist:
-                self._printCrawlerMessage(" |- %d files found, %d whitelisted." %(self.fileListSize, self.whitlistedFiles))
-            else:
-                self._printCrawlerMessage(" |- %d files found." %(self.fileListSize))
-            LOG.debug("%d files found for processing" %(self.fileListSize))
+            if self.triage:
+                self._printCrawlerMessage('[+] Content triage is enabled')
+
+            # fingerprint of the settings for the journal and the shards
+            self.fingerprint = self._getSettingsFingerprint(whitelistSrc, wideSrc)
+            if self.shard:
+                if self.unique:
+                    raise CrawlerConfigError("The sharding is not supported in unique mode")
+                if not 1 <= self.shard[0] <= self.shard[1]:
+                    raise CrawlerConfigError("The shard index have to be between 1 and %d" %(self.shard[1]))
+                self._printCrawlerMessage('[+] Scanning shard %d of %d' %(self.shard))
+
+            # open the journal, a resumed run continues the summary of the last checkpoint
+            if journalFileSrc:
+                if self.unique:
+                    raise CrawlerConfigError("The journal is not supported in unique mode")
+                fingerprint  = hashlib.sha256(("%s|%s|%s" %(self.fingerprint, self.rootFilePath,
+                                                            self.shard)).encode('utf-8')).hexdigest()
+                self.journal = CrawlerJournal(journalFileSrc, fingerprint, self.rootFilePath, resumeSrc)
+                if resumeSrc:
+                    self._restoreState(self.journal.state)
+                    self._printCrawlerMessage('[+] Resuming the run of the journal %s' %(journalFileSrc))
+
+            # settings of the worker processes
+            # - in unique mode the results are printed by the result writer
+            self.workerConfig = CrawlerWorkerConfig(patternSrc, self.sectionsForResult, self.matchSize, whitelistSrc,
+                                                    self.printToStdOut and not self.unique, self.result_columns,
+                                                    self.matchHighligting, self.before, self.after, cacheFileSrc,
+                                                    self.archives, bool(metricsFileSrc or statusLineSrc),
+                                                    profileDirSrc, self.unique, orderedOutputSrc, wideSrc,
+                                                    patternTimeoutSrc)
 
         except CrawlerFileReadError as re:
             raise re
@@ -102,90 +245,259 @@ class Crawler():
             raise CrawlerError("Initialisation error. " + getattr(e, 'message', repr(e)))
     # end init
 
-    ## Loads pattern from config or personal file
-    #  - patterns will only loaded if they are selected from user
-    #  @param patternFileSrc - all search pattern
-    #  @return - a patterns dict
-    def _loadPattern(self, patternFileSrc) -> list:
-        try:
-            LOG.debug('Load patterns')
-            patternCfg = ConfigParser(interpolation=None)
-            patternCfg.read(patternFileSrc)
-            
-            patterns = {}
-            for ioc_type in patternCfg.sections():
-                if ioc_type.lower() in self.sectionsForResult:
-                    for option in patternCfg.options(ioc_type):
-                        ioc_pattern = patternCfg[ioc_type][option]
-                        if ioc_pattern:
-                            if ioc_type not in patterns:
-                                patterns[ioc_type] = [re.compile(b'%b' % bytearray(ioc_pattern.encode('utf-8')))]
-                            else:
-                                patterns[ioc_type].append(re.compile(b'%b' % bytearray(ioc_pattern.encode('utf-8'))))
-                        # end if
-                    # end if
-                # end for
-            # end for
-
-            return patterns
-        except Exception as e:
-            raise CrawlerConfigError(getattr(e, 'message', repr(e)))
-    # end _loadPattern
-
-    ## Loads whitelist from config or personal file
-    #  @param whitelistFileSrc
-    #  @return - a patterns dict
-    def _loadWhitelist(self, whitelistFileSrc) -> CrawlerWhitelistData:
-        try:
-            LOG.debug('Load whitelist')
-            whitelistCfg = ConfigParser(interpolation=ExtendedInterpolation())
-            whitelistCfg.read(whitelistFileSrc)
-            
-            whitelistObj = CrawlerWhitelistData()
-            for wh_section in whitelistCfg.sections():
-                for option in whitelistCfg.options(wh_section):
-                    whitelistObj.addWhiteListItem(wh_section, option, whitelistCfg[wh_section][option].strip().split('\n'))
-                # end for
-            # end for
-            return whitelistObj
-        except Exception as e:
-            raise CrawlerConfigError(getattr(e, 'message', repr(e)))
-    # end _loadWhitelist
-
     ## Reads all files from the directory
-    #  If the file/directory is whitelisted, it will not added to the file list
-    #  @param dirSrc root source
-    #  @return file list to read
-    def _readFiles(self, rootFilePathSrc, relPathSrc) -> list:
+    #  - the directories are listed by several threads, every found file is added to the processing queue at once
+    #  - if the file/directory is whitelisted, it will not added to the queue
+    #  - the file size is stored with every file, it is used for the scheduling of the processing blocks
+    #  @param rootFilePathSrc - root source
+    #  @param relPathSrc - relative root path, used for the whitelisting
+    def _readFiles(self, rootFilePathSrc, relPathSrc) -> None:
         try:
-            filesList = []
-            filename = ""
             if os.path.isfile(rootFilePathSrc):
-                filesList.append(rootFilePathSrc)
+                self._addSource(rootFilePathSrc, self._getFileSize(rootFilePathSrc))
             else:
-                for root, dirs, files in os.walk(rootFilePathSrc):
-                    for filename in files:
-                        filePathStr = os.path.join(root, filename)
-                        if self.whitlist:
-                            # get the index of the relative beginning of the file to check whitelisting
-                            idx = filePathStr.index(relPathSrc) + len(relPathSrc) - 1
-                            if filePathStr[idx:] in self.whitlist:
-                                LOG.debug("%s whitelisted." %(filePathStr[idx:]))
-                                self.whitlistedFiles +=1
-                            else:
-                                filesList.append(filePathStr)
-                        else:
-                            filesList.append(filePathStr)
-                    # end for
-                # end for
+                walker = CrawlerWalker(WALKER_THREADS,
+                                       (lambda path: self.whitlist.containsPathTree(self._getWhitelistPath(path, relPathSrc))) if self.whitlist else None,
+                                       (lambda path: self.whitlist.containsPath(self._getWhitelistPath(path, relPathSrc))) if self.whitlist else None)
+                walker.walk(rootFilePathSrc, self._addSource)
+                self.whitlistedFiles = walker.whitelistedFiles
+                self.whitlistedDirs  = walker.whitelistedDirs
             # end rootFilePath is directory
+
+            # add the remaining files to the queue, the files with low priority are added after all other files
+            self._addFile(None, 0)
+            if self.deferredFiles:
+                for filePath, fileSize in self.deferredFiles:
+                    self._addFile(filePath, fileSize)
+                self._addFile(None, 0)
         except IOError as io:
-            raise CrawlerFileReadError(getattr(io, 'message', repr(io)), filename)
+            raise CrawlerFileReadError(getattr(io, 'message', repr(io)), rootFilePathSrc)
         except Exception as e:
             raise CrawlerError(getattr(e, 'message', repr(e)))
-        return filesList
     # end _readFiles
 
+    ## Returns the path which is checked against the whitelist
+    #  - the path starts with the last character of the relative root path
+    def _getWhitelistPath(self, filePathStr:str, relPathSrc:str) -> str:
+        # get the index of the relative beginning of the file to check whitelisting
+        idx = filePathStr.find(relPathSrc)
+        if idx < 0:
+            return filePathStr
+        return filePathStr[idx + len(relPathSrc) - 1:]
+    # end _getWhitelistPath
+
+    ## Adds a found file to the processing queue
+    #  - the files are collected and added as blocks, see _createBlocks
+    #  - with sharding only the ranges of the shard are added, see _getShardRanges
+    #  - a resumed run adds only the ranges which are not finished in the journal
+    #  - is called from the walker threads
+    #  @param filePathSrc - path of the file, None adds the collected files to the queue
+    #  @param fileSizeSrc - size of the file
+    #  @param splittableSrc - False if the file can not be split into byte ranges
+    #  @param printableSrc - search only the printable runs of the file, see CrawlerTriage
+    def _addFile(self, filePathSrc:str, fileSizeSrc:int, splittableSrc:bool=True, printableSrc:bool=False) -> None:
+        ranges = [(0, fileSizeSrc)]
+        if filePathSrc and self.shard:
+            ranges = self._getShardRanges(filePathSrc, fileSizeSrc, splittableSrc)
+            if not ranges:
+                with self.pendingLock:
+                    self.otherShardFiles += 1
+                return
+        if filePathSrc and self.journal:
+            remaining = self.journal.getRemainingRanges(filePathSrc[self.beginnRootRelPath:], fileSizeSrc)
+            if remaining is not None:
+                ranges = [(max(start, otherStart), min(end, otherEnd)) for start, end in ranges
+                          for otherStart, otherEnd in remaining if max(start, otherStart) < min(end, otherEnd)]
+            if not ranges:
+                with self.pendingLock:
+                    self.resumedFiles += 1
+                return
+        # end if
+
+        with self.pendingLock:
+            if filePathSrc:
+                for start, end in ranges:
+                    self.pendingFiles.append((filePathSrc, start, end, splittableSrc, printableSrc))
+                    self.pendingBytes += end - start
+                self.fileListSize += 1
+                if self.pendingBytes < ENUM_BATCH_SIZE and len(self.pendingFiles) < ENUM_BATCH_FILES:
+                    return
+            # end if
+
+            for block in self._createBlocks(self.pendingFiles):
+                blockId = self.workerPool.submit(self.scanId, self.beginnRootRelPath, block)
+                if self.journal:
+                    self.journalBlocks[blockId] = block
+                self.submittedBlocks += 1
+            self.pendingFiles = []
+            self.pendingBytes = 0
+    # end _addFile
+
+    ## Adds a found file or the members of an archive to the processing queue
+    #  - if the archive search is enabled, the members of zip archives are added as separate files, so they are
+    #    processed in parallel. The path of a member is the virtual path, e.g. archive.zip!/dir/file
+    #  - tar archives and compressed files are read as stream by one process, so they are not split into ranges
+    #  - files with the content of a found file are not added, see _addDuplicate and _isDedupFile
+    #  - with the content triage the policy of the content class selects the processing: the file is skipped, only
+    #    the printable runs are searched or the file is added after all other files (see _readFiles)
+    #  @param filePathSrc - path of the file
+    #  @param fileSizeSrc - size of the file
+    #  @param fileIdSrc - tuple (device, inode) of the file or None
+    def _addSource(self, filePathSrc:str, fileSizeSrc:int, fileIdSrc:tuple=None) -> None:
+        if self.archives:
+            archiveFormat = getFileFormat(filePathSrc)
+            if archiveFormat == ARCHIVE_ZIP:
+                members = listZipMembers(filePathSrc)
+                if members is not None:
+                    for memberPath, memberSize in members:
+                        self._addFile(memberPath, memberSize, False)
+                    return
+            if archiveFormat:
+                self._addFile(filePathSrc, fileSizeSrc, False)
+                return
+        # end if
+
+        action = self._getTriageAction(filePathSrc, fileSizeSrc) if self.triage else TRIAGE_SCAN
+        if action == TRIAGE_SKIP:
+            return
+
+        if self.dedup and self._isDedupFile(filePathSrc, fileSizeSrc) and \
+           self._addDuplicate(filePathSrc, fileSizeSrc, fileIdSrc):
+            return
+        if action == TRIAGE_LAST:
+            with self.pendingLock:
+                self.deferredFiles.append((filePathSrc, fileSizeSrc))
+            return
+        self._addFile(filePathSrc, fileSizeSrc, True, action == TRIAGE_STRINGS)
+    # end _addSource
+
+    ## Classifies a found file and returns the action of the triage policy
+    #  - with sharding only the files of the shard are classified, a file which is split between the shards is
+    #    counted by the shard of its first range
+    def _getTriageAction(self, filePathSrc:str, fileSizeSrc:int) -> str:
+        if not self.shard:
+            return self.triage.getAction(filePathSrc, fileSizeSrc)
+        ranges = self._getShardRanges(filePathSrc, fileSizeSrc, True)
+        if not ranges:
+            # the file is counted as file of another shard, see _addFile
+            return TRIAGE_SCAN
+        return self.triage.getAction(filePathSrc, fileSizeSrc, ranges[0][0] == 0)
+    # end _getTriageAction
+
+    ## Checks if a found file is deduplicated
+    #  - files with finished ranges in the journal are not deduplicated, their remaining ranges are scanned
+    #  - with sharding only whole files of the shard are deduplicated, so the files of other shards are not read
+    def _isDedupFile(self, filePathSrc:str, fileSizeSrc:int) -> bool:
+        if self.journal and self.journal.hasRanges(filePathSrc[self.beginnRootRelPath:]):
+            return False
+        if self.shard:
+            return self._getShardRanges(filePathSrc, fileSizeSrc, True) == [(0, fileSizeSrc)]
+        return True
+    # end _isDedupFile
+
+    ## Returns the ranges of a file which belong to the shard of the crawler
+    #  - the shard is selected by the hash of the path relative to the source, so every node selects the same files
+    #    independent of the mount point and the order of the listing
+    #  - files larger then SHARD_RANGE_SIZE are partitioned in ranges of this size, the shard of a range is selected
+    #    by the hash of the path and the start of the range
+    #  @return list of tuples (start, end), empty if the file belongs to another shard
+    def _getShardRanges(self, filePathSrc:str, fileSizeSrc:int, splittableSrc:bool) -> list:
+        shardIndex, shardCount = self.shard
+        key = filePathSrc[len(self.rootFilePath):]
+        if fileSizeSrc <= SHARD_RANGE_SIZE or not splittableSrc:
+            return [(0, fileSizeSrc)] if getShardIndex(key, shardCount) == shardIndex else []
+        return [(start, min(start + SHARD_RANGE_SIZE, fileSizeSrc)) for start in range(0, fileSizeSrc, SHARD_RANGE_SIZE)
+                if getShardIndex("%s|%d" %(key, start), shardCount) == shardIndex]
+    # end _getShardRanges
+
+    ## Checks if a found file has the content of a found file (the primary file)
+    #  - the results of the primary file are copied to the file by the result writer. The results of the primary
+    #    files are kept until the listing is finished, so the results which are written before a duplicate is found
+    #    are copied later (see _writeLateDuplicates).
+    #  - is called from the walker threads
+    #  @return True if the file is a duplicate and is not processed
+    def _addDuplicate(self, filePathSrc:str, fileSizeSrc:int, fileIdSrc:tuple) -> bool:
+        primary = self.dedup.getPrimary(filePathSrc, fileSizeSrc, fileIdSrc)
+        if primary is None:
+            return False
+        # the results have the path without the root offset, see CrawlerWorker.processBlock
+        primary   = primary[self.beginnRootRelPath:]
+        duplicate = filePathSrc[self.beginnRootRelPath:]
+        with self.dedupLock:
+            self.duplicates.setdefault(primary, []).append(duplicate)
+            if primary in self.primaryResults or primary in self.primaryRanges:
+                self.lateDuplicates.append((duplicate, list(self.primaryResults.get(primary, ())),
+                                            list(self.primaryRanges.get(primary, ()))))
+        # the duplicates are found files, but they are not scanned
+        with self.pendingLock:
+            self.fileListSize += 1
+        return True
+    # end _addDuplicate
+
+    ## Returns the size of a file
+    #  - broken links and unreadable files get the size 0, the error is reported while processing
+    #  @param filePathSrc - path to the file
+    #  @return size in bytes
+    def _getFileSize(self, filePathSrc:str) -> int:
+        try:
+            return os.path.getsize(filePathSrc)
+        except OSError:
+            return 0
+    # end _getFileSize
+
+    ## Creates the processing blocks based on the file sizes
+    #  - the found files are passed in batches, see _addFile
+    #  - ranges larger then the chunk size are split into byte ranges, so a single huge file is processed by all processes.
+    #    The byte ranges end on multiples of the chunk size. With the result cache the chunk size is fixed, so the
+    #    ranges of a file are the same for every process count and batch of files and are found in the cache.
+    #  - the remaining files are packed largest first into blocks of nearly the same byte size (LPT scheduling)
+    #  - the blocks are sorted by size, the processes take the next block from the queue if they are finished
+    #  @param fileListSrc - list of tuples (path, start, end, splittable, printable only)
+    #  @return list of blocks, every block is a list of tuples (path, start, end, printable only)
+    def _createBlocks(self, fileListSrc:list) -> list:
+        totalSize = sum(item[2] - item[1] for item in fileListSrc)
+
+        # every process should get several blocks, so the load is balanced until the end
+        targetSize = max(BLOCK_MIN_SIZE, totalSize // (self.processCount * BLOCKS_PER_PROCESS))
+        chunkSize  = max(CHUNK_MIN_SIZE, targetSize)
+
+        # chunks are aligned to the read buffer, so the ranges of files which can not be memory mapped end on
+        # the same offsets as the read blocks of a whole file
+        chunkSize = max(READ_BUFFER_SIZE, chunkSize - chunkSize % READ_BUFFER_SIZE)
+        if self.resultCache:
+            chunkSize = CACHE_CHUNK_SIZE
+
+        blocks     = []  # list of tuples (block size, block)
+        blockList  = []
+        blockBytes = 0
+        for path, start, end, splittable, printableOnly in sorted(fileListSrc, key=lambda item: item[2] - item[1], reverse=True):
+            size = end - start
+            if size > chunkSize and splittable:
+                # split huge files into byte ranges, the reading of the overlap is done while processing
+                for chunkStart in [start] + list(range(start - start % chunkSize + chunkSize, end, chunkSize)):
+                    chunkEnd = min(chunkStart - chunkStart % chunkSize + chunkSize, end)
+                    blocks.append((chunkEnd - chunkStart, [(path, chunkStart, chunkEnd, printableOnly)]))
+            else:
+                blockList.append((path, start, end, printableOnly))
+                blockBytes += size
+                if blockBytes >= targetSize or len(blockList) >= BLOCK_MAX_FILES:
+                    blocks.append((blockBytes, blockList))
+                    blockList  = []
+                    blockBytes = 0
+            # end if
+        # end for
+
+        # add the remaining files
+        if blockList:
+            blocks.append((blockBytes, blockList))
+
+        # largest blocks first
+        blocks.sort(key=lambda item: item[0], reverse=True)
+        LOG.debug("%d blocks created. Block size: %d bytes, chunk size: %d bytes" %(len(blocks), targetSize, chunkSize))
+
+        return [block for blockSize, block in blocks]
+    # end _createBlocks
+
     ## Returns a summary to all found ioc types and the count of matches
     #   - checks the white listed file count
     #   - checks the white listed matches count
@@ -194,218 +506,266 @@ class Crawler():
         summaryDict = {}
 
         if self.whitlist:
+            if self.whitlistedDirs > 0:
+                summaryDict["Whitelisted directories"] = self.whitlistedDirs
             if self.whitlistedFiles > 0:
                 summaryDict["Whitelisted files"] = self.whitlistedFiles
-            if self.whiteListedMatches.value > 0:
-                summaryDict["Filtered matches trough whitelisting"] = self.whiteListedMatches.value
-            if self.overMaxMatchSize.value > 0:
-                summaryDict["Matchs above the max match size"] = self.whiteListedMatches.value
-
-        for item in self.resultList:
-            for ioc in item.mCount:
-                if ioc in summaryDict.keys():
-                    summaryDict[ioc] = summaryDict[ioc] + item.mCount[ioc]
-                else:
-                    summaryDict[ioc] = item.mCount[ioc]
+            if self.whiteListedMatches > 0:
+                summaryDict["Filtered matches trough whitelisting"] = self.whiteListedMatches
+            unusedRules = sum(1 for rule, hits in self.getWhitelistRuleHits() if hits == 0)
+            if unusedRules > 0:
+                summaryDict["Whitelist rules without hits"] = unusedRules
+            if self.overMaxMatchSize > 0:
+                summaryDict["Matchs above the max match size"] = self.overMaxMatchSize
+
+        if self.cachedRanges > 0:
+            summaryDict["Files (ranges) read from cache"] = self.cachedRanges
+
+        if self.otherShardFiles > 0:
+            summaryDict["Files of other shards"] = self.otherShardFiles
+
+        if self.triage:
+            skippedFiles, skippedBytes = self.triage.getSkipped()
+            if skippedFiles > 0:
+                summaryDict["Files skipped by the content triage"] = skippedFiles
+                summaryDict["Bytes skipped by the content triage"] = skippedBytes
+
+        if self.patternTimeouts:
+            summaryDict["Pattern timeouts (pattern skipped for the file)"] = len(self.patternTimeouts)
+        if self.failedBlocks:
+            summaryDict["Failed blocks (results incomplete)"] = len(self.failedBlocks)
+            summaryDict["Files of failed blocks"] = len({path for blockId, error, files in self.failedBlocks
+                                                        for path in files})
+
+        if self.dedup and self.dedup.duplicateFiles > 0:
+            summaryDict["Duplicate files (scanned once)"] = self.dedup.duplicateFiles
+            summaryDict["Bytes saved by deduplication"] = self.dedup.savedBytes
+
+        # the match count is summed up by the result writer
+        for ioc in self.resultSummary:
+            summaryDict[ioc] = self.resultSummary[ioc]
 
         return summaryDict
     # end def getResultSummary
 
-    ## Process files from block
-    #  - do pattern search
-    #  - check for whitelist etc
-    #  @param blockFiles - the files to process
-    def _processBlock(self, blockFiles, shared_list) -> None:
-        try:
-            for file in blockFiles:
-                try:
-                    # create value object for the results - save only the relative path to the results
-                    cvo = CrawlerVo(file[self.beginnRootRelPath:])
-
-                    with open(file, 'rb') as f:
-                        LOG.debug("Processing %s" %(file))
-                        fileSize = os.path.getsize(file)
-                        bufSize  = 32384 # read buffer
-                        overlap  = 1024  # overlap reading size
-                        filePos  = 0     # current position in file
-                    
-                        # if file size is smaler then the buffer, do no overlap reading
-                        if fileSize < bufSize:
-                            bufSize = fileSize
-                            overlap = 0
-                        
-                        # read the file in blocks
-                        while filePos < fileSize:
-
-                            # log status
-                            if filePos > 0:
-                                if (filePos/10) % 100 == 0:
-                                    LOG.debug("Hanging on %s; read %d/%d bytes" %(file, filePos, fileSize))
-
-                            buffer = None
-                            buffer = f.read(bufSize+overlap)
-
-                            for ioc_type in self.patterns:
-                                for pattern in self.patterns[ioc_type]:
-
-                                    matchDict = {}
-
-                                    searchRes = re.finditer(pattern, buffer)
-                                    
-                                    for item in searchRes:
-                                        if item.start() < bufSize:
-                                            
-                                            try:
-                                                matchString = item.group(0).decode("utf-8")
-                                                
-                                                # Check match size
-                                                if len(matchString) > self.matchSize:
-                                                    raise CrawlerMatchError("Match for %s is greater then %d." %(item, self.matchSize))
-
-                                                before = ""
-                                                after  = ""
-
-                                                if self.before > 0:
-                                                    raise CrawlerError("self.before not implemented")
-                                                elif self.after > 0:
-                                                    raise CrawlerError("self.after not implemented")
-                                                    #after = buffer[item.start() + len(matchString): item.start() + len(matchString) + self.after].decode("utf-8")
-                                                
-                                                # maybe feature in one of the next versions
-                                                #printDict = {"file" : file, "ioc" : ioc_type, 
-                                                #            "match": before + matchString + after, "offset": str(filePos + item.start())}
-
-                                                # hint: save only relative path
-                                                printDict = {"path" : file[self.beginnRootRelPath:], "ioc" : ioc_type, "match": matchString, "offset": str(filePos + item.start())}
-
-                                                isWhiteListed = False
-
-                                                if self.whitlist:
-                                                    if matchString in self.whitlist:
-
-                                                        isWhiteListed = True
-                                                        with self.processedFileCount.get_lock():
-                                                            self.whiteListedMatches.value +=1
-                                                
-                                                if not isWhiteListed:
-                                                    if self.printToStdOut:
-                                                        self._printCrawlerResult(printDict)
-                                                    
-                                                    if matchString not in matchDict:
-                                                        matchDict[before + matchString + after] = [str(filePos + item.start())]
-                                                    else:
-                                                        matchDict[before + matchString + after].extend([str(filePos + item.start())])
-                                            # end try
-                                            except UnicodeDecodeError as ude:
-                                                LOG.debug("Decoding error while Processing %s" %(item))
-                                            except CrawlerMatchError as me:
-                                                with self.processedFileCount.get_lock():
-                                                    self.overMaxMatchSize.value +=1
-                                                LOG.debug(me)
-                                        # end if item.start() < pos + bufSize
-                                    # end for item in searchRes
-
-                                    # add match
-                                    if matchDict:
-                                        cvo.addMatchResults(ioc_type, matchDict)
-                                # end for pattern
-                            # end for ioc_type
-
-                            # set new offset
-                            if f.tell() < fileSize:
-                                filePos = f.seek(f.tell() - overlap)
-                            else:
-                                filePos = f.tell()
-                        
-                        # end while filePos < fileSize:
-
-                    # end with file
-
-                    # add crawler file value object to the result list
-                    shared_list.append(cvo)
-
-                except IOError as ioe:
-                    LOG.info("[!] " + getattr(ioe, 'message', repr(ioe)))
-            # end for
-    
-            # set lock for the process counter and save the new status
-            with self.processedFileCount.get_lock():
-                self.processedFileCount.value += len(blockFiles)
-            
-            # log processing status for the user
-            self._printCrawlerMessage(" |- Processed files: %d / %d [%s %%]" % (self.processedFileCount.value, 
-                                                                                self.fileListSize, 
-                                                                                self._getProcessStatus()))
-        except Exception as e:
-            raise CrawlerProcessError(getattr(e, 'message', repr(e)))
-    # end processBlock
+    ## Returns the hits of all whitelist rules, the hits of the paths and of the matches are summed up
+    #  - rules without hits are not used by the crawled data and can be removed from the whitelist
+    #  @return list of tuples (rule, count of hits), sorted by the count of hits (descending)
+    def getWhitelistRuleHits(self) -> list:
+        if not self.whitlist:
+            return []
+        self._addWhitelistHits(self.whitlist.popHits())
+        ruleHits = [(rule, self.whitelistHits.get(ruleId, 0)) for ruleId, rule in enumerate(self.whitlist.rules)]
+        return sorted(ruleHits, key=lambda x: x[1], reverse=True)
+    # end def getWhitelistRuleHits
+
+    ## Adds the hits of the whitelist rules of a block
+    def _addWhitelistHits(self, hitsSrc:dict) -> None:
+        for ruleId, hits in hitsSrc.items():
+            self.whitelistHits[ruleId] = self.whitelistHits.get(ruleId, 0) + hits
+
+    ## Returns the position of the export file of a resumed run
+    #  - the stream exporter continues the file at this position, see createStreamExporter
+    #  @return position, None if the export file is created new
+    def getResumePosition(self):
+        return self.journal.position if self.journal else None
+
+    ## Returns the content classes of the found files
+    #  @return list of tuples (content class, count of files, count of bytes, action), empty without content triage
+    def getTriageSummary(self) -> list:
+        return self.triage.getSummary() if self.triage else []
+
+    ## Returns the pattern/file pairs which were stopped by the watchdog
+    #  @return list of tuples (relative path, pattern name, seconds), sorted by the seconds (descending)
+    def getPatternTimeouts(self) -> list:
+        return sorted(self.patternTimeouts, key=lambda x: x[2], reverse=True)
+
+    ## Returns the fingerprint of the settings which change the results
+    #  - a journal is only resumed and shards are only merged with the same settings
+    def getSettingsFingerprint(self) -> str:
+        return self.fingerprint
+
+    ## Creates the fingerprint of the settings, see getSettingsFingerprint
+    def _getSettingsFingerprint(self, whitelistSrc:str, wideSrc:bool) -> str:
+        fingerprint = hashlib.sha256(getPatternFingerprint(self.patterns, self.matchSize, self.before, self.after,
+                                                           wideSrc).encode('utf-8'))
+        if whitelistSrc:
+            with open(whitelistSrc, 'rb') as f:
+                fingerprint.update(f.read())
+        fingerprint.update(repr((list(self.result_columns), self.archives)).encode('utf-8'))
+        if self.triage:
+            fingerprint.update(repr(sorted(self.triage.policy.items())).encode('utf-8'))
+        return fingerprint.hexdigest()
+    # end def _getSettingsFingerprint
+
+    ## Returns the state of the summary for a checkpoint of the journal
+    #  - the whitelisted files and directories are counted again by the listing of a resumed run, the duplicate files
+    #    are counted by the run which deduplicates them
+    def _getState(self) -> dict:
+        return {"resultSummary"      : self.resultSummary,
+                "whitelistedMatches" : self.whiteListedMatches,
+                "overMaxMatchSize"   : self.overMaxMatchSize,
+                "cachedRanges"       : self.cachedRanges,
+                "whitelistHits"      : self.whitelistHits,
+                "patternTimeouts"    : self.patternTimeouts}
+    # end def _getState
+
+    ## Restores the state of the summary of the last checkpoint, see _getState
+    def _restoreState(self, stateSrc:dict) -> None:
+        self.resultSummary      = dict(stateSrc.get("resultSummary", {}))
+        self.whiteListedMatches = stateSrc.get("whitelistedMatches", 0)
+        self.overMaxMatchSize   = stateSrc.get("overMaxMatchSize", 0)
+        self.cachedRanges       = stateSrc.get("cachedRanges", 0)
+        # the keys of json objects are strings
+        self.whitelistHits      = {int(ruleId): hits for ruleId, hits in stateSrc.get("whitelistHits", {}).items()}
+        self.patternTimeouts    = [tuple(x) for x in stateSrc.get("patternTimeouts", [])]
+    # end def _restoreState
+
+    ## Writes a checkpoint to the journal
+    #  - the export file is written to the disk before the journal line, see the checkpoint method of the exporters
+    #  @param completeSrc - True if all blocks are finished
+    def _writeCheckpoint(self, exporterSrc, completeSrc:bool=False) -> None:
+        self.journalWriting = True
+        position = exporterSrc.checkpoint()
+        self.journal.checkpoint(self._getExportKey(exporterSrc), position, self._getState(), completeSrc)
+        self.journalWriting = False
+        LOG.debug("Checkpoint written, export position %d" %(position))
+    # end def _writeCheckpoint
+
+    ## Returns the export file and the format of an exporter, a journal is only resumed with the same export file
+    def _getExportKey(self, exporterSrc) -> list:
+        return [os.path.abspath(exporterSrc.fileName), type(exporterSrc).__name__, getattr(exporterSrc, "compress", False)]
 
     ## Main function for processing
-    #  - inhires the nested function "procesQueue" for getting tasks from queue
-    def do(self) -> None:
+    #  - the files are read in a thread and added as blocks to the worker pool while the workers are running
+    #  - the results are send from the workers to the result writer, which writes them to the exporter and sums
+    #    up the matches for the summary
+    #  @param exporterSrc - stream exporter for the results, e.g. CrawlerCsvStreamExporter
+    #  @param keepResultsSrc - keep the results in the result list, by default only if no exporter is set
+    #  - in unique mode the distinct matches (CrawlerUniqueVo) are written with writeUniqueResult() of the exporter
+    #    and printed after the processing, the kept results are in uniqueList
+    #  - the run time of the stages is saved in stageTimes (seconds):
+    #    startup - start of the workers, listing - reading of the file list, processing - until the last result is
+    #    written, finish - cleanup after the processing
+    #  - with enabled metrics, the final metrics are saved in metricsSummary, see CrawlerMetrics
+    def do(self, exporterSrc=None, keepResultsSrc:bool=None) -> None:
         
-        self._printCrawlerMessage("[+] Start processing files")
-        manager = multiprocessing.Manager()
-        shared_list = manager.list()
-        processList = []
-
-        ## Get Blocks from Queue and process them until queue is empty
-        def _processQueue():
-            while not self.blockQueue.empty():
-                # process block
-                LOG.debug("Get new block from queue")
-                blockFiles = self.blockQueue.get()
-                self._processBlock(blockFiles, shared_list)
-        # end processBlock
+        readErrors   = []
+        readDone     = threading.Event()
+        startTime    = timeit.default_timer()
+        outputClosed = False
+
+        if keepResultsSrc is None:
+            keepResultsSrc = exporterSrc is None
+
+        ## Read the files and mark the end of the reading
+        def _readQueue():
+            try:
+                listingStart = timeit.default_timer()
+                self._readFiles(self.rootFilePath, self.rootRelPath)
+                self.stageTimes["listing"] = timeit.default_timer() - listingStart
+                if self.whitlist:
+                    self._printCrawlerMessage(" |- %d files found, %d whitelisted, %d directories whitelisted." 
+                                              %(self.fileListSize, self.whitlistedFiles, self.whitlistedDirs))
+                else:
+                    self._printCrawlerMessage(" |- %d files found." %(self.fileListSize))
+                if self.dedup and self.dedup.duplicateFiles:
+                    self._printCrawlerMessage(" |- %d duplicate files found, they are scanned once." %(self.dedup.duplicateFiles))
+                if self.resumedFiles:
+                    self._printCrawlerMessage(" |- %d files were finished by the interrupted run." %(self.resumedFiles))
+                if self.otherShardFiles:
+                    self._printCrawlerMessage(" |- %d files belong to other shards." %(self.otherShardFiles))
+                if self.triage and self.triage.getSkipped()[0]:
+                    self._printCrawlerMessage(" |- %d files skipped by the content triage." %(self.triage.getSkipped()[0]))
+                LOG.debug("%d files found for processing" %(self.fileListSize))
+            except CrawlerError as ce:
+                readErrors.append(ce)
+            finally:
+                readDone.set()
+        # end _readQueue
 
         try:
-            # check if there is anything to do
-            if self.fileListSize < 1:
-                raise CrawlerFileReadError("No files to read.")
+            # the journal needs an export file, which can be continued by a resumed run
+            if self.journal:
+                if not hasattr(exporterSrc, "checkpoint"):
+                    raise CrawlerConfigError("The journal requires an export file")
+                if self.journal.exportFile is not None and self.journal.exportFile != self._getExportKey(exporterSrc):
+                    raise CrawlerConfigError("The journal was written for the export file %s (%s)"
+                                             %(self.journal.exportFile[0], self.journal.exportFile[1]))
 
-            # Calc block size based on the file count
-            blockSize = 0
-            if self.fileListSize < 10:
-                blockSize = self.fileListSize
-                self.processCount = 1
-            elif self.fileListSize < 100:
-                blockSize = round(self.fileListSize / 4)
-            elif self.fileListSize < 1000:
-                blockSize = round(self.fileListSize / 8)
-            elif self.fileListSize < 10000:
-                blockSize = round(self.fileListSize / 10)
-
-            fileCounter = 0
-            blockList = []
-            for item in self.fileList:
-                blockList.append(item)
-                fileCounter += 1
-
-                if fileCounter >= blockSize:
-                    self.blockQueue.put(blockList)
-                    del blockList
-                    blockList = []
-                    fileCounter = 0
-                # end if
-            # add the remaining files to the queue
-            if blockList:
-                self.blockQueue.put(blockList)
-
-            # create sub processes and start them
-            LOG.debug("Using %d processes for processing." %(self.processCount))
-            for process in range(1,self.processCount+1):
-                LOG.debug("Create Process")
-                process = multiprocessing.Process(target=_processQueue)
-                process.daemon = True
-                process.start()
-                processList.append(process)
-            # end for
-            
-            for process in processList:
-                process.join()
+            if self.pool:
+                self.workerPool = self.pool
+            else:
+                # a single file needs only one process per block
+                if os.path.isfile(self.rootFilePath):
+                    self.processCount = max(1, min(self.processCount, -(-self._getFileSize(self.rootFilePath) // CHUNK_MIN_SIZE)))
+                self.workerPool = CrawlerWorkerPool(self.processCount)
+
+            try:
+                # start the workers, a pool of a previous scan is reused
+                self._printCrawlerMessage('[+] Checking files')
+                self._printCrawlerMessage("[+] Start processing files")
+                self.workerPool.configure(self.workerConfig)
+                self.scanId = self.workerPool.startScan()
+                self.stageTimes["startup"] = timeit.default_timer() - startTime
+                if self.metricsFile or self.statusLine:
+                    self.metrics = CrawlerMetrics(self.metricsFile, self.statusLine)
+
+                # read the files while the workers are running
+                readThread = threading.Thread(target=_readQueue, daemon=True)
+                readThread.start()
+
+                # write the results while the workers are running
+                if self.unique:
+                    self.uniqueMatches = CrawlerUniqueData()
+                if self.printToStdOut:
+                    # the result lines are written to the byte buffer of stdout
+                    sys.stdout.flush()
+                self._writeResults(readDone, exporterSrc, keepResultsSrc)
+                readThread.join()
+                if self.unique:
+                    self._writeUniqueResults(exporterSrc, keepResultsSrc)
+                if self.printToStdOut:
+                    sys.stdout.flush()
+                self.stageTimes["processing"] = timeit.default_timer() - startTime - self.stageTimes["startup"]
+            except BrokenPipeError:
+                # the reader of stdout is closed, e.g. fic parse ... | head: the remaining blocks are skipped
+                outputClosed = True
+                self.workerPool.cancelScan()
+            finally:
+                finishStart = timeit.default_timer()
+                if self.metrics:
+                    self.metricsSummary = self.metrics.close(self._getScannedFileCount())
+                    self.metrics = None
+                if not self.pool:
+                    self.workerPool.close()
+
+            # remove old entries from the cache
+            if self.resultCache:
+                removed = self.resultCache.evict()
+                if removed:
+                    LOG.debug("%d entries removed from cache" %(removed))
+                self.resultCache.close()
+            if self.journal:
+                self.journal.close()
+            self.stageTimes["finish"] = timeit.default_timer() - finishStart
+
+            # end quietly, the output is redirected to devnull, so the flush of stdout at the exit does not fail
+            if outputClosed:
+                LOG.debug("Stdout is closed, the processing is stopped")
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                sys.exit(1)
+
+            # check if there was anything to do
+            if readErrors:
+                raise readErrors[0]
+            if self.fileListSize < 1 and not self.resumedFiles and not self.otherShardFiles and \
+               not (self.triage and self.triage.getSkipped()[0]):
+                raise CrawlerFileReadError("No files to read.")
+            if self.retryBlocks:
+                self._printCrawlerMessage("[!] %d blocks were not finished, they are scanned again by a resumed run."
+                                          %(self.retryBlocks))
 
-            # do post processing
-            self.resultList.extend(shared_list)
             self._printCrawlerMessage("[+] Finished processing")
 
         except Exception as e:
@@ -415,38 +775,288 @@ class Crawler():
         except KeyboardInterrupt:
             print("[!] User interrupt.")
             try:
-                for process in processList:
-                    process.terminate()
+                if self.workerPool:
+                    self.workerPool.terminate()
+                # a checkpoint is only written between the blocks, otherwise the resumed run continues at the last
+                # periodical checkpoint
+                if self.journal and self.journal.journal:
+                    if not self.journalWriting:
+                        self._writeCheckpoint(exporterSrc)
+                    self.journal.close()
+                    print("[+] The run can be continued with --resume %s" %(self.journal.journalFile))
                 sys.exit(0)
             except SystemExit:
                 os._exit(0)
     # end do
 
+    ## Result writer
+    #  - gets the messages of the workers until all files are read and all blocks are finished
+    #  - writes the results to the exporter and sums up the matches, so the results are not kept in memory
+    #  - sums up the counters of the finished blocks and prints the processing status, with enabled metrics the
+    #    status line replaces the status messages
+    #  - the results of the primary files are copied to the duplicates
+    #  - with a journal the results of a block are held until the block is finished, the finished ranges are written
+    #    with the periodical checkpoints. The results of failed or lost blocks are dropped, a resumed run scans them
+    #    again.
+    #  @param readDoneSrc - event, is set if all blocks are submitted
+    def _writeResults(self, readDoneSrc:threading.Event, exporterSrc, keepResultsSrc:bool) -> None:
+        finishedBlocks = 0
+        while not readDoneSrc.is_set() or finishedBlocks < self.submittedBlocks:
+            if self.dedup:
+                self._writeLateDuplicates(readDoneSrc.is_set(), exporterSrc, keepResultsSrc)
+            if self.journal and self.journal.isDue():
+                self._writeCheckpoint(exporterSrc)
+            message = self.workerPool.getMessage(self.scanId)
+            if self.metrics:
+                self.metrics.refresh(self._getScannedFileCount())
+            if message is None:
+                continue
+
+            messageType, scanId, blockId, data = message
+            if messageType == "result":
+                if self.journal:
+                    self.heldResults.setdefault(blockId, []).append(data)
+                    continue
+                self._writeResult(data, exporterSrc, keepResultsSrc)
+                if self.dedup:
+                    self._writeDuplicates([data], [], readDoneSrc.is_set(), exporterSrc, keepResultsSrc)
+
+            elif messageType == "done":
+                finishedBlocks += 1
+                self.processedFileCount += data.get("processedFiles", 0)
+                if data.get("failed"):
+                    self._addFailedBlock(blockId, data.get("error", "unknown error"), data.get("files", []))
+                if self.journal and not self._writeBlock(blockId, not data.get("failed"), readDoneSrc.is_set(),
+                                                         exporterSrc, keepResultsSrc):
+                    LOG.info("[!] Block %d failed, it is scanned again by a resumed run" %(blockId))
+                    continue
+                self.whiteListedMatches += data.get("whitelistedMatches", 0)
+                self.overMaxMatchSize   += data.get("overMaxMatchSize", 0)
+                self.cachedRanges       += data.get("cachedRanges", 0)
+                self._addWhitelistHits(data.get("whitelistHits", {}))
+                self.patternTimeouts.extend(data.get("patternTimeouts", []))
+
+                if self.metrics and "metrics" in data:
+                    self.metrics.addBlock(data["metrics"])
+                if self.statusLine:
+                    continue
+
+                # log processing status for the user
+                self._printCrawlerMessage(" |- Processed files: %d / %d [%s %%]" % (self._getProcessedFileCount(),
+                                                                                    self.fileListSize, 
+                                                                                    self._getProcessStatus()))
+            elif messageType == "output":
+                self._writeOutput(data)
+
+            elif messageType == "unique":
+                for (iocType, matchString), entry in data.entries.items():
+                    self.resultSummary[iocType] = self.resultSummary.get(iocType, 0) + entry[0]
+                self.uniqueMatches.merge(data)
+
+            elif messageType == "metrics":
+                self.metrics.addBlock(data)
+
+            elif messageType == "lost":
+                # the results of the block are incomplete
+                finishedBlocks += 1
+                if self.journal:
+                    self._writeBlock(blockId, False, readDoneSrc.is_set(), exporterSrc, keepResultsSrc)
+                LOG.info("[!] Block %d was not finished by process %s" %(blockId, data["process"]))
+                self._addFailedBlock(blockId, "process %s exited with code %s" %(data["process"], data.get("exitcode")),
+                                     data.get("files", []))
+        # end while
+
+        if self.dedup:
+            self._writeLateDuplicates(True, exporterSrc, keepResultsSrc)
+        if self.journal:
+            self._writeCheckpoint(exporterSrc, self.retryBlocks == 0)
+    # end _writeResults
+
+    ## Adds a failed or lost block, the block is printed to stderr also without verbose mode
+    #  - the results of the files of the block are incomplete, the files are counted in the result summary
+    #  @param errorSrc - error message of the worker or the exit of the process
+    #  @param filesSrc - relative paths of the files of the block
+    def _addFailedBlock(self, blockIdSrc:int, errorSrc:str, filesSrc:list) -> None:
+        self.failedBlocks.append((blockIdSrc, errorSrc, filesSrc))
+        print("[!] Block %d failed, the results of %d files are incomplete: %s" %(blockIdSrc, len(filesSrc), errorSrc),
+              file=sys.stderr)
+        for path in filesSrc[:FAILED_FILES_SHOWN]:
+            print(" |- %s" %(path), file=sys.stderr)
+        if len(filesSrc) > FAILED_FILES_SHOWN:
+            print(" |- ... %d more files" %(len(filesSrc) - FAILED_FILES_SHOWN), file=sys.stderr)
+    # end _addFailedBlock
+
+    ## Returns the failed and lost blocks, the results of their files are incomplete
+    #  @return list of tuples (block id, error, relative paths of the files)
+    def getFailedBlocks(self) -> list:
+        return self.failedBlocks
+
+    ## Writes the held results of a finished block and adds the ranges of the block to the journal
+    #  - the results of a block are written together, so the export file contains only results of finished ranges
+    #  @param blockIdSrc - id of the finished block
+    #  @param finishedSrc - False if the block failed, the results are dropped
+    #  @param listingDoneSrc - True if all files are found
+    #  @return True if the block was written
+    def _writeBlock(self, blockIdSrc:int, finishedSrc:bool, listingDoneSrc:bool, exporterSrc, keepResultsSrc:bool) -> bool:
+        with self.pendingLock:
+            block = self.journalBlocks.pop(blockIdSrc, [])
+        results = self.heldResults.pop(blockIdSrc, [])
+        if not finishedSrc:
+            self.retryBlocks += 1
+            return False
+
+        self.journalWriting = True
+        ranges = [(path[self.beginnRootRelPath:], start, end) for path, start, end, printableOnly in block]
+        for cvo in results:
+            self._writeResult(cvo, exporterSrc, keepResultsSrc)
+        if self.dedup:
+            ranges += self._writeDuplicates(results, ranges, listingDoneSrc, exporterSrc, keepResultsSrc)
+        self.journal.addRanges(ranges)
+        self.journalWriting = False
+        return True
+    # end _writeBlock
+
+    ## Writes the results of a file to the exporter and sums up the matches
+    #  @param printSrc - print the results to stdout, the results of the workers are printed by the workers
+    def _writeResult(self, cvo, exporterSrc, keepResultsSrc:bool, printSrc:bool=False) -> None:
+        for ioc in cvo.mCount:
+            self.resultSummary[ioc] = self.resultSummary.get(ioc, 0) + cvo.mCount[ioc]
+        if exporterSrc:
+            exporterSrc.writeResult(cvo)
+        if keepResultsSrc:
+            self.resultList.append(cvo)
+        if printSrc and self.printToStdOut:
+            self._writeOutput(self._formatResult(cvo))
+    # end _writeResult
+
+    ## Copies the results of the primary files to the found duplicates
+    #  - while listing the results and the finished ranges are kept for the duplicates which are found later
+    #  @param resultsSrc - list of results of the primary files
+    #  @param rangesSrc - finished ranges of the primary files (journal), list of tuples (result path, start, end)
+    #  @param listingDoneSrc - True if all files are found
+    #  @return finished ranges of the duplicates, list of tuples (result path, start, end)
+    def _writeDuplicates(self, resultsSrc:list, rangesSrc:list, listingDoneSrc:bool, exporterSrc, keepResultsSrc:bool) -> list:
+        copies = []
+        ranges = []
+        with self.dedupLock:
+            for path, start, end in rangesSrc:
+                ranges.extend((duplicate, start, end) for duplicate in self.duplicates.get(path, ()))
+                if not listingDoneSrc:
+                    self.primaryRanges.setdefault(path, []).append((start, end))
+            for cvo in resultsSrc:
+                copies.extend(cvo.copy(duplicate) for duplicate in self.duplicates.get(cvo.path, ()))
+                if not listingDoneSrc:
+                    self.primaryResults.setdefault(cvo.path, []).append(cvo)
+        # end with
+        for cvo in copies:
+            self._writeResult(cvo, exporterSrc, keepResultsSrc, True)
+        return ranges
+    # end _writeDuplicates
+
+    ## Copies the kept results of the primary files to the duplicates which are found after the results
+    #  - if the listing is finished, no further duplicates are found and the kept results are removed
+    #  @param listingDoneSrc - True if all files are found
+    def _writeLateDuplicates(self, listingDoneSrc:bool, exporterSrc, keepResultsSrc:bool) -> None:
+        if not self.lateDuplicates and not (listingDoneSrc and (self.primaryResults or self.primaryRanges)):
+            return
+        with self.dedupLock:
+            lateDuplicates, self.lateDuplicates = self.lateDuplicates, []
+            if listingDoneSrc:
+                self.primaryResults = {}
+                self.primaryRanges  = {}
+        self.journalWriting = True
+        for path, results, ranges in lateDuplicates:
+            for cvo in results:
+                self._writeResult(cvo.copy(path), exporterSrc, keepResultsSrc, True)
+            if self.journal:
+                self.journal.addRanges([(path, start, end) for start, end in ranges])
+        self.journalWriting = False
+    # end _writeLateDuplicates
+
+    ## Formats the stdout lines of a result like the workers, see CrawlerWorker._acceptMatch
+    #  - the path of the result is already relative to the root offset, see CrawlerWorker.processBlock
+    #  @return bytes
+    def _formatResult(self, cvo) -> bytes:
+        path  = cvo.path
+        lines = []
+        if cvo.hasContext():
+            for ioc, matchString, offset, before, after in cvo.iterContextMatches():
+                printDict = {"path": path, "ioc": ioc, "match": matchString, "offset": str(offset),
+                             "before": escapeContext(before), "after": escapeContext(after)}
+                lines.append((offset, len(lines), formatOutputLine(printDict, self.result_columns, self.matchHighligting)))
+        else:
+            for ioc, matchString, offsets in cvo.iterMatches():
+                for offset in offsets:
+                    printDict = {"path": path, "ioc": ioc, "match": matchString, "offset": str(offset)}
+                    lines.append((offset, len(lines), formatOutputLine(printDict, self.result_columns, self.matchHighligting)))
+        if self.orderedOutput:
+            lines.sort()
+        return "".join([line for offset, index, line in lines]).encode("utf-8", "surrogateescape")
+    # end _formatResult
+
+    ## Writes the distinct matches of the unique mode
+    #  - the distinct matches are written to the exporter and printed to stdout
+    #  @param exporterSrc - stream exporter for the results, e.g. CrawlerCsvStreamExporter
+    #  @param keepResultsSrc - keep the results in the unique list
+    def _writeUniqueResults(self, exporterSrc, keepResultsSrc:bool) -> None:
+        uniqueResults = self.uniqueMatches.getUniqueResults()
+        self.uniqueMatches = None
+        outputLines = []
+        for uvo in uniqueResults:
+            if exporterSrc:
+                exporterSrc.writeUniqueResult(uvo)
+            if self.printToStdOut:
+                outputLines.append(self._formatUniqueResult(uvo))
+                if len(outputLines) >= 1000:
+                    self._writeOutput("".join(outputLines).encode("utf-8", "surrogateescape"))
+                    outputLines = []
+        if outputLines:
+            self._writeOutput("".join(outputLines).encode("utf-8", "surrogateescape"))
+        if keepResultsSrc:
+            self.uniqueList = uniqueResults
+    # end _writeUniqueResults
+
+    ## Formats a distinct match with the selected columns, the count and the file count
+    #  - path and offset are the first location of the match
+    def _formatUniqueResult(self, uvo) -> str:
+        printDict = {"path": uvo.path, "ioc": uvo.iocType, "match": uvo.match, "offset": str(uvo.offset),
+                     "count": str(uvo.count), "files": str(uvo.fileCount)}
+        return formatOutputLine(printDict, list(self.result_columns) + ["count", "files"], self.matchHighligting)
+    # end _formatUniqueResult
+
+    ## Writes result lines to stdout
+    #  - the lines are written as bytes without the text buffer of stdout
+    #  - a closed reader of stdout raises BrokenPipeError, it stops the processing (see do)
+    def _writeOutput(self, dataSrc:bytes) -> None:
+        try:
+            sys.stdout.buffer.write(dataSrc)
+        except AttributeError:
+            # stdout is replaced by a text stream, e.g. io.StringIO
+            sys.stdout.write(dataSrc.decode("utf-8", "surrogateescape"))
+    # end _writeOutput
+
     ## Calculates and returns the processing status
     #  @return string
     def _getProcessStatus(self) -> str:
-        return str(round(self.processedFileCount.value / self.fileListSize * 100, 2))
+        return str(round(self._getProcessedFileCount() / max(1, self.fileListSize) * 100, 2))
+
+    ## Returns the count of the processed files
+    #  - the duplicate files are processed by copying the results of the primary files, see _addDuplicate
+    #  @return int
+    def _getProcessedFileCount(self) -> int:
+        return self.processedFileCount + (self.dedup.duplicateFiles if self.dedup else 0)
+
+    ## Returns the count of the found files which are scanned by the workers, used for the metrics
+    #  @return int
+    def _getScannedFileCount(self) -> int:
+        return self.fileListSize - (self.dedup.duplicateFiles if self.dedup else 0)
 
     ## Print function for crawler program messages
-    #  - message will be printed if stdout is disabled
+    #  - message will be printed if stdout and the quiet mode are disabled
     def _printCrawlerMessage(self, msg:str) -> None:
-        if not self.printToStdOut:
+        if not self.printToStdOut and not self.quiet:
             if msg:
                 print(msg)
     # end def _printCrawlerMessage
 
-    ## Print function for crawler results
-    # - message will be printed if stdout is enabled
-    def _printCrawlerResult(self, printDictSrc:dict) -> None:
-        if self.printToStdOut:
-            printStr = ""
-            for item in self.result_columns:
-                # colored output for match
-                if item == "match" and self.matchHighligting:
-                    printStr += "\x1b[0;30;41m" + printDictSrc[item] + "\x1b[0m "
-                else:
-                    printStr += printDictSrc[item] + " "
-            print(printStr[:-1])
-    # end _printCrawlerResult
-
 # end class crawler
\ No newline at end of file
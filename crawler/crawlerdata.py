@@ -2,7 +2,30 @@
 
 ## --------------------------------------------------------------------------------------------------------------------
 
+import array     # for the match offsets
+import ipaddress # for network whitelist entries
 import os
+import re        # for pattern whitelist entries
+import threading # for the whitelist hit counters
+import warnings  # for global flags in whitelist entries
+
+from .crawlererr import CrawlerConfigError
+
+## --------------------------------------------------------------------------------------------------------------------
+
+# count of the saved locations of a unique match
+UNIQUE_SAMPLE_COUNT = 3
+
+# translation table of the context bytes, only printable ascii characters are kept
+CONTEXT_ESCAPE = {x: "\\x%02x" %(x) for x in range(256) if x < 0x20 or x > 0x7e}
+CONTEXT_ESCAPE[ord("\\")] = "\\\\"
+
+# references to groups by number in a regex whitelist entry, e.g. \1 or (?(1)...)
+WHITELIST_GROUPREF = re.compile(r"(?<!\\)(?:\\\\)*\\[1-9]|\(\?\(\d")
+
+# global inline flags at the begin of a regex whitelist entry, e.g. (?i), they are only valid at the begin of the
+# combined regex, so they are changed to a group with local flags: (?i)microsoft -> (?i:microsoft)
+WHITELIST_GLOBAL_FLAGS = re.compile(r"\A\(\?([aiLmsux]+)\)")
 
 ## --------------------------------------------------------------------------------------------------------------------
 
@@ -10,71 +33,568 @@ import os
 #  The Crawler Value Object (CrawlerVo) represents all ioc matches for a file.
 #  If the forioccrawler analysis more then one file objects, every file has its own "result" CrawlerVo object.
 #
+#  The matches are stored in columns per ioc type, so a match needs only a few bytes and the object is pickled fast:
+#  - strings - table of the match strings, every match string is stored once per ioc type
+#  - matchIds - array('I') with the index of the match string of every match
+#  - offsets - array('Q') with the file offset of every match
+#  - context (optional) - the bytes before and after the matches, see addMatch
+#
 #  The following member variables are used in the data object:
 #  - path - string with the path to the file object
 #  - fileName - string with the file name
-#  - mResult is a Dictionary for the match results, with the following structure
-#    [KEY - IoC-Type] : VALUE - [KEY - Item : List of Offsets]
-#  - mCount is 
+#  - mColumns is a Dictionary for the match results, with the following structure
+#    [KEY - IoC-Type] : VALUE - [strings, matchIds, offsets] or [strings, matchIds, offsets, context]
+#  - mCount is a Dictionary with the count of the matches per IoC-Type
+#  - mResults is the match structure of the previous versions, see the property
 class CrawlerVo:
+
+    __slots__ = ("path", "fileName", "mColumns", "_stringIndex")
+
     def __init__(self, filePathSrc:str) -> None:
-        self.path     = filePathSrc
-        self.fileName = os.path.basename(filePathSrc)
-        self.mResults = {}
-        self.mCount   = {}
-    
+        self.path         = filePathSrc
+        self.fileName     = os.path.basename(filePathSrc)
+        self.mColumns     = {}
+        self._stringIndex = None # [KEY - IoC-Type] : VALUE - [KEY - Match-Item : VALUE - index in strings]
+
+    ## Adds a match to the structure
+    #  iocTypeSrc - string - describes the ioc type
+    #  matchSrc - string - the match item
+    #  offsetSrc - int - file offset of the match
+    #  contextSrc - tuple (bytes before, bytes after) or None
+    #             -> the context of all matches of an ioc type is stored in one bytearray with the end positions and
+    #                the length of the before part in arrays: [data, array('I') ends, array('H') beforeLengths]
+    def addMatch(self, iocTypeSrc:str, matchSrc:str, offsetSrc:int, contextSrc:tuple=None) -> None:
+        if self._stringIndex is None:
+            self._buildStringIndex()
+        columns = self.mColumns.get(iocTypeSrc)
+        if columns is None:
+            columns = self.mColumns[iocTypeSrc] = [[], array.array('I'), array.array('Q')]
+            self._stringIndex[iocTypeSrc] = {}
+
+        stringIndex = self._stringIndex[iocTypeSrc]
+        matchId = stringIndex.get(matchSrc)
+        if matchId is None:
+            matchId = stringIndex[matchSrc] = len(columns[0])
+            columns[0].append(matchSrc)
+        columns[1].append(matchId)
+        columns[2].append(offsetSrc)
+
+        if contextSrc is not None:
+            if len(columns) == 3:
+                columns.append([bytearray(), array.array('I', bytes(4 * (len(columns[2]) - 1))),
+                                array.array('H', bytes(2 * (len(columns[2]) - 1)))])
+            context = columns[3]
+            context[0] += contextSrc[0]
+            context[0] += contextSrc[1]
+            context[1].append(len(context[0]))
+            context[2].append(len(contextSrc[0]))
+
     ## Adds matches to the structure
     #  iocTypeSrc - string - describes the ioc type
     #  matchDictSrc - dict - holds a set of matches and a list of offsets where the item was found
     #               -> Structure: [KEY - Match-Items : VALUE - List of Offsets]
     def addMatchResults(self, iocTypeSrc:str, matchDictSrc:dict) -> None:
-        if matchDictSrc:
-            # if ioc type is new, create it and add the values to the data object
-            if iocTypeSrc not in self.mResults:
-                self.mResults[iocTypeSrc] = matchDictSrc
-                
-                # add the count of the entries to the match count
-                for item in matchDictSrc:
-                    if iocTypeSrc in self.mCount.keys():
-                        self.mCount[iocTypeSrc] = self.mCount[iocTypeSrc] + len(matchDictSrc[item])
-                    else:
-                        self.mCount[iocTypeSrc] = len(matchDictSrc[item])
+        for item in matchDictSrc:
+            for offset in matchDictSrc[item]:
+                self.addMatch(iocTypeSrc, item, int(offset))
+
+    ## Returns the matches grouped by ioc type and match item
+    #  - the ioc types and match items are returned in the order of the first match
+    #  @return iterator of tuples (ioc type, match item, list of offsets)
+    def iterMatches(self):
+        for iocType, columns in self.mColumns.items():
+            strings, matchIds, offsets = columns[:3]
+            if len(strings) == len(matchIds):
+                # every match item was found once, the match ids are in order
+                for matchString, offset in zip(strings, offsets):
+                    yield iocType, matchString, [offset]
             else:
-                # if the ioc type already exists,
-                for item in matchDictSrc:
-                    # and if the current item already exists: extend the offset list
-                    if item in self.mResults[iocTypeSrc]:
-                        self.mResults[iocTypeSrc][item].extend(matchDictSrc[item])
-                        self.mCount[iocTypeSrc] = self.mCount[iocTypeSrc] + len(matchDictSrc[item])
-                    else:
-                        # if the item is not in the data object, create it and store the values
-                        self.mResults[iocTypeSrc][item] = matchDictSrc[item]
-                        self.mCount[iocTypeSrc] = self.mCount[iocTypeSrc] + len(matchDictSrc[item])
-                # end for
+                groups = [[] for x in strings]
+                for matchId, offset in zip(matchIds, offsets):
+                    groups[matchId].append(offset)
+                for matchString, group in zip(strings, groups):
+                    yield iocType, matchString, group
+
+    ## Returns the matches with the context in the order of iterMatches
+    #  @return iterator of tuples (ioc type, match item, offset, bytes before, bytes after)
+    #          -> the context is empty for matches without context
+    def iterContextMatches(self):
+        for iocType, columns in self.mColumns.items():
+            strings, matchIds, offsets = columns[:3]
+            groups = [[] for x in strings]
+            for index, matchId in enumerate(matchIds):
+                groups[matchId].append(index)
+
+            context = columns[3] if len(columns) > 3 else None
+            for matchString, group in zip(strings, groups):
+                for index in group:
+                    if context is None or index >= len(context[1]):
+                        yield iocType, matchString, offsets[index], b"", b""
+                        continue
+                    end    = context[1][index]
+                    start  = context[1][index - 1] if index else 0
+                    middle = start + context[2][index]
+                    yield iocType, matchString, offsets[index], bytes(context[0][start:middle]), bytes(context[0][middle:end])
+
+    ## Checks if context is stored for the matches
+    def hasContext(self) -> bool:
+        return any(len(columns) > 3 for columns in self.mColumns.values())
+
+    ## Returns the count of all matches
+    def getMatchCount(self) -> int:
+        return sum(len(columns[2]) for columns in self.mColumns.values())
+
+    ## Count of the matches per ioc type
+    @property
+    def mCount(self) -> dict:
+        return {iocType: len(columns[2]) for iocType, columns in self.mColumns.items()}
+
+    ## Match structure of the previous versions, it is created on every call
+    #  -> Structure: [KEY - IoC-Type] : VALUE - [KEY - Item : List of Offsets (strings)]
+    @property
+    def mResults(self) -> dict:
+        results = {}
+        for iocType, matchString, offsets in self.iterMatches():
+            results.setdefault(iocType, {})[matchString] = [str(x) for x in offsets]
+        return results
+
+    ## Returns a value object with the matches for another file, e.g. a file with the same content
+    #  - the matches are shared, no matches can be added to the returned object
+    def copy(self, filePathSrc:str):
+        cvo = CrawlerVo(filePathSrc)
+        cvo.mColumns = self.mColumns
+        return cvo
+
+    ## Creates the index of the match strings, it is not pickled
+    def _buildStringIndex(self) -> None:
+        self._stringIndex = {}
+        for iocType, columns in self.mColumns.items():
+            self._stringIndex[iocType] = {matchString: index for index, matchString in enumerate(columns[0])}
+
+    def __getstate__(self) -> tuple:
+        return (self.path, self.fileName, self.mColumns)
+
+    def __setstate__(self, stateSrc:tuple) -> None:
+        self.path, self.fileName, self.mColumns = stateSrc
+        self._stringIndex = None
 # end class CrawlerVo
 
+## Escapes the context bytes of a match for the output
+#  - printable ascii characters are kept, a backslash and all other bytes are written as escape sequence (\\, \xNN)
+def escapeContext(dataSrc:bytes) -> str:
+    return dataSrc.decode("latin-1").translate(CONTEXT_ESCAPE)
+
+## --------------------------------------------------------------------------------------------------------------------
+## Crawler match object
+#  Represents a single match, it is returned by the scanner (see CrawlerScanner.scan).
+#  - path - path of the file or the virtual path of an archive member
+#  - iocType, match, offset - the ioc type, the match item and the file offset
+#  - before, after - the context of the match (bytes), None without context
+class CrawlerMatchVo:
+
+    __slots__ = ("path", "iocType", "match", "offset", "before", "after")
+
+    def __init__(self, pathSrc:str, iocTypeSrc:str, matchSrc:str, offsetSrc:int, beforeSrc:bytes=None,
+                 afterSrc:bytes=None) -> None:
+        self.path    = pathSrc
+        self.iocType = iocTypeSrc
+        self.match   = matchSrc
+        self.offset  = offsetSrc
+        self.before  = beforeSrc
+        self.after   = afterSrc
+
+    ## Returns the match as dict, the context is escaped (see escapeContext)
+    def toDict(self) -> dict:
+        result = {"path": self.path, "ioc": self.iocType, "match": self.match, "offset": self.offset}
+        if self.before is not None:
+            result["before"] = escapeContext(self.before)
+            result["after"]  = escapeContext(self.after)
+        return result
+
+    def __repr__(self) -> str:
+        return "CrawlerMatchVo(%r, %r, %r, %d)" %(self.path, self.iocType, self.match, self.offset)
+
+# end class CrawlerMatchVo
+
+## --------------------------------------------------------------------------------------------------------------------
+## Crawler unique match object
+#  Represents a distinct match of an ioc type over all files, see CrawlerUniqueData.
+#  - iocType, match - the ioc type and the match item
+#  - count - count of all matches
+#  - fileCount - count of the files with the match
+#  - samples - list of tuples (path, offset), the first locations of the match in the order of path and offset
+#  - path, offset - the first location
+class CrawlerUniqueVo:
+
+    __slots__ = ("iocType", "match", "count", "fileCount", "samples")
+
+    def __init__(self, iocTypeSrc:str, matchSrc:str, countSrc:int, fileCountSrc:int, samplesSrc:list) -> None:
+        self.iocType   = iocTypeSrc
+        self.match     = matchSrc
+        self.count     = countSrc
+        self.fileCount = fileCountSrc
+        self.samples   = samplesSrc
+
+    @property
+    def path(self) -> str:
+        return self.samples[0][0]
+
+    @property
+    def offset(self) -> int:
+        return self.samples[0][1]
+
+# end class CrawlerUniqueVo
+
+## --------------------------------------------------------------------------------------------------------------------
+## Crawler unique match data
+#  Aggregates the matches to distinct matches per ioc type, the memory depends on the count of the distinct matches and
+#  not on the count of all matches. The workers aggregate the results of their files and the result writer merges the
+#  aggregates of the workers.
+#
+#  The entries have the following structure:
+#  [KEY - (IoC-Type, Match-Item)] : VALUE - [count, file count, samples, split files]
+#  - samples - the first UNIQUE_SAMPLE_COUNT locations (path, offset) in the order of path and offset
+#  - split files - paths of large files, which are processed in several ranges. They are counted once at the end,
+#    because the ranges of a file can be processed by different workers.
+class CrawlerUniqueData:
+
+    def __init__(self) -> None:
+        self.entries   = {}
+        self._lastPath = None  # the file of the last results, the results of a file are added in a row
+        self._lastKeys = set() # the matches of the last file, which are already counted
+
+    ## Adds the results of a file or of a part of a file
+    #  @param cvo - CrawlerVo
+    #  @param splitSrc - True if the results are from a range of a large file
+    def addResult(self, cvo:CrawlerVo, splitSrc:bool=False) -> None:
+        if cvo.path != self._lastPath:
+            self._lastPath = cvo.path
+            self._lastKeys = set()
+
+        for iocType, matchString, offsets in cvo.iterMatches():
+            key   = (iocType, matchString)
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = [0, 0, [], set()]
+            entry[0] += len(offsets)
+
+            if splitSrc:
+                entry[3].add(cvo.path)
+            elif key not in self._lastKeys:
+                self._lastKeys.add(key)
+                entry[1] += 1
+
+            if len(entry[2]) < UNIQUE_SAMPLE_COUNT or (cvo.path, offsets[0]) < entry[2][-1]:
+                entry[2] = sorted(entry[2] + [(cvo.path, x) for x in offsets[:UNIQUE_SAMPLE_COUNT]])[:UNIQUE_SAMPLE_COUNT]
+        # end for
+    # end def addResult
+
+    ## Merges the entries of an other aggregate
+    #  @param uniqueDataSrc - CrawlerUniqueData
+    def merge(self, uniqueDataSrc) -> None:
+        for key, (count, fileCount, samples, splitFiles) in uniqueDataSrc.entries.items():
+            entry = self.entries.get(key)
+            if entry is None:
+                self.entries[key] = [count, fileCount, samples, splitFiles]
+                continue
+            entry[0] += count
+            entry[1] += fileCount
+            entry[2]  = sorted(entry[2] + samples)[:UNIQUE_SAMPLE_COUNT]
+            entry[3] |= splitFiles
+    # end def merge
+
+    ## Returns the distinct matches
+    #  - sorted by ioc type, count (descending) and match
+    #  @return list of CrawlerUniqueVo
+    def getUniqueResults(self) -> list:
+        results = [CrawlerUniqueVo(iocType, matchString, count, fileCount + len(splitFiles), samples)
+                   for (iocType, matchString), (count, fileCount, samples, splitFiles) in self.entries.items()]
+        results.sort(key=lambda x: (x.iocType, -x.count, x.match))
+        return results
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getstate__(self) -> dict:
+        return {"entries": self.entries}
+
+    def __setstate__(self, stateSrc:dict) -> None:
+        self.entries   = stateSrc["entries"]
+        self._lastPath = None
+        self._lastKeys = set()
+
+# end class CrawlerUniqueData
+
 ## --------------------------------------------------------------------------------------------------------------------
 ## Crawler white list data object
+#  The whitelist entries are stored in two indexes: one for file paths and one for matches (network iocs etc.).
+#  - sections with "PATH" in the name are only used for file paths (e.g. WHITELIST_PATH)
+#  - sections with "NETWORK" in the name are only used for matches (e.g. WHITELIST_NETWORK)
+#  - all other sections are used for file paths and matches
+#
+#  The following entry types are supported:
+#  - value          - prefix, every path or match which starts with the value is whitelisted
+#  - =value         - exact, only the value itself is whitelisted
+#  - *value         - suffix, every path or match which ends with the value is whitelisted (e.g. *.example.com)
+#  - ~value         - contains, every path or match which contains the value is whitelisted
+#  - glob:pattern   - glob, the whole path or match must match the pattern, * matches any characters and ? one
+#                     character (e.g. glob:update*.microsoft.com)
+#  - re:regex       - regex, every path or match with a match of the regular expression is whitelisted
+#  - 10.0.0.0/8     - network, every ip address of the network is whitelisted (only in match sections)
+#
+#  Every entry is a rule, the hits of the rules are counted by the contains methods. The hits are collected with
+#  popHits, so unused rules can be found (see Crawler.getWhitelistRuleHits).
 class CrawlerWhitelistData:
     def __init__(self) -> None:
-        self.wh_data = {}
-        self.wh_list = []
+        self.wh_data      = {}
+        self.wh_list      = []
+        self.rules        = [] # names of the rules "section/option: entry", the index is the rule id
+        self.hits         = {} # [KEY - rule id] : VALUE - count of hits since the last popHits
+        self.hitLock      = threading.Lock() # the paths are checked by the walker threads
+        self.pathIndex    = CrawlerWhitelistIndex()
+        self.networkIndex = CrawlerWhitelistIndex()
     
     def addWhiteListItem(self, sectionNameSrc, optionNameSrc, option_data) -> None:
         if sectionNameSrc and optionNameSrc and option_data:
             if option_data:
                 for value in option_data:
+                    value = value.strip()
+                    if not value:
+                        continue
+                    ruleId = len(self.rules)
+                    self.rules.append("%s/%s: %s" %(sectionNameSrc, optionNameSrc, value))
                     self.wh_list.append(value)
+                    if "NETWORK" not in sectionNameSrc.upper():
+                        self.pathIndex.addItem(value, False, ruleId)
+                    if "PATH" not in sectionNameSrc.upper():
+                        self.networkIndex.addItem(value, True, ruleId)
             if sectionNameSrc not in self.wh_data:
                 self.wh_data[sectionNameSrc] = dict({optionNameSrc:option_data})
             else:
                 self.wh_data[sectionNameSrc].update(dict({optionNameSrc:option_data}))
 
+    ## Creates the combined regex of the regex entries, so invalid entries are found while loading the whitelist
+    #  @exception CrawlerConfigError
+    def compile(self) -> None:
+        self.pathIndex.compilePatterns()
+        self.networkIndex.compilePatterns()
+
+    ## Checks if a file path is whitelisted
+    def containsPath(self, value) -> bool:
+        return self._addHit(self.pathIndex.getRule(value))
+
+    ## Checks if a directory and all paths below are whitelisted
+    #  - only prefix entries are used, exact, suffix and pattern entries can not whitelist a whole directory
+    def containsPathTree(self, value) -> bool:
+        return self._addHit(_startsWithTrie(self.pathIndex.prefixTrie, value))
+
+    ## Checks if a match is whitelisted
+    def containsMatch(self, value) -> bool:
+        return self._addHit(self.networkIndex.getRule(value))
+
+    ## Counts the hit of a rule
+    #  @param ruleIdSrc - id of the rule, None if no rule matched
+    #  @return True if a rule matched
+    def _addHit(self, ruleIdSrc) -> bool:
+        if ruleIdSrc is None:
+            return False
+        with self.hitLock:
+            self.hits[ruleIdSrc] = self.hits.get(ruleIdSrc, 0) + 1
+        return True
+    # end def _addHit
+
+    ## Returns the hits of the rules since the last call and resets them
+    #  @return dict [KEY - rule id] : VALUE - count of hits
+    def popHits(self) -> dict:
+        with self.hitLock:
+            hits, self.hits = self.hits, {}
+        return hits
+    # end def popHits
+
     def __contains__(self, value) -> bool:
-        for item in self.wh_list:
-            if value.startswith(item):
-                return True
+        return value in self.pathIndex or value in self.networkIndex
 
 # end class CrawlerWhitelistData
 
+## --------------------------------------------------------------------------------------------------------------------
+## Crawler white list index
+#  Index for the whitelist entries of the CrawlerWhitelistData. The lookup time of the prefix, suffix, exact and
+#  network entries depends on the length of the value and not on the count of the whitelist entries.
+#  - prefix entries are stored in a character trie, the trie is walked along the value
+#  - suffix entries are stored in a character trie of the reversed entries
+#  - exact entries are stored in a dict
+#  - network entries are stored as network address per prefix length
+#  - contains, glob and regex entries are combined into one regex with a group per entry, so the value is searched
+#    once for all of these entries. The group of the match is the matching entry.
+#  Every entry stores the id of its rule, see CrawlerWhitelistData.
+class CrawlerWhitelistIndex:
+    def __init__(self) -> None:
+        self.prefixTrie    = {}
+        self.suffixTrie    = {}
+        self.exactItems    = {} # [KEY - entry] : VALUE - rule id
+        self.networks      = {4: {}, 6: {}} # [KEY - ip version] : VALUE - [KEY - prefix length : [KEY - network address : VALUE - rule id]]
+        self.patternItems  = [] # list of tuples (regex, rule id)
+        self.patternRegex  = None # combined regex of the pattern items, see compilePatterns
+        self.patternGroups = {} # [KEY - group index in the combined regex] : VALUE - rule id
+        self.itemCount     = 0
+
+    ## Adds an entry to the index
+    #  @param valueSrc - whitelist entry
+    #  @param networkSrc - network entries like 10.0.0.0/8 are allowed
+    #  @param ruleIdSrc - id of the rule, it is returned by getRule
+    def addItem(self, valueSrc:str, networkSrc:bool, ruleIdSrc:int=0) -> None:
+        if valueSrc.startswith("="):
+            self.exactItems.setdefault(valueSrc[1:], ruleIdSrc)
+        elif valueSrc.startswith("~"):
+            self._addPattern(re.escape(valueSrc[1:]), ruleIdSrc, valueSrc)
+        elif valueSrc.startswith("glob:"):
+            self._addPattern(_translateGlob(valueSrc[5:]), ruleIdSrc, valueSrc)
+        elif valueSrc.startswith("re:"):
+            self._addPattern(valueSrc[3:], ruleIdSrc, valueSrc)
+        elif valueSrc.startswith("*"):
+            _addToTrie(self.suffixTrie, valueSrc[1:][::-1], ruleIdSrc)
+        elif networkSrc and "/" in valueSrc and self._addNetwork(valueSrc, ruleIdSrc):
+            pass
+        else:
+            _addToTrie(self.prefixTrie, valueSrc, ruleIdSrc)
+        self.itemCount += 1
+
+    ## Adds a network entry
+    #  @return False if the entry is no network
+    def _addNetwork(self, valueSrc:str, ruleIdSrc:int) -> bool:
+        try:
+            network = ipaddress.ip_network(valueSrc, strict=False)
+        except ValueError:
+            return False
+        addresses = self.networks[network.version].setdefault(network.prefixlen, {})
+        addresses.setdefault(int(network.network_address), ruleIdSrc)
+        return True
+
+    ## Adds a regex entry, the regex is validated at once
+    #  - references to groups by number are not possible, the groups are renumbered in the combined regex
+    #  - global inline flags at the begin are changed to local flags (see WHITELIST_GLOBAL_FLAGS), global flags after
+    #    the begin are invalid
+    #  @param entrySrc - whitelist entry for the error message
+    def _addPattern(self, regexSrc:str, ruleIdSrc:int, entrySrc:str) -> None:
+        flags = ""
+        match = WHITELIST_GLOBAL_FLAGS.match(regexSrc)
+        while match:
+            flags   += match.group(1)
+            regexSrc = regexSrc[match.end():]
+            match    = WHITELIST_GLOBAL_FLAGS.match(regexSrc)
+        if flags:
+            regexSrc = "(?%s:%s)" %(flags, regexSrc)
+        try:
+            # global flags after the begin are only deprecated before python 3.11
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", DeprecationWarning)
+                re.compile(regexSrc)
+        except (re.error, DeprecationWarning) as e:
+            raise CrawlerConfigError("Invalid whitelist entry %s: %s" %(entrySrc, str(e)))
+        if WHITELIST_GROUPREF.search(regexSrc):
+            raise CrawlerConfigError("Invalid whitelist entry %s: references to groups by number are not supported, "
+                                     "use named groups" %(entrySrc))
+        self.patternItems.append((regexSrc, ruleIdSrc))
+        self.patternRegex = None
+
+    ## Creates the combined regex of the pattern items
+    #  - every entry is enclosed by a group, the groups of an entry follow its group
+    #  @exception CrawlerConfigError
+    def compilePatterns(self) -> None:
+        if not self.patternItems:
+            return
+        parts  = []
+        groups = {}
+        index  = 1
+        for regex, ruleId in self.patternItems:
+            parts.append("(%s)" %(regex))
+            groups[index] = ruleId
+            index += 1 + re.compile(regex).groups
+        try:
+            self.patternRegex = re.compile("|".join(parts))
+        except re.error as e:
+            raise CrawlerConfigError("Invalid whitelist entries: %s" %(str(e)))
+        self.patternGroups = groups
+    # end def compilePatterns
+
+    ## Returns the id of the network rule of a value
+    def _getAddressRule(self, value):
+        if not value or not (value[0].isdigit() or ":" in value):
+            return None
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            return None
+        bits = address.max_prefixlen
+        for prefixLen, addresses in self.networks[address.version].items():
+            ruleId = addresses.get((int(address) >> (bits - prefixLen)) << (bits - prefixLen))
+            if ruleId is not None:
+                return ruleId
+        return None
+
+    ## Returns the id of the rule which whitelists a value
+    #  @return rule id, None if the value is not whitelisted
+    def getRule(self, value):
+        ruleId = self.exactItems.get(value)
+        if ruleId is not None:
+            return ruleId
+        ruleId = _startsWithTrie(self.prefixTrie, value)
+        if ruleId is not None:
+            return ruleId
+        if self.suffixTrie:
+            ruleId = _startsWithTrie(self.suffixTrie, value[::-1])
+            if ruleId is not None:
+                return ruleId
+        if self.networks[4] or self.networks[6]:
+            ruleId = self._getAddressRule(value)
+            if ruleId is not None:
+                return ruleId
+        if self.patternItems:
+            if self.patternRegex is None:
+                self.compilePatterns()
+            match = self.patternRegex.search(value)
+            if match:
+                return self.patternGroups[match.lastindex]
+        return None
+    # end def getRule
+
+    def __contains__(self, value) -> bool:
+        return self.getRule(value) is not None
+
+# end class CrawlerWhitelistIndex
+
+## Adds a string to a character trie, the end of the string is marked with the key None and the rule id
+def _addToTrie(trieSrc:dict, valueSrc:str, ruleIdSrc:int=0) -> None:
+    node = trieSrc
+    for char in valueSrc:
+        node = node.setdefault(char, {})
+    node.setdefault(None, ruleIdSrc)
+
+## Checks if a value starts with a string of the character trie
+#  @return rule id of the shortest string, None if the value starts with no string
+def _startsWithTrie(trieSrc:dict, valueSrc:str):
+    node = trieSrc
+    if None in node:
+        return node[None]
+    for char in valueSrc:
+        node = node.get(char)
+        if node is None:
+            return None
+        if None in node:
+            return node[None]
+    return None
+
+## Returns the regex of a glob pattern, * matches any characters and ? one character
+def _translateGlob(globSrc:str) -> str:
+    parts = []
+    for char in globSrc:
+        if char == "*":
+            if not parts or parts[-1] != ".*":
+                parts.append(".*")
+        elif char == "?":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return r"\A(?s:%s)\Z" %("".join(parts))
+
 ## --------------------------------------------------------------------------------------------------------------------
\ No newline at end of file
@@ -48,4 +48,14 @@ class CrawlerProcessError(CrawlerError):
 ## Exception for export errors
 class CrawlerExportError(CrawlerError):
     def __init__(self, what):
-        self.msg = '[!] Error while export. Message: ' + what
\ No newline at end of file
+        self.msg = '[!] Error while export. Message: ' + what
+
+## Exception for archive errors
+class CrawlerArchiveError(CrawlerError):
+    def __init__(self, what):
+        self.msg = '[!] Error while reading archive. Message: ' + what
+
+## Exception for patterns which exceed their time budget, see the watchdog of CrawlerWorker
+class CrawlerPatternTimeout(CrawlerError):
+    def __init__(self, what):
+        self.msg = '[!] Pattern search stopped by the watchdog. Message: ' + what
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import hashlib         # for the content hashes
+import logging         # for log
+import threading       # for the walker threads
+
+## --------------------------------------------------------------------------------------------------------------------
+
+LOG = logging.getLogger('IocCrawlerLog')
+
+# size of the begin and the end of a file, which are hashed for the first comparison
+DEDUP_PARTIAL_SIZE = 64 * 1024
+
+# read size for the hash of the whole file
+DEDUP_READ_SIZE    = 1024 * 1024
+
+# count of the locks for the size groups, files of different sizes are compared in parallel
+DEDUP_LOCK_COUNT   = 64
+
+## --------------------------------------------------------------------------------------------------------------------
+## Index of the file contents for the deduplication
+#  The walker threads check every found file, if the content was found before. Only the first file of a content
+#  (the primary file) is scanned, the matches are copied to the other files (see Crawler._addDuplicate). The
+#  content is compared in steps, so most files are not read:
+#  - (device, inode) - hardlinks and links to the same file
+#  - size - only files of the same size are compared, the first file of a size is never read
+#  - partial hash - hash of the begin and the end of the file
+#  - full hash - hash of the whole file, only if the partial hash does not cover the whole file
+#  Files which can not be read are not deduplicated, the error is reported while processing.
+class CrawlerDedupIndex:
+
+    def __init__(self) -> None:
+        self.fileIds        = {} # [KEY - (device, inode)] : VALUE - path of the primary file
+        self.sizes          = {} # [KEY - size] : VALUE - [KEY - partial hash, None before the second file of the size] : VALUE - list of primary files
+        self.fullHashes     = {} # [KEY - path] : VALUE - hash of the whole file
+        self.locks          = [threading.Lock() for x in range(DEDUP_LOCK_COUNT)]
+        self.duplicateFiles = 0
+        self.savedBytes     = 0
+        self.countLock      = threading.Lock()
+    # end init
+
+    ## Returns the primary file of a content
+    #  - the files of a size are checked one after the other, so the hashes of a file are created once
+    #  @param filePathSrc - path of the found file
+    #  @param fileSizeSrc - size of the file
+    #  @param fileIdSrc - tuple (device, inode) of the file or None
+    #  @return path of the primary file, None if the file is a new primary file
+    def getPrimary(self, filePathSrc:str, fileSizeSrc:int, fileIdSrc:tuple=None):
+        with self.locks[fileSizeSrc % DEDUP_LOCK_COUNT]:
+            primary = self.fileIds.get(fileIdSrc) if fileIdSrc else None
+            if primary is None:
+                primary = self._findContent(filePathSrc, fileSizeSrc)
+            if fileIdSrc:
+                self.fileIds.setdefault(fileIdSrc, primary or filePathSrc)
+        # end with
+
+        if primary is None:
+            return None
+        with self.countLock:
+            self.duplicateFiles += 1
+            self.savedBytes     += fileSizeSrc
+        LOG.debug("%s is a duplicate of %s" %(filePathSrc, primary))
+        return primary
+    # end def getPrimary
+
+    ## Searches a primary file with the same content and adds the file as primary file if there is none
+    #  - the first file of a size is hashed when the second file of the size is found
+    #  @return path of the primary file, None if the file is a new primary file
+    def _findContent(self, filePathSrc:str, fileSizeSrc:int):
+        if fileSizeSrc == 0:
+            # empty files have no matches
+            return None
+        group = self.sizes.get(fileSizeSrc)
+        if group is None:
+            self.sizes[fileSizeSrc] = {None: [filePathSrc]}
+            return None
+
+        for unhashed in group.pop(None, []):
+            partialHash = self._getHash(unhashed, fileSizeSrc, True)
+            if partialHash is not None:
+                group.setdefault(partialHash, []).append(unhashed)
+
+        partialHash = self._getHash(filePathSrc, fileSizeSrc, True)
+        if partialHash is None:
+            return None
+        for candidate in group.get(partialHash, ()):
+            # the partial hash contains the whole file of small files
+            if fileSizeSrc <= 2 * DEDUP_PARTIAL_SIZE:
+                return candidate
+            fullHash = self._getFullHash(filePathSrc, fileSizeSrc)
+            if fullHash is not None and fullHash == self._getFullHash(candidate, fileSizeSrc):
+                return candidate
+        group.setdefault(partialHash, []).append(filePathSrc)
+        return None
+    # end def _findContent
+
+    ## Returns the hash of the whole file, the hash is created once
+    def _getFullHash(self, filePathSrc:str, fileSizeSrc:int):
+        if filePathSrc not in self.fullHashes:
+            self.fullHashes[filePathSrc] = self._getHash(filePathSrc, fileSizeSrc, False)
+        return self.fullHashes[filePathSrc]
+    # end def _getFullHash
+
+    ## Creates the hash of a file
+    #  @param partialSrc - True for the hash of the begin and the end of the file, False for the whole file
+    #  @return hash, None if the file can not be read or the size was changed
+    def _getHash(self, filePathSrc:str, fileSizeSrc:int, partialSrc:bool):
+        fileHash = hashlib.sha256()
+        try:
+            with open(filePathSrc, 'rb') as f:
+                if partialSrc:
+                    fileHash.update(f.read(DEDUP_PARTIAL_SIZE))
+                    if fileSizeSrc > DEDUP_PARTIAL_SIZE:
+                        f.seek(max(DEDUP_PARTIAL_SIZE, fileSizeSrc - DEDUP_PARTIAL_SIZE))
+                        fileHash.update(f.read(DEDUP_PARTIAL_SIZE))
+                else:
+                    for data in iter(lambda: f.read(DEDUP_READ_SIZE), b''):
+                        fileHash.update(data)
+                if f.tell() != fileSizeSrc or f.read(1):
+                    raise IOError("File size changed since the listing")
+            return fileHash.digest()
+        except (IOError, OSError) as e:
+            LOG.debug("%s not deduplicated: %s" %(filePathSrc, getattr(e, 'message', repr(e))))
+            return None
+    # end def _getHash
+
+# end class CrawlerDedupIndex
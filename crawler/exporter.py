@@ -2,9 +2,32 @@
 
 ## --------------------------------------------------------------------------------------------------------------------
 
-import csv # for csv export
+import csv             # for csv export
+import gzip            # for compressed export files
+import io              # for buffered writing
+import json            # for json lines export
+import os              # for removing old export files
+import sqlite3         # for sqlite export
 
 from .crawlererr  import CrawlerExportError
+from .crawlerdata import escapeContext
+
+## --------------------------------------------------------------------------------------------------------------------
+
+# formats of the stream exporters
+EXPORT_CSV         = "csv"
+EXPORT_JSONL       = "jsonl"
+EXPORT_SQLITE      = "sqlite"
+EXPORT_FORMATS     = (EXPORT_CSV, EXPORT_JSONL, EXPORT_SQLITE)
+
+# writing
+EXPORT_BUFFER_SIZE = 1024 * 1024      # size of the write buffer of the export files
+EXPORT_BATCH_ROWS  = 10000            # rows of a sqlite transaction
+
+# columns of a match, the escaped context of a match and the additional columns of a distinct match in unique mode
+MATCH_COLUMNS      = ("path", "ioc", "match", "offset")
+CONTEXT_COLUMNS    = ("before", "after")
+UNIQUE_COLUMNS     = ("count", "files")
 
 ## --------------------------------------------------------------------------------------------------------------------
 ## Export class for ioc crawler
@@ -12,41 +35,380 @@ class CrawlerExporter:
 
     ## export data to csv file
     def csvExport(exportFileNameSrc:str, exportListSrc:list, formatSrc:list):
+        with CrawlerCsvStreamExporter(exportFileNameSrc, formatSrc) as exporter:
+            for fileResult in exportListSrc:
+                exporter.writeResult(fileResult)
+    # end def csvExport
+
+    ## export data to json lines file
+    def jsonExport(exportFileNameSrc:str, exportListSrc:list, formatSrc:list):
+        with CrawlerJsonStreamExporter(exportFileNameSrc, formatSrc) as exporter:
+            for fileResult in exportListSrc:
+                exporter.writeResult(fileResult)
+    # end def jsonExport
+
+# end CrawlerExporter
+
+## --------------------------------------------------------------------------------------------------------------------
+## Creates a stream exporter
+#  @param exportFileNameSrc - path of the export file
+#  @param formatSrc - list of the columns
+#  @param exportFormatSrc - one of EXPORT_FORMATS
+#  @param compressSrc - write a gzip compressed file (csv and json lines only)
+#  @param resumePositionSrc - continue the export file after this position, see the checkpoint method of the exporters
+#  @return stream exporter
+def createStreamExporter(exportFileNameSrc:str, formatSrc:list, exportFormatSrc:str=EXPORT_CSV, compressSrc:bool=False,
+                         resumePositionSrc:int=None):
+    if exportFormatSrc == EXPORT_CSV:
+        return CrawlerCsvStreamExporter(exportFileNameSrc, formatSrc, compressSrc, resumePositionSrc)
+    elif exportFormatSrc == EXPORT_JSONL:
+        return CrawlerJsonStreamExporter(exportFileNameSrc, formatSrc, compressSrc, resumePositionSrc)
+    elif exportFormatSrc == EXPORT_SQLITE:
+        if compressSrc:
+            raise CrawlerExportError("Compression is not supported for sqlite files.")
+        return CrawlerSqliteStreamExporter(exportFileNameSrc, formatSrc, resumePositionSrc)
+    raise CrawlerExportError("Unknown export format: %s" %(exportFormatSrc))
+# end def createStreamExporter
+
+## Opens an export file for writing text with a large write buffer
+#  @param compressSrc - the data is gzip compressed
+#  @param resumePositionSrc - the file is truncated to this position and the data is appended, a compressed file gets
+#                             a new gzip member
+def _openExportFile(exportFileNameSrc:str, compressSrc:bool=False, resumePositionSrc:int=None):
+    mode = 'w'
+    if resumePositionSrc is not None:
+        if not os.path.exists(exportFileNameSrc):
+            raise CrawlerExportError("The export file %s does not exist." %(exportFileNameSrc))
+        if os.path.getsize(exportFileNameSrc) < resumePositionSrc:
+            raise CrawlerExportError("The export file %s is shorter than the journal position." %(exportFileNameSrc))
+        os.truncate(exportFileNameSrc, resumePositionSrc)
+        mode = 'a'
+    if compressSrc:
+        rawFile = gzip.GzipFile(exportFileNameSrc, mode + 'b')
+    else:
+        rawFile = io.FileIO(exportFileNameSrc, mode)
+    return io.TextIOWrapper(io.BufferedWriter(rawFile, EXPORT_BUFFER_SIZE), encoding='utf-8', newline='')
+# end def _openExportFile
+
+## Writes the data of an export file to the disk
+#  - a compressed file is closed, so the gzip member is complete, and is opened again for the next member
+#  @return tuple (export file, position after the written data)
+def _checkpointExportFile(exportFileSrc, exportFileNameSrc:str, compressSrc:bool) -> tuple:
+    exportFileSrc.flush()
+    if compressSrc:
+        exportFileSrc.close()
+        exportFileSrc = _openExportFile(exportFileNameSrc, True, os.path.getsize(exportFileNameSrc))
+    os.fsync(exportFileSrc.fileno())
+    return exportFileSrc, os.path.getsize(exportFileNameSrc)
+# end def _checkpointExportFile
+
+## Returns the rows of a result object
+#  - the context is escaped, it is empty if the matches have no context
+#  @param fileResult - CrawlerVo
+#  @return iterator of tuples (path, ioc, match, offset, before, after)
+def _iterRows(fileResult):
+    path = fileResult.path
+    if fileResult.hasContext():
+        for ioc, entry, offset, before, after in fileResult.iterContextMatches():
+            yield (path, ioc, entry, offset, escapeContext(before), escapeContext(after))
+        return
+    for ioc, entry, offsets in fileResult.iterMatches():
+        for offset in offsets:
+            yield (path, ioc, entry, offset, "", "")
+# end def _iterRows
+
+## Returns the row of a distinct match, see MATCH_COLUMNS, CONTEXT_COLUMNS and UNIQUE_COLUMNS
+#  @param uniqueResult - CrawlerUniqueVo
+def _getUniqueRow(uniqueResult) -> tuple:
+    return (uniqueResult.path, uniqueResult.iocType, uniqueResult.match, uniqueResult.offset, "", "",
+            uniqueResult.count, uniqueResult.fileCount)
+# end def _getUniqueRow
+
+## Returns the indexes of the columns in the rows
+def _getColumnIndexes(formatSrc:list) -> list:
+    allColumns = MATCH_COLUMNS + CONTEXT_COLUMNS + UNIQUE_COLUMNS
+    try:
+        return [allColumns.index(field) for field in formatSrc]
+    except ValueError as e:
+        raise CrawlerExportError(getattr(e, 'message', repr(e)))
+# end def _getColumnIndexes
+
+## --------------------------------------------------------------------------------------------------------------------
+## Stream export class for csv files
+#  The results are written while the crawler is running, so the results have not to be kept in memory.
+#  The exporter can be used as context manager, otherwise the file have to be closed with close().
+class CrawlerCsvStreamExporter:
+
+    ## constructor
+    #  - creates the export file and writes the header
+    #  @param exportFileNameSrc - path of the export file
+    #  @param formatSrc - list of the columns
+    #  @param compressSrc - write a gzip compressed file
+    #  @param resumePositionSrc - continue the export file after this position (without header), see checkpoint
+    def __init__(self, exportFileNameSrc:str, formatSrc:list, compressSrc:bool=False, resumePositionSrc:int=None) -> None:
         try:
-            with open(exportFileNameSrc, 'w', newline='') as csvfile:
-                
-                # create csv writer
-                fieldNames = formatSrc
-                csvwriter = csv.DictWriter(csvfile, fieldnames=fieldNames, delimiter='|')
-                csvwriter.writeheader()
-
-                # get and write results
-                for fileResult in exportListSrc:
-                    tmpDict = {"path" : fileResult.path}
-                    for ioc in fileResult.mResults:
-                        tmpDict["ioc"] = ioc
-                        for entry in fileResult.mResults[ioc]:
-                            tmpDict["match"] = entry
-                            for offset in fileResult.mResults[ioc][entry]:
-                                tmpDict["offset"] = offset
-                                printDict = {}
-                                for field in fieldNames:
-                                    # build dict for writing depending of the user selected columns
-                                    printDict[field] = tmpDict[field]
-                                # write data
-                                csvwriter.writerow(printDict)
-                            # end for offset
-                        # end for entry
-                    # end for ioc
-                # end for fileResult
-            # end try
-                
+            self.fileName   = exportFileNameSrc
+            self.fieldNames = formatSrc
+            self.columns    = _getColumnIndexes(formatSrc)
+            self.compress   = compressSrc
+            self.csvfile    = _openExportFile(exportFileNameSrc, compressSrc, resumePositionSrc)
+            self.csvwriter  = csv.writer(self.csvfile, delimiter='|')
+            if resumePositionSrc is None:
+                self.csvwriter.writerow(self.fieldNames)
+        except CrawlerExportError as ee:
+            raise ee
         except Exception as e:
             raise CrawlerExportError(getattr(e, 'message', repr(e)))
-    # end def csvExport
 
-    ## export data
-    def jsonExport(exportListSrc):
-        CrawlerExportError("Not implemented.")
+    ## Writes the matches of a result object
+    #  @param fileResult - CrawlerVo
+    def writeResult(self, fileResult) -> None:
+        try:
+            columns = self.columns
+            self.csvwriter.writerows([row[index] for index in columns] for row in _iterRows(fileResult))
+        except Exception as e:
+            raise CrawlerExportError(getattr(e, 'message', repr(e)))
+    # end def writeResult
+
+    ## Writes a distinct match of the unique mode
+    #  - path and offset are the first location of the match, count and files are written if they are in the columns
+    #  @param uniqueResult - CrawlerUniqueVo
+    def writeUniqueResult(self, uniqueResult) -> None:
+        try:
+            row = _getUniqueRow(uniqueResult)
+            self.csvwriter.writerow([row[index] for index in self.columns])
+        except Exception as e:
+            raise CrawlerExportError(getattr(e, 'message', repr(e)))
+    # end def writeUniqueResult
+
+    ## Writes rows of another export file, see mergeShards
+    #  @param rowsSrc - list of rows with the values of the columns
+    def writeRows(self, rowsSrc:list) -> None:
+        try:
+            self.csvwriter.writerows(rowsSrc)
+        except Exception as e:
+            raise CrawlerExportError(getattr(e, 'message', repr(e)))
+    # end def writeRows
+
+    ## Writes the data to the disk
+    #  @return position after the written data, it is used to continue the file (see the journal of the crawler)
+    def checkpoint(self) -> int:
+        try:
+            self.csvfile, position = _checkpointExportFile(self.csvfile, self.fileName, self.compress)
+            self.csvwriter = csv.writer(self.csvfile, delimiter='|')
+            return position
+        except Exception as e:
+            raise CrawlerExportError(getattr(e, 'message', repr(e)))
+    # end def checkpoint
+
+    ## Closes the export file
+    def close(self) -> None:
+        if self.csvfile:
+            self.csvfile.close()
+            self.csvfile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> None:
+        self.close()
+
+# end CrawlerCsvStreamExporter
+
+## --------------------------------------------------------------------------------------------------------------------
+## Stream export class for json lines files
+#  Every match is written as json object in a line, e.g. {"path": "...", "ioc": "IP", "match": "...", "offset": 42}.
+#  With match context the objects have also the keys before and after (escaped bytes).
+#  A distinct match of the unique mode has also the keys count, files and samples (list of [path, offset]).
+#  The lines are written with a large buffer, so other programs can read the file while the crawler is running.
+#  The exporter can be used as context manager, otherwise the file have to be closed with close().
+class CrawlerJsonStreamExporter:
+
+    ## constructor
+    #  @param exportFileNameSrc - path of the export file
+    #  @param formatSrc - list of the columns, they are the keys of the json objects
+    #  @param compressSrc - write a gzip compressed file
+    #  @param resumePositionSrc - continue the export file after this position, see checkpoint
+    def __init__(self, exportFileNameSrc:str, formatSrc:list, compressSrc:bool=False, resumePositionSrc:int=None) -> None:
+        try:
+            self.fileName   = exportFileNameSrc
+            self.fieldNames = list(formatSrc)
+            self.columns    = _getColumnIndexes(formatSrc)
+            self.compress   = compressSrc
+            self.jsonfile   = _openExportFile(exportFileNameSrc, compressSrc, resumePositionSrc)
+            self.encoder    = json.JSONEncoder(ensure_ascii=False)
+        except CrawlerExportError as ee:
+            raise ee
+        except Exception as e:
+            raise CrawlerExportError(getattr(e, 'message', repr(e)))
+
+    ## Writes the matches of a result object
+    #  @param fileResult - CrawlerVo
+    def writeResult(self, fileResult) -> None:
+        try:
+            fields  = list(zip(self.fieldNames, self.columns))
+            encode  = self.encoder.encode
+            self.jsonfile.write("".join(encode({name: row[index] for name, index in fields}) + "\n"
+                                        for row in _iterRows(fileResult)))
+        except Exception as e:
+            raise CrawlerExportError(getattr(e, 'message', repr(e)))
+    # end def writeResult
+
+    ## Writes a distinct match of the unique mode
+    #  @param uniqueResult - CrawlerUniqueVo
+    def writeUniqueResult(self, uniqueResult) -> None:
+        try:
+            row    = _getUniqueRow(uniqueResult)
+            record = {name: row[index] for name, index in zip(self.fieldNames, self.columns)}
+            record["samples"] = uniqueResult.samples
+            self.jsonfile.write(self.encoder.encode(record) + "\n")
+        except Exception as e:
+            raise CrawlerExportError(getattr(e, 'message', repr(e)))
+    # end def writeUniqueResult
+
+    ## Writes rows of another export file, see mergeShards
+    #  @param rowsSrc - list of rows with the values of the columns
+    def writeRows(self, rowsSrc:list) -> None:
+        try:
+            encode = self.encoder.encode
+            self.jsonfile.write("".join(encode(dict(zip(self.fieldNames, row))) + "\n" for row in rowsSrc))
+        except Exception as e:
+            raise CrawlerExportError(getattr(e, 'message', repr(e)))
+    # end def writeRows
+
+    ## Writes the data to the disk
+    #  @return position after the written data, it is used to continue the file (see the journal of the crawler)
+    def checkpoint(self) -> int:
+        try:
+            self.jsonfile, position = _checkpointExportFile(self.jsonfile, self.fileName, self.compress)
+            return position
+        except Exception as e:
+            raise CrawlerExportError(getattr(e, 'message', repr(e)))
+    # end def checkpoint
+
+    ## Closes the export file
+    def close(self) -> None:
+        if self.jsonfile:
+            self.jsonfile.close()
+            self.jsonfile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> None:
+        self.close()
+
+# end CrawlerJsonStreamExporter
+
+## --------------------------------------------------------------------------------------------------------------------
+## Stream export class for sqlite files
+#  The matches are written to the table "matches" with the selected columns, offset, count and files are integers.
+#  The rows are committed in batches of EXPORT_BATCH_ROWS rows. The database uses write ahead logging, so other
+#  programs can read the committed rows while the crawler is running. An existing file is replaced, a resumed export
+#  keeps the rows until the position (count of rows) of the checkpoint.
+#  The exporter can be used as context manager, otherwise the file have to be closed with close().
+class CrawlerSqliteStreamExporter:
+
+    ## constructor
+    #  @param exportFileNameSrc - path of the export file
+    #  @param formatSrc - list of the columns
+    #  @param resumePositionSrc - continue the export file after this count of rows, see checkpoint
+    def __init__(self, exportFileNameSrc:str, formatSrc:list, resumePositionSrc:int=None) -> None:
+        try:
+            self.fileName   = exportFileNameSrc
+            self.fieldNames = list(formatSrc)
+            self.columns    = _getColumnIndexes(formatSrc)
+            self.rows       = []
+            self.rowCount   = 0
+
+            if resumePositionSrc is None:
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(exportFileNameSrc + suffix):
+                        os.remove(exportFileNameSrc + suffix)
+            elif not os.path.exists(exportFileNameSrc):
+                raise CrawlerExportError("The export file %s does not exist." %(exportFileNameSrc))
+
+            self.connection = sqlite3.connect(exportFileNameSrc)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.insert = "INSERT INTO matches VALUES (%s)" %(", ".join(["?"] * len(self.fieldNames)))
+            if resumePositionSrc is None:
+                columnTypes = ['"%s" %s' %(field, "INTEGER" if field in ("offset",) + UNIQUE_COLUMNS else "TEXT")
+                               for field in self.fieldNames]
+                self.connection.execute("CREATE TABLE matches (%s)" %(", ".join(columnTypes)))
+            else:
+                # the rows are inserted in order, so the row ids are the position
+                with self.connection:
+                    self.connection.execute("DELETE FROM matches WHERE rowid > ?", (resumePositionSrc,))
+                self.rowCount = resumePositionSrc
+        except CrawlerExportError as ee:
+            raise ee
+        except Exception as e:
+            raise CrawlerExportError(getattr(e, 'message', repr(e)))
+
+    ## Writes the matches of a result object
+    #  @param fileResult - CrawlerVo
+    def writeResult(self, fileResult) -> None:
+        columns = self.columns
+        self.rows.extend(tuple(row[index] for index in columns) for row in _iterRows(fileResult))
+        if len(self.rows) >= EXPORT_BATCH_ROWS:
+            self.flush()
+    # end def writeResult
+
+    ## Writes a distinct match of the unique mode
+    #  @param uniqueResult - CrawlerUniqueVo
+    def writeUniqueResult(self, uniqueResult) -> None:
+        row = _getUniqueRow(uniqueResult)
+        self.rows.append(tuple(row[index] for index in self.columns))
+        if len(self.rows) >= EXPORT_BATCH_ROWS:
+            self.flush()
+    # end def writeUniqueResult
+
+    ## Writes rows of another export file, see mergeShards
+    #  @param rowsSrc - list of rows with the values of the columns
+    def writeRows(self, rowsSrc:list) -> None:
+        self.rows.extend(tuple(row) for row in rowsSrc)
+        if len(self.rows) >= EXPORT_BATCH_ROWS:
+            self.flush()
+    # end def writeRows
+
+    ## Writes the buffered rows in one transaction
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        try:
+            with self.connection:
+                self.connection.executemany(self.insert, self.rows)
+            self.rowCount += len(self.rows)
+            self.rows = []
+        except Exception as e:
+            raise CrawlerExportError(getattr(e, 'message', repr(e)))
+    # end def flush
+
+    ## Commits the buffered rows
+    #  @return count of the committed rows, it is used to continue the file (see the journal of the crawler)
+    def checkpoint(self) -> int:
+        self.flush()
+        try:
+            self.connection.execute("PRAGMA wal_checkpoint(FULL)")
+        except Exception as e:
+            raise CrawlerExportError(getattr(e, 'message', repr(e)))
+        return self.rowCount
+    # end def checkpoint
+
+    ## Writes the buffered rows and closes the database
+    def close(self) -> None:
+        if self.connection:
+            try:
+                self.flush()
+            finally:
+                self.connection.close()
+                self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> None:
+        self.close()
 
-# end CrawlerExporter
\ No newline at end of file
+# end CrawlerSqliteStreamExporter
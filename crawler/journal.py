@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import json            # for the journal lines
+import logging         # for log
+import os              # for fsync
+import timeit          # for the checkpoint interval
+
+from .crawlererr     import CrawlerConfigError, CrawlerExportError
+
+## --------------------------------------------------------------------------------------------------------------------
+
+LOG = logging.getLogger('IocCrawlerLog')
+
+# version of the journal format
+JOURNAL_VERSION  = 1
+
+# seconds between two checkpoints
+JOURNAL_INTERVAL = 30
+
+## --------------------------------------------------------------------------------------------------------------------
+## Journal of a crawler run
+#  The journal records the finished file ranges and the position of the export file, so an interrupted run can be
+#  continued (see Crawler and the --resume argument). The results of a block are written to the exporter when the
+#  block is finished, so the export file contains only the results of finished ranges. Periodically a checkpoint
+#  flushes the export file and appends a line with the ranges finished since the last checkpoint to the journal.
+#  A resumed run truncates the export file to the position of the last checkpoint and scans only the ranges which are
+#  not in the journal, so no result is written twice or is missing.
+#
+#  The journal is a json lines file:
+#  - the first line has the settings: {"journal": version, "fingerprint": ..., "source": ...}
+#  - every checkpoint line has the new ranges, the export file, the position in the export file and the state of
+#    the summary: {"ranges": [[path, start, end], ...], "export": ..., "position": ..., "state": {...}, "complete": ...}
+#  A checkpoint line which was not written completely is ignored.
+class CrawlerJournal:
+
+    ## constructor
+    #  - a new journal replaces an existing file
+    #  @param journalFileSrc - path of the journal file
+    #  @param fingerprintSrc - fingerprint of the settings, a journal is only resumed with the same settings
+    #  @param sourceSrc - path of the crawled source
+    #  @param resumeSrc - load the existing journal and continue it
+    def __init__(self, journalFileSrc:str, fingerprintSrc:str, sourceSrc:str, resumeSrc:bool=False) -> None:
+        self.journalFile    = journalFileSrc
+        self.finished       = {}   # [KEY - path] : VALUE - list of finished ranges [start, end]
+        self.pending        = []   # ranges since the last checkpoint, list of [path, start, end]
+        self.exportFile     = None # export file of the last checkpoint, list [path, format, compressed]
+        self.position       = None # position of the export file at the last checkpoint
+        self.state          = {}   # summary state at the last checkpoint
+        self.complete       = False
+        self.lastCheckpoint = timeit.default_timer()
+
+        try:
+            if resumeSrc:
+                self._load(fingerprintSrc)
+                self.journal = open(journalFileSrc, 'a', encoding='utf-8')
+            else:
+                self.journal = open(journalFileSrc, 'w', encoding='utf-8')
+                self._writeLine({"journal": JOURNAL_VERSION, "fingerprint": fingerprintSrc, "source": sourceSrc})
+        except CrawlerConfigError as ce:
+            raise ce
+        except Exception as e:
+            raise CrawlerConfigError(getattr(e, 'message', repr(e)))
+    # end init
+
+    ## Loads the finished ranges and the last checkpoint
+    def _load(self, fingerprintSrc:str) -> None:
+        with open(self.journalFile, 'r', encoding='utf-8') as f:
+            lines = f.read().split("\n")
+
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            raise CrawlerConfigError("%s is no journal file" %(self.journalFile))
+        if header.get("journal") != JOURNAL_VERSION:
+            raise CrawlerConfigError("%s is no journal file of this version" %(self.journalFile))
+        if header.get("fingerprint") != fingerprintSrc:
+            raise CrawlerConfigError("The journal %s was created with other settings (source, pattern, whitelist, "
+                                     "columns, match size or content triage)" %(self.journalFile))
+
+        validSize = len(lines[0].encode('utf-8')) + 1
+        for line in lines[1:]:
+            try:
+                checkpoint = json.loads(line)
+            except ValueError:
+                # the last line was not written completely
+                break
+            for path, start, end in checkpoint["ranges"]:
+                self.finished.setdefault(path, []).append([start, end])
+            self.exportFile = checkpoint["export"]
+            self.position   = checkpoint["position"]
+            self.state      = checkpoint["state"]
+            self.complete   = checkpoint["complete"]
+            validSize += len(line.encode('utf-8')) + 1
+        # end for
+
+        # remove an incomplete last line, so the next checkpoint starts in a new line
+        if validSize < os.path.getsize(self.journalFile):
+            os.truncate(self.journalFile, validSize)
+        LOG.debug("Journal %s loaded, %d files with finished ranges" %(self.journalFile, len(self.finished)))
+    # end def _load
+
+    ## Checks if ranges of a file are finished
+    def hasRanges(self, pathSrc:str) -> bool:
+        return pathSrc in self.finished
+
+    ## Returns the ranges of a file which are not finished
+    #  @return list of tuples (start, end), None if no range of the file is finished
+    def getRemainingRanges(self, pathSrc:str, fileSizeSrc:int) -> list:
+        ranges = self.finished.get(pathSrc)
+        if ranges is None:
+            return None
+        remaining = []
+        position  = 0
+        for start, end in sorted(ranges):
+            if start > position:
+                remaining.append((position, min(start, fileSizeSrc)))
+            position = max(position, end)
+            if position >= fileSizeSrc:
+                break
+        if position < fileSizeSrc:
+            remaining.append((position, fileSizeSrc))
+        return [(start, end) for start, end in remaining if start < end]
+    # end def getRemainingRanges
+
+    ## Adds finished ranges, they are written with the next checkpoint
+    #  @param rangesSrc - list of tuples (path, start, end)
+    def addRanges(self, rangesSrc:list) -> None:
+        self.pending.extend([path, start, end] for path, start, end in rangesSrc)
+
+    ## Checks if the next checkpoint should be written
+    def isDue(self) -> bool:
+        return timeit.default_timer() - self.lastCheckpoint >= JOURNAL_INTERVAL
+
+    ## Writes a checkpoint
+    #  - the export file has to be flushed before, see the checkpoint method of the stream exporters
+    #  @param exportFileSrc - export file, list [path, format, compressed], a resumed run has to use the same file
+    #  @param positionSrc - position of the export file after the flush
+    #  @param stateSrc - state of the summary, it is restored by a resumed run
+    #  @param completeSrc - True if the run is finished
+    def checkpoint(self, exportFileSrc:list, positionSrc:int, stateSrc:dict, completeSrc:bool=False) -> None:
+        self._writeLine({"ranges": self.pending, "export": exportFileSrc, "position": positionSrc,
+                         "state": stateSrc, "complete": completeSrc})
+        self.pending        = []
+        self.exportFile     = exportFileSrc
+        self.position       = positionSrc
+        self.complete       = completeSrc
+        self.lastCheckpoint = timeit.default_timer()
+    # end def checkpoint
+
+    ## Appends a line and writes it to the disk
+    def _writeLine(self, recordSrc:dict) -> None:
+        try:
+            self.journal.write(json.dumps(recordSrc) + "\n")
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+        except Exception as e:
+            raise CrawlerExportError("Journal %s not written: %s" %(self.journalFile, getattr(e, 'message', repr(e))))
+    # end def _writeLine
+
+    ## Closes the journal file
+    def close(self) -> None:
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+
+# end class CrawlerJournal
@@ -0,0 +1,255 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import heapq           # for the slowest files
+import json            # for the metrics file
+import sys             # for the status line
+import time            # for the time stamps
+import timeit          # for the stage times
+
+from .crawlererr     import CrawlerExportError # ioc crawler error handling
+
+## --------------------------------------------------------------------------------------------------------------------
+
+# stages of the processing in a worker
+METRIC_STAGES      = ("read", "scan", "whitelist", "emit")
+
+# count of the reported slowest files and most expensive patterns
+METRIC_TOP_COUNT   = 10
+
+# seconds between two status lines or metric records
+METRIC_INTERVAL    = 2
+
+## --------------------------------------------------------------------------------------------------------------------
+## Metrics of a worker process
+#  The worker measures the processed data and the time of the stages while processing a block. The metrics are send
+#  with the "done" message of the block and in long blocks every METRIC_INTERVAL seconds with a "metrics" message
+#  (see getBlockMetrics). They are summed up by CrawlerMetrics.
+#  - read - reading of the data, for memory mapped files only the mapping (the pages are read while scanning)
+#  - scan - pattern search, prefilter and decoding of the matches
+#  - whitelist - whitelist checks of the matches
+#  - emit - sending of the results and the stdout lines to the result writer
+class CrawlerWorkerMetrics:
+
+    ## constructor
+    #  @param workerNameSrc - name of the worker process
+    #  @param patternNamesSrc - dict with the names of the compiled patterns, see CrawlerScanEngine.getPatternNames
+    def __init__(self, workerNameSrc:str, patternNamesSrc:dict) -> None:
+        self.worker       = workerNameSrc
+        self.patternNames = dict(patternNamesSrc)
+        self.reset()
+    # end init
+
+    ## Resets the metrics for the next block
+    def reset(self) -> None:
+        self.blockStart   = timeit.default_timer()
+        self.nextReport   = self.blockStart + METRIC_INTERVAL
+        self.bytes        = 0
+        self.files        = 0
+        self.matches      = 0
+        self.times        = dict.fromkeys(METRIC_STAGES, 0.0)
+        self.excluded     = 0.0 # time of the whitelist and emit stage, it is not part of the scan time
+        self.patterns     = {}  # pattern name : [seconds, matches]
+        self.slowestFiles = []  # heap of tuples (seconds, path, bytes)
+    # end def reset
+
+    ## Adds the time of a stage
+    def addTime(self, stageSrc:str, secondsSrc:float) -> None:
+        self.times[stageSrc] += secondsSrc
+        if stageSrc != "read":
+            self.excluded += secondsSrc
+    # end def addTime
+
+    ## Adds the search time of a pattern
+    #  - the time of the whitelist and emit stage since the last call is not counted
+    #  @param lastTimeSrc, lastExcludedSrc - values of the last call, see startScan
+    #  @return tuple (time, excluded time) for the next call
+    def addPattern(self, patternSrc, lastTimeSrc:float, lastExcludedSrc:float, matchesSrc:int) -> tuple:
+        now     = timeit.default_timer()
+        seconds = now - lastTimeSrc - (self.excluded - lastExcludedSrc)
+        self.times["scan"] += seconds
+
+        name = self.patternNames.get(patternSrc, "unknown")
+        if name not in self.patterns:
+            self.patterns[name] = [0.0, 0]
+        self.patterns[name][0] += seconds
+        self.patterns[name][1] += matchesSrc
+        return now, self.excluded
+    # end def addPattern
+
+    ## Returns the values for the first call of addPattern
+    def startScan(self) -> tuple:
+        return timeit.default_timer(), self.excluded
+
+    ## Adds a processed file range
+    #  @param completeSrc - True if it was the last range of the file
+    def addFile(self, pathSrc:str, secondsSrc:float, bytesSrc:int, completeSrc:bool) -> None:
+        if completeSrc:
+            self.files += 1
+        entry = (secondsSrc, pathSrc, bytesSrc)
+        if len(self.slowestFiles) < METRIC_TOP_COUNT:
+            heapq.heappush(self.slowestFiles, entry)
+        elif entry > self.slowestFiles[0]:
+            heapq.heapreplace(self.slowestFiles, entry)
+    # end def addFile
+
+    ## Checks if the metrics of a long block should be send
+    def isDue(self) -> bool:
+        return timeit.default_timer() >= self.nextReport
+
+    ## Returns the metrics since the last call and resets them
+    #  @return dict, see CrawlerMetrics.addBlock
+    def getBlockMetrics(self) -> dict:
+        metrics = {"worker"       : self.worker,
+                   "busy"         : timeit.default_timer() - self.blockStart,
+                   "bytes"        : self.bytes,
+                   "files"        : self.files,
+                   "matches"      : self.matches,
+                   "times"        : self.times,
+                   "patterns"     : self.patterns,
+                   "slowestFiles" : self.slowestFiles}
+        self.reset()
+        return metrics
+    # end def getBlockMetrics
+
+# end class CrawlerWorkerMetrics
+
+## --------------------------------------------------------------------------------------------------------------------
+## Metrics of a crawler run
+#  The metrics of the blocks are summed up per worker. While the crawler is running, the metrics are written
+#  periodically as status line to stderr and as json line to the metrics file. Every json line contains the totals
+#  since the start of the run:
+#  - elapsed, files, fileCount, bytes, matches and the rates bytes/s, files/s, matches/s
+#  - stages - seconds of the worker stages, see CrawlerWorkerMetrics
+#  - workers - per worker the totals and the rates, the rates are based on the busy time of the worker
+#  - slowestFiles - list of [seconds, path, bytes], the slowest file ranges
+#  - patterns - list of [name, seconds, matches], the most expensive patterns
+#  The last line of a run has the key "final".
+class CrawlerMetrics:
+
+    ## constructor
+    #  @param metricsFileSrc - path of the metrics file (json lines) or None
+    #  @param statusLineSrc - print a status line to stderr
+    #  @param intervalSrc - seconds between two status lines or metric records
+    def __init__(self, metricsFileSrc:str=None, statusLineSrc:bool=False, intervalSrc:float=METRIC_INTERVAL) -> None:
+        self.metricsFile  = None
+        self.statusLine   = statusLineSrc
+        self.interval     = intervalSrc
+        self.startTime    = timeit.default_timer()
+        self.lastRefresh  = self.startTime
+        self.workers      = {}
+        self.times        = dict.fromkeys(METRIC_STAGES, 0.0)
+        self.patterns     = {}
+        self.slowestFiles = []
+        self.statusLength = 0
+
+        if metricsFileSrc:
+            try:
+                self.metricsFile = open(metricsFileSrc, 'w')
+            except Exception as e:
+                raise CrawlerExportError(getattr(e, 'message', repr(e)))
+    # end init
+
+    ## Adds the metrics of a block or a part of a long block
+    #  @param blockMetricsSrc - dict, see CrawlerWorkerMetrics.getBlockMetrics
+    def addBlock(self, blockMetricsSrc:dict) -> None:
+        worker = self.workers.setdefault(blockMetricsSrc["worker"], {"busy": 0.0, "bytes": 0, "files": 0, "matches": 0})
+        for key in worker:
+            worker[key] += blockMetricsSrc[key]
+        for stage in self.times:
+            self.times[stage] += blockMetricsSrc["times"].get(stage, 0.0)
+        for name, (seconds, matches) in blockMetricsSrc["patterns"].items():
+            if name not in self.patterns:
+                self.patterns[name] = [0.0, 0]
+            self.patterns[name][0] += seconds
+            self.patterns[name][1] += matches
+        for entry in blockMetricsSrc["slowestFiles"]:
+            entry = tuple(entry)
+            if len(self.slowestFiles) < METRIC_TOP_COUNT:
+                heapq.heappush(self.slowestFiles, entry)
+            elif entry > self.slowestFiles[0]:
+                heapq.heapreplace(self.slowestFiles, entry)
+    # end def addBlock
+
+    ## Returns the current metrics
+    #  @param fileCountSrc - count of the found files
+    #  @return dict, see the class description
+    def getSnapshot(self, fileCountSrc:int=0) -> dict:
+        elapsed  = max(timeit.default_timer() - self.startTime, 1e-9)
+        snapshot = {"time"     : time.time(),
+                    "elapsed"  : elapsed,
+                    "files"    : sum(x["files"] for x in self.workers.values()),
+                    "fileCount": fileCountSrc,
+                    "bytes"    : sum(x["bytes"] for x in self.workers.values()),
+                    "matches"  : sum(x["matches"] for x in self.workers.values()),
+                    "stages"   : dict(self.times),
+                    "workers"  : {},
+                    "slowestFiles" : sorted(self.slowestFiles, reverse=True),
+                    "patterns" : sorted(([name] + values for name, values in self.patterns.items()),
+                                        key=lambda x: x[1], reverse=True)[:METRIC_TOP_COUNT]}
+        for key in ("bytes", "files", "matches"):
+            snapshot[key + "/s"] = snapshot[key] / elapsed
+
+        for name, worker in sorted(self.workers.items()):
+            busy = max(worker["busy"], 1e-9)
+            snapshot["workers"][name] = dict(worker)
+            for key in ("bytes", "files", "matches"):
+                snapshot["workers"][name][key + "/s"] = worker[key] / busy
+        return snapshot
+    # end def getSnapshot
+
+    ## Writes the status line and the metric record if the interval is over
+    #  @param fileCountSrc - count of the found files
+    #  @param forceSrc - write also if the interval is not over
+    def refresh(self, fileCountSrc:int=0, forceSrc:bool=False) -> None:
+        now = timeit.default_timer()
+        if not forceSrc and now - self.lastRefresh < self.interval:
+            return
+        self.lastRefresh = now
+
+        snapshot = self.getSnapshot(fileCountSrc)
+        if self.metricsFile:
+            self._writeRecord(snapshot)
+        if self.statusLine:
+            self._printStatus(snapshot)
+    # end def refresh
+
+    ## Writes a metric record to the metrics file
+    def _writeRecord(self, snapshotSrc:dict) -> None:
+        try:
+            self.metricsFile.write(json.dumps(snapshotSrc) + "\n")
+            self.metricsFile.flush()
+        except Exception as e:
+            raise CrawlerExportError(getattr(e, 'message', repr(e)))
+    # end def _writeRecord
+
+    ## Prints the status line to stderr, the line is overwritten by the next status line
+    def _printStatus(self, snapshotSrc:dict) -> None:
+        stageTime = max(sum(snapshotSrc["stages"].values()), 1e-9)
+        status = "[*] %d / %d files | %.2f MB/s | %.1f files/s | %.1f matches/s | %s" %(
+                 snapshotSrc["files"], snapshotSrc["fileCount"], snapshotSrc["bytes/s"] / 1024 / 1024,
+                 snapshotSrc["files/s"], snapshotSrc["matches/s"],
+                 " ".join("%s %d%%" %(stage, seconds / stageTime * 100) for stage, seconds in snapshotSrc["stages"].items()))
+        sys.stderr.write("\r" + status.ljust(self.statusLength))
+        sys.stderr.flush()
+        self.statusLength = len(status)
+    # end def _printStatus
+
+    ## Writes the final metrics and closes the metrics file
+    #  @param fileCountSrc - count of the found files
+    #  @return dict with the final metrics
+    def close(self, fileCountSrc:int=0) -> dict:
+        snapshot = self.getSnapshot(fileCountSrc)
+        snapshot["final"] = True
+        if self.statusLine:
+            self._printStatus(snapshot)
+            sys.stderr.write("\n")
+        if self.metricsFile:
+            self._writeRecord(snapshot)
+            self.metricsFile.close()
+            self.metricsFile = None
+        return snapshot
+    # end def close
+
+# end class CrawlerMetrics
@@ -0,0 +1,297 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import math            # for the growth of the run time
+import signal          # for the timeout of a measurement
+import timeit          # for run time
+
+try:
+    import re._parser as sre_parse # python >= 3.11
+except ImportError:
+    import sre_parse               # python < 3.11
+
+from .benchmark      import createSyntheticBuffer
+from .crawlererr     import CrawlerError, CrawlerPatternError
+from .patternset     import getPatternSet
+from .scanengine     import CrawlerScanEngine
+from .worker         import READ_BUFFER_SIZE
+
+## --------------------------------------------------------------------------------------------------------------------
+
+# sample data
+SAMPLE_KINDS         = ("text", "dense", "binary") # kinds of the synthetic sample data, see createSyntheticBuffer
+SAMPLE_SIZE          = 1024 * 1024      # size of every sample buffer
+
+# adversarial inputs
+ADVERSARIAL_SIZES    = (4096, 16384)    # sizes of every adversarial input, the growth is measured between them
+ADVERSARIAL_PUMPS    = (b'a', b'1', b'a.', b'1.', b'a-', b'a@', b'a/', b' ') # pumps which are tried for every pattern
+ADVERSARIAL_SUFFIX   = b'\x00'          # ends every adversarial input, so the last match attempt fails
+ADVERSARIAL_MAX      = 16               # max count of adversarial inputs of a pattern
+ADVERSARIAL_TIMEOUT  = 2.0              # max seconds of a single measurement
+
+# rating
+SUPERLINEAR_GROWTH   = 1.5              # run time exponent above which a pattern is flagged as super-linear
+MEASURE_MIN_TIME     = 0.005            # shorter measurements are too inaccurate for the growth
+MEASURE_REPEAT_TIME  = 0.05             # shorter measurements are repeated, the fastest run is used
+MEASURE_REPEATS      = 3
+
+# preferred characters for the sample strings of the character sets
+SAMPLE_CHARACTERS    = b'a1A.-_/:@ ' + bytes(range(0x21, 0x7f)) + bytes(range(0x80, 0x100)) + bytes(range(0x00, 0x21))
+
+# repeat operators of the parsed patterns
+REPEAT_OPS           = tuple(op for op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT,
+                                           getattr(sre_parse, 'POSSESSIVE_REPEAT', None)) if op is not None)
+
+## --------------------------------------------------------------------------------------------------------------------
+## Pattern cost analysis
+#  Every pattern of a pattern file is searched in synthetic sample data (throughput) and in adversarial inputs. An
+#  adversarial input pumps a string which matches a repeated part of the pattern, e.g. "a." for the domain pattern
+#  ([a-z]+\.)+[a-z]{2,}, and ends with a character which lets the match fail. Such inputs trigger the backtracking of
+#  the regex engine. The run time is measured with two input sizes, the exponent of the growth shows the complexity:
+#  1 is linear, 2 is quadratic, a measurement which exceeds the timeout is rated as exponential.
+#  The worst input is extrapolated to the cost of one read buffer of the crawler (READ_BUFFER_SIZE), this is the
+#  time a worker needs for a buffer with such data. Patterns with a nested unbounded repeat are flagged also, they
+#  are the usual cause of catastrophic backtracking.
+
+## Analyzes the cost of all patterns of a pattern file
+#  @param patternFileSrc - path of the pattern file
+#  @param sectionsSrc - list of the analyzed ioc types, None analyzes all sections
+#  @param callbackSrc - is called with every pattern result, e.g. for printing the progress
+#  @return list of dicts, one per pattern:
+#          {"name"        : name of the pattern, e.g. DOMAIN[0] (see CrawlerScanEngine.getPatternNames),
+#           "pattern"     : source of the pattern,
+#           "bytes/sec"   : dict [KEY - sample kind] : VALUE - throughput,
+#           "worstInput"  : description of the slowest adversarial input, e.g. "a." * n + "\x00",
+#           "worstSeconds": extrapolated seconds of the slowest input for one read buffer,
+#           "growth"      : run time exponent of the slowest input, None if the run time was too short,
+#           "timeout"     : True if a measurement exceeded ADVERSARIAL_TIMEOUT,
+#           "nested"      : True if the pattern has a nested unbounded repeat,
+#           "superLinear" : True if the growth exceeds SUPERLINEAR_GROWTH or a measurement timed out}
+def analyzePatterns(patternFileSrc:str, sectionsSrc:list=None, callbackSrc=None) -> list:
+    try:
+        patternSet = getPatternSet(patternFileSrc)
+        patterns   = patternSet.getPatterns(sectionsSrc if sectionsSrc is not None else patternSet.getSections())
+    except CrawlerError as ce:
+        raise ce
+    except Exception as e:
+        raise CrawlerPatternError(getattr(e, 'message', repr(e)))
+
+    names   = CrawlerScanEngine(patterns).getPatternNames()
+    samples = {kind: createSyntheticBuffer(SAMPLE_SIZE, kind) for kind in SAMPLE_KINDS}
+    results = []
+    for ioc_type in patterns:
+        for pattern in patterns[ioc_type]:
+            result = analyzePattern(pattern, samples)
+            result["name"] = names[pattern]
+            results.append(result)
+            if callbackSrc:
+                callbackSrc(result)
+    return results
+# end def analyzePatterns
+
+## Analyzes the cost of a single pattern, see analyzePatterns
+#  @param patternSrc - compiled bytes pattern
+#  @param samplesSrc - dict [KEY - sample kind] : VALUE - sample data
+#  @return dict with the cost of the pattern (without name)
+def analyzePattern(patternSrc, samplesSrc:dict) -> dict:
+    result = {"pattern"     : patternSrc.pattern.decode('utf-8', 'backslashreplace'),
+              "bytes/sec"   : {},
+              "worstInput"  : None,
+              "worstSeconds": 0.0,
+              "growth"      : None,
+              "timeout"     : False,
+              "nested"      : hasNestedRepeat(patternSrc),
+              "superLinear" : False}
+
+    for kind, sample in samplesSrc.items():
+        seconds = _measureSearch(patternSrc, sample)
+        result["bytes/sec"][kind] = len(sample) / seconds if seconds else 0.0
+
+    for prefix, pump in getAdversarialInputs(patternSrc):
+        times = []
+        for size in ADVERSARIAL_SIZES:
+            seconds = _measureSearch(patternSrc, prefix + pump * (size // len(pump)) + ADVERSARIAL_SUFFIX)
+            times.append(seconds)
+            if seconds is None:
+                break
+
+        # the cost of one read buffer of the crawler
+        growth = None
+        if times[-1] is None:
+            cost = math.inf
+        else:
+            if times[1] >= MEASURE_MIN_TIME and times[0] > 0:
+                growth = math.log(times[1] / times[0]) / math.log(ADVERSARIAL_SIZES[1] / ADVERSARIAL_SIZES[0])
+            cost = times[1] * (READ_BUFFER_SIZE / ADVERSARIAL_SIZES[1]) ** max(1.0, growth or 1.0)
+
+        if result["worstInput"] is None or cost > result["worstSeconds"]:
+            result["worstInput"]   = "%s%r * n + %r" %("%r + " %(prefix) if prefix else "", pump, ADVERSARIAL_SUFFIX)
+            result["worstSeconds"] = cost
+            result["growth"]       = growth
+        if cost == math.inf:
+            result["timeout"] = True
+            break
+    # end for
+
+    result["superLinear"] = result["timeout"] or (result["growth"] or 0.0) > SUPERLINEAR_GROWTH
+    return result
+# end def analyzePattern
+
+## Returns the run time of a complete search
+#  - short searches are repeated, the fastest run is returned
+#  @return seconds, None if the search exceeds ADVERSARIAL_TIMEOUT
+def _measureSearch(patternSrc, dataSrc:bytes) -> float:
+    ## stops the search, the regex engine checks for signals while searching
+    def _timeout(signumSrc, frameSrc):
+        raise TimeoutError()
+
+    previousHandler = signal.signal(signal.SIGALRM, _timeout)
+    try:
+        times = []
+        while len(times) < MEASURE_REPEATS and sum(times) < MEASURE_REPEAT_TIME:
+            signal.setitimer(signal.ITIMER_REAL, ADVERSARIAL_TIMEOUT)
+            start = timeit.default_timer()
+            for item in patternSrc.finditer(dataSrc):
+                pass
+            times.append(timeit.default_timer() - start)
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        return min(times)
+    except TimeoutError:
+        return None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previousHandler)
+# end def _measureSearch
+
+## --------------------------------------------------------------------------------------------------------------------
+## Returns the adversarial inputs of a pattern
+#  - every repeated part of the pattern is pumped with a string which matches the part once, the parts of the pattern
+#    before the repeat are the prefix of the input
+#  - the pumps of ADVERSARIAL_PUMPS are tried also, they find the backtracking between neighbouring repeats
+#  @param patternSrc - compiled bytes pattern
+#  @return list of tuples (prefix, pump)
+def getAdversarialInputs(patternSrc) -> list:
+    try:
+        parsed = list(sre_parse.parse(patternSrc.pattern, patternSrc.flags))
+    except Exception as e:
+        raise CrawlerPatternError(getattr(e, 'message', repr(e)))
+
+    inputs = []
+    _addPumps(parsed, b'', inputs)
+    inputs.extend((b'', pump) for pump in ADVERSARIAL_PUMPS)
+
+    # the same input is measured once
+    unique = []
+    for item in inputs:
+        if item[1] and item not in unique:
+            unique.append(item)
+    return unique[:ADVERSARIAL_MAX]
+# end def getAdversarialInputs
+
+## Adds the pumps of the repeats of a sequence of parsed regex items
+#  @param prefixSrc - sample string of the pattern before the sequence
+#  @param inputsSrc - list of tuples (prefix, pump), the pumps are added to it
+def _addPumps(itemsSrc:list, prefixSrc:bytes, inputsSrc:list) -> None:
+    for index, (op, av) in enumerate(itemsSrc):
+        prefix = prefixSrc + _getSampleSequence(itemsSrc[:index])
+        if op in REPEAT_OPS:
+            minCount, maxCount, items = av
+            if maxCount is sre_parse.MAXREPEAT or maxCount > 1:
+                inputsSrc.append((prefix, _getSampleSequence(list(items))))
+            _addPumps(list(items), prefix + _getSampleSequence(list(items)) * max(0, minCount - 1), inputsSrc)
+        elif op is sre_parse.SUBPATTERN:
+            _addPumps(list(av[-1]), prefix, inputsSrc)
+        elif op is sre_parse.BRANCH:
+            for branch in av[1]:
+                _addPumps(list(branch), prefix, inputsSrc)
+    # end for
+# end def _addPumps
+
+## Returns the shortest sample string of a sequence of parsed regex items
+def _getSampleSequence(itemsSrc:list) -> bytes:
+    return b''.join(_getSampleItem(op, av) for op, av in itemsSrc)
+
+## Returns the shortest sample string of a single parsed regex item
+#  - anchors, lookarounds and group references have no sample
+def _getSampleItem(opSrc, avSrc) -> bytes:
+    if opSrc is sre_parse.LITERAL:
+        return bytes([avSrc])
+    elif opSrc is sre_parse.NOT_LITERAL:
+        return b'b' if avSrc == ord('a') else b'a'
+    elif opSrc is sre_parse.ANY:
+        return b'a'
+    elif opSrc is sre_parse.IN:
+        for char in SAMPLE_CHARACTERS:
+            if _isInSet(char, avSrc):
+                return bytes([char])
+        return b''
+    elif opSrc is sre_parse.SUBPATTERN:
+        return _getSampleSequence(list(avSrc[-1]))
+    elif opSrc is sre_parse.BRANCH:
+        return min((_getSampleSequence(list(branch)) for branch in avSrc[1]), key=len)
+    elif opSrc in REPEAT_OPS:
+        return _getSampleSequence(list(avSrc[2])) * avSrc[0]
+    return b''
+# end def _getSampleItem
+
+## Checks if a character is in a parsed character set
+def _isInSet(charSrc:int, setSrc:list) -> bool:
+    negate = False
+    found  = False
+    for op, av in setSrc:
+        if op is sre_parse.NEGATE:
+            negate = True
+        elif op is sre_parse.LITERAL:
+            found = found or charSrc == av
+        elif op is sre_parse.RANGE:
+            found = found or av[0] <= charSrc <= av[1]
+        elif op is sre_parse.CATEGORY:
+            found = found or _isInCategory(charSrc, av)
+    return found != negate
+# end def _isInSet
+
+## Checks if a character is in a category of a character set (\d, \w, \s and the negations)
+def _isInCategory(charSrc:int, categorySrc) -> bool:
+    char = bytes([charSrc])
+    if categorySrc in (sre_parse.CATEGORY_DIGIT, sre_parse.CATEGORY_NOT_DIGIT):
+        found = char.isdigit()
+    elif categorySrc in (sre_parse.CATEGORY_WORD, sre_parse.CATEGORY_NOT_WORD):
+        found = char.isalnum() or char == b'_'
+    else:
+        found = char.isspace()
+    return found if categorySrc in (sre_parse.CATEGORY_DIGIT, sre_parse.CATEGORY_WORD,
+                                    sre_parse.CATEGORY_SPACE) else not found
+# end def _isInCategory
+
+## Checks if a pattern has an unbounded repeat inside of an unbounded repeat, e.g. ([a-z]+\.)+
+#  @param patternSrc - compiled bytes pattern
+def hasNestedRepeat(patternSrc) -> bool:
+    try:
+        parsed = list(sre_parse.parse(patternSrc.pattern, patternSrc.flags))
+    except Exception as e:
+        raise CrawlerPatternError(getattr(e, 'message', repr(e)))
+    return _hasNestedRepeat(parsed, False)
+# end def hasNestedRepeat
+
+## Checks a sequence of parsed regex items for nested unbounded repeats
+#  @param insideSrc - True if the sequence is inside of an unbounded repeat
+def _hasNestedRepeat(itemsSrc:list, insideSrc:bool) -> bool:
+    for op, av in itemsSrc:
+        if op in REPEAT_OPS:
+            unbounded = av[1] is sre_parse.MAXREPEAT
+            if unbounded and insideSrc:
+                return True
+            if _hasNestedRepeat(list(av[2]), insideSrc or unbounded):
+                return True
+        elif op is sre_parse.SUBPATTERN:
+            if _hasNestedRepeat(list(av[-1]), insideSrc):
+                return True
+        elif op is sre_parse.BRANCH:
+            if any(_hasNestedRepeat(list(branch), insideSrc) for branch in av[1]):
+                return True
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            if _hasNestedRepeat(list(av[1]), insideSrc):
+                return True
+    return False
+# end def _hasNestedRepeat
@@ -0,0 +1,204 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import hashlib         # for the cache key
+import logging         # for log
+import marshal         # for the cache file
+import os              # for the cache directory
+import re              # for pattern
+import sys             # for the python version
+
+from configparser    import ConfigParser # for loading the pattern file
+from .crawlererr     import CrawlerConfigError
+from .scanengine     import getRequiredLiterals, getWidePattern
+
+## --------------------------------------------------------------------------------------------------------------------
+
+LOG = logging.getLogger('IocCrawlerLog')
+
+# version of the cache format, it is part of the cache key
+PATTERN_CACHE_VERSION = 2
+
+# directory of the cached pattern sets
+PATTERN_CACHE_DIR     = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "fic")
+
+# loaded pattern sets of the process: [KEY - (path, modification time, size)] : VALUE - CrawlerPatternSet
+_patternSets = {}
+
+## --------------------------------------------------------------------------------------------------------------------
+## Returns the pattern set of a pattern file
+#  - the pattern set is loaded once per process, the worker processes inherit the pattern set of the crawler
+#  @param patternFileSrc - path of the pattern file
+#  @return CrawlerPatternSet
+def getPatternSet(patternFileSrc:str):
+    try:
+        fileStat = os.stat(patternFileSrc)
+        key = (os.path.abspath(patternFileSrc), fileStat.st_mtime_ns, fileStat.st_size)
+    except OSError as e:
+        raise CrawlerConfigError(getattr(e, 'message', repr(e)))
+
+    if key not in _patternSets:
+        _patternSets[key] = CrawlerPatternSet(patternFileSrc)
+    return _patternSets[key]
+# end def getPatternSet
+
+## --------------------------------------------------------------------------------------------------------------------
+## Compiled pattern set
+#  The pattern file is parsed and every pattern is validated once. The parsed patterns are stored in a cache file,
+#  the key of the cache file is the hash of the pattern file and the python version. The prefilter literals and the
+#  wide string variants (see scanengine) are also cached, the wide string variants are created on the first use.
+#  The patterns of the selected ioc types are compiled with re.compile on the first use.
+#
+#  A pattern is stored as dict with the following keys:
+#  - source, flags - pattern and flags of the compiled pattern
+#  - anchors - literals of the prefilter, see getRequiredLiterals
+#  - wide - pattern dict of the wide string variant, None if there is no variant (missing until it is created)
+class CrawlerPatternSet:
+
+    ## constructor
+    #  @param patternFileSrc - path of the pattern file
+    #  @param cacheDirSrc - directory of the cache file, None disables the cache
+    def __init__(self, patternFileSrc:str, cacheDirSrc:str=PATTERN_CACHE_DIR) -> None:
+        self.patternFile = patternFileSrc
+        self.cacheFile   = None
+        self.sections    = [] # list of tuples (ioc type, list of pattern dicts)
+        self.entries     = {} # [KEY - (source, flags)] : VALUE - pattern dict
+        self.compiled    = {} # [KEY - (source, flags)] : VALUE - compiled pattern
+        self.changed     = False
+
+        try:
+            with open(patternFileSrc, 'rb') as f:
+                data = f.read()
+        except Exception as e:
+            raise CrawlerConfigError(getattr(e, 'message', repr(e)))
+
+        if cacheDirSrc:
+            cacheKey = hashlib.sha256(b'%d|%b|%b' % (PATTERN_CACHE_VERSION, sys.version.encode('utf-8'), data))
+            self.cacheFile = os.path.join(cacheDirSrc, "patterns-%s.cache" % cacheKey.hexdigest()[:32])
+
+        if not self._loadCache():
+            self._parse(data)
+            self.changed = True
+            self.save()
+
+        for ioc_type, entries in self.sections:
+            for entry in entries:
+                self.entries.setdefault((entry["source"], entry["flags"]), entry)
+    # end init
+
+    ## Returns the ioc types of the pattern file (lower case)
+    def getSections(self) -> list:
+        return [ioc_type.lower() for ioc_type, entries in self.sections]
+
+    ## Returns the compiled patterns of the selected ioc types
+    #  @param sectionsSrc - list of the selected ioc types (lower case)
+    #  @return dict [KEY - IoC-Type] : VALUE - [List of compiled patterns]
+    def getPatterns(self, sectionsSrc:list) -> dict:
+        patterns = {}
+        for ioc_type, entries in self.sections:
+            if ioc_type.lower() in sectionsSrc and entries:
+                patterns[ioc_type] = [self._compile(entry) for entry in entries]
+        return patterns
+    # end def getPatterns
+
+    ## Returns the prefilter literals of a pattern, see getRequiredLiterals
+    def getAnchors(self, patternSrc) -> list:
+        entry = self.entries.get((patternSrc.pattern, patternSrc.flags))
+        if entry is None:
+            return getRequiredLiterals(patternSrc)
+        return entry["anchors"]
+    # end def getAnchors
+
+    ## Returns the wide string variant of a pattern, see getWidePattern
+    #  @return compiled pattern, None if the pattern has no variant
+    def getWidePattern(self, patternSrc):
+        entry = self.entries.get((patternSrc.pattern, patternSrc.flags))
+        if entry is None:
+            return getWidePattern(patternSrc)
+
+        if "wide" not in entry:
+            widePattern   = getWidePattern(patternSrc)
+            entry["wide"] = self._createEntry(widePattern.pattern, widePattern.flags) if widePattern else None
+            self.changed  = True
+        if entry["wide"] is None:
+            return None
+        self.entries.setdefault((entry["wide"]["source"], entry["wide"]["flags"]), entry["wide"])
+        return self._compile(entry["wide"])
+    # end def getWidePattern
+
+    ## Writes the cache file if the pattern set was changed
+    #  - the cache file is replaced, so other processes read the old or the new file
+    def save(self) -> None:
+        if not self.cacheFile or not self.changed:
+            return
+        tempFile = "%s.%d" %(self.cacheFile, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.cacheFile), mode=0o700, exist_ok=True)
+            with open(tempFile, 'wb') as f:
+                marshal.dump(self.sections, f)
+            os.replace(tempFile, self.cacheFile)
+            self.changed = False
+        except Exception as e:
+            LOG.debug("Pattern cache %s not written: %s" %(self.cacheFile, getattr(e, 'message', repr(e))))
+            if os.path.exists(tempFile):
+                os.remove(tempFile)
+    # end def save
+
+    ## Parses and validates the pattern file
+    def _parse(self, dataSrc:bytes) -> None:
+        try:
+            patternCfg = ConfigParser(interpolation=None)
+            patternCfg.read_string(dataSrc.decode('utf-8'), self.patternFile)
+        except Exception as e:
+            raise CrawlerConfigError(getattr(e, 'message', repr(e)))
+
+        for ioc_type in patternCfg.sections():
+            entries = []
+            for option in patternCfg.options(ioc_type):
+                ioc_pattern = patternCfg[ioc_type][option]
+                if ioc_pattern:
+                    try:
+                        entries.append(self._createEntry(ioc_pattern.encode('utf-8'), 0))
+                    except Exception as e:
+                        raise CrawlerConfigError("Invalid pattern %s in section %s: %s" %(option, ioc_type, str(e)))
+            self.sections.append((ioc_type, entries))
+    # end def _parse
+
+    ## Creates the pattern dict of a regex
+    #  - the flags of the dict contain the inline flags of the regex, like the flags of the compiled pattern
+    def _createEntry(self, sourceSrc:bytes, flagsSrc:int) -> dict:
+        pattern = re.compile(sourceSrc, flagsSrc)
+        entry   = {"source"  : sourceSrc,
+                   "flags"   : pattern.flags,
+                   "anchors" : getRequiredLiterals(pattern)}
+        self.compiled[(entry["source"], entry["flags"])] = pattern
+        return entry
+    # end def _createEntry
+
+    ## Returns the compiled pattern of a pattern dict
+    def _compile(self, entrySrc:dict):
+        key = (entrySrc["source"], entrySrc["flags"])
+        pattern = self.compiled.get(key)
+        if pattern is None:
+            pattern = re.compile(entrySrc["source"], entrySrc["flags"])
+            self.compiled[key] = pattern
+        return pattern
+    # end def _compile
+
+    ## Loads the cache file
+    #  @return True if the pattern set was loaded
+    def _loadCache(self) -> bool:
+        if not self.cacheFile or not os.path.exists(self.cacheFile):
+            return False
+        try:
+            with open(self.cacheFile, 'rb') as f:
+                self.sections = marshal.load(f)
+            return True
+        except Exception as e:
+            LOG.debug("Pattern cache %s not used: %s" %(self.cacheFile, getattr(e, 'message', repr(e))))
+            self.sections = []
+            return False
+    # end def _loadCache
+
+# end class CrawlerPatternSet
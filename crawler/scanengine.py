@@ -0,0 +1,581 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import logging         # for log
+import re              # for pattern
+
+try:
+    import re._parser as sre_parse # python >= 3.11
+except ImportError:
+    import sre_parse               # python < 3.11
+
+from .crawlererr import CrawlerPatternError
+
+## --------------------------------------------------------------------------------------------------------------------
+
+LOG = logging.getLogger('IocCrawlerLog')
+
+
+# max count of alternative literals for a prefilter, bigger sets are slower then the regex search
+MAX_ANCHOR_ALTERNATIVES = 8
+
+# estimated costs of a trigger (see getTrigger): search per byte of a trigger which begins with a literal or with a
+# character set and the search of the run around a hit
+TRIGGER_LITERAL_COST    = 1.0
+TRIGGER_SET_COST        = 15.0
+TRIGGER_VERIFY_COST     = 2000.0
+
+# max gap between the runs of two hits which are searched together
+TRIGGER_MAX_GAP         = 64
+
+# characters which are frequent in text data (letters, digits, white spaces, common punctuation), the hit rate of a
+# trigger character is estimated with the weight of the character
+FREQUENT_CHARACTERS     = frozenset(b'0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz \t\r\n.,:;-/_()=')
+FREQUENT_WEIGHT         = 8
+
+# max count of the characters of a repeat in a trigger
+TRIGGER_MAX_REPEAT      = 3
+
+# first step size of the backward search for the begin of a run around a trigger hit
+TRIGGER_RUN_STEP        = 64
+
+# encoding of the patterns and of the wide string variants
+PATTERN_ENCODING        = "utf-8"
+WIDE_ENCODING           = "utf-16-le"
+
+# escape sequences of the categories in the wide string variants
+WIDE_CATEGORIES         = {sre_parse.CATEGORY_DIGIT    : b'\\d', sre_parse.CATEGORY_NOT_DIGIT : b'\\D',
+                           sre_parse.CATEGORY_SPACE    : b'\\s', sre_parse.CATEGORY_NOT_SPACE : b'\\S',
+                           sre_parse.CATEGORY_WORD     : b'\\w', sre_parse.CATEGORY_NOT_WORD  : b'\\W'}
+WIDE_ANCHORS            = {sre_parse.AT_BEGINNING      : b'^',    sre_parse.AT_END             : b'$',
+                           sre_parse.AT_BEGINNING_STRING : b'\\A', sre_parse.AT_END_STRING    : b'\\Z'}
+
+# character sets of the categories in bytes patterns
+ALL_CHARACTERS          = frozenset(range(256))
+CATEGORY_CHARACTERS     = {sre_parse.CATEGORY_DIGIT : frozenset(b'0123456789'),
+                           sre_parse.CATEGORY_SPACE : frozenset(b' \t\n\r\f\v'),
+                           sre_parse.CATEGORY_WORD  : frozenset(b'0123456789_ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz')}
+NOT_CATEGORIES          = {sre_parse.CATEGORY_NOT_DIGIT : sre_parse.CATEGORY_DIGIT,
+                           sre_parse.CATEGORY_NOT_SPACE : sre_parse.CATEGORY_SPACE,
+                           sre_parse.CATEGORY_NOT_WORD  : sre_parse.CATEGORY_WORD}
+
+# repeat operators of the parsed patterns
+REPEAT_OPS              = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None))
+
+## --------------------------------------------------------------------------------------------------------------------
+## Scan engine for the ioc pattern
+#  The scan engine searches all patterns in a buffer and keeps the order of the pattern file: ioc type, pattern, match.
+#  Before a pattern is searched, a literal prefilter checks if the buffer contains at least one of the literals
+#  (anchors) which are required by every match of the pattern. E.g. the mail pattern requires an "@" and the url pattern
+#  requires "://". If the anchor is not in the buffer, the regex pass for the pattern is skipped. The anchor search is
+#  done with the fast substring search of bytes/mmap objects.
+#
+#  A single alternation of all patterns is not used, because it does not find overlapping matches of different
+#  ioc types (e.g. the domain inside of an url), so the offsets and ioc types would differ.
+#
+#  Patterns without a literal prefix (e.g. ip, domain, mail) are slow in the regex search, because the regex is tried
+#  at every position. These patterns are searched with a trigger (see getTrigger): a short fixed width factor of the
+#  pattern like "\.[0-9]" for the ip pattern is searched, and the pattern is only matched at the positions around the
+#  hits. The matches are the same as the matches of finditer.
+#
+#  In wide string mode every pattern has a UTF-16LE variant, which is searched after the pattern in the same buffer,
+#  see getWidePattern. The matches of a variant have to be decoded with the encoding of the variant (getEncoding).
+class CrawlerScanEngine:
+
+    ## constructor
+    #  @param patternsSrc - dict with the compiled patterns: [KEY - IoC-Type] : VALUE - [List of compiled patterns]
+    #  @param wideSrc - search also the UTF-16LE variants of the patterns
+    #  @param patternSetSrc - CrawlerPatternSet of the patterns, the prefilter literals and the wide string variants
+    #                         are taken from the pattern set
+    def __init__(self, patternsSrc:dict, wideSrc:bool=False, patternSetSrc=None) -> None:
+        self.entries   = []
+        self.encodings = {} # wide pattern : encoding
+        self.names     = {} # pattern : name, e.g. IP[0] or IP[0]/utf-16-le
+        for ioc_type in patternsSrc:
+            for index, pattern in enumerate(patternsSrc[ioc_type]):
+                self.entries.append((ioc_type, pattern, self._getAnchors(pattern, patternSetSrc), getTrigger(pattern)))
+                self.names[pattern] = "%s[%d]" %(ioc_type, index)
+                if not wideSrc:
+                    continue
+
+                widePattern = patternSetSrc.getWidePattern(pattern) if patternSetSrc else getWidePattern(pattern)
+                if widePattern is not None:
+                    self.entries.append((ioc_type, widePattern, self._getAnchors(widePattern, patternSetSrc),
+                                         getTrigger(widePattern)))
+                    self.encodings[widePattern] = WIDE_ENCODING
+                    self.names[widePattern] = "%s[%d]/%s" %(ioc_type, index, WIDE_ENCODING)
+
+    ## Returns the prefilter literals of a pattern
+    @staticmethod
+    def _getAnchors(patternSrc, patternSetSrc) -> list:
+        return patternSetSrc.getAnchors(patternSrc) if patternSetSrc else getRequiredLiterals(patternSrc)
+
+    ## Returns the encoding of the matches of a pattern
+    def getEncoding(self, patternSrc) -> str:
+        return self.encodings.get(patternSrc, PATTERN_ENCODING)
+
+    ## Returns the names of the patterns for the metrics
+    #  @return dict [KEY - compiled pattern] : VALUE - name
+    def getPatternNames(self) -> dict:
+        return self.names
+
+    ## Searches all patterns in the buffer
+    #  - the iterators are created lazy, so a consumer can process the matches of one pattern before the next
+    #    pattern is searched
+    #  @param bufferSrc - bytes like object (bytes, mmap)
+    #  @param startPos - begin of the search in the buffer
+    #  @param endPos - end of the search in the buffer
+    #  @return iterator of tuples (ioc type, pattern, iterator of match objects)
+    def scan(self, bufferSrc, startPos:int=0, endPos:int=None):
+        if endPos is None:
+            endPos = len(bufferSrc)
+        for ioc_type, pattern, anchors, trigger in self.entries:
+            if anchors is not None:
+                if not any(bufferSrc.find(anchor, startPos, endPos) != -1 for anchor in anchors):
+                    continue
+            if trigger is not None:
+                yield ioc_type, pattern, trigger.finditer(pattern, bufferSrc, startPos, endPos)
+            else:
+                yield ioc_type, pattern, pattern.finditer(bufferSrc, startPos, endPos)
+    # end def scan
+
+# end class CrawlerScanEngine
+
+## --------------------------------------------------------------------------------------------------------------------
+## Returns the UTF-16LE variant of a pattern
+#  The regex is rebuild from the parsed pattern, every character is followed by a zero byte. The variant finds the
+#  strings with characters up to U+00FF, e.g. the wide strings of PE files, registry hives and memory dumps.
+#  - groups, repeats, branches and lookarounds are kept, so the groups have the same numbers
+#  - the anchors ^ $ \A \Z are kept, word boundaries and non ascii literals are not supported
+#  @param patternSrc - compiled bytes pattern
+#  @return compiled pattern, None if the pattern can not be converted
+def getWidePattern(patternSrc):
+    try:
+        parsed = sre_parse.parse(patternSrc.pattern, patternSrc.flags)
+        return re.compile(_getWideSequence(list(parsed)), patternSrc.flags)
+    except (CrawlerPatternError, re.error) as e:
+        LOG.debug("No wide string variant of %s: %s" %(patternSrc.pattern, getattr(e, 'message', repr(e))))
+        return None
+# end def getWidePattern
+
+## Returns the source of the wide string variant of a sequence of parsed regex items
+def _getWideSequence(itemsSrc:list) -> bytes:
+    return b''.join(_getWideItem(op, av) for op, av in itemsSrc)
+
+## Returns the source of the wide string variant of a single parsed regex item
+#  - a character is written as group of the character and a zero byte, so a repeat of the item repeats both
+def _getWideItem(opSrc, avSrc) -> bytes:
+    if opSrc is sre_parse.LITERAL:
+        return _getWideCharacter(avSrc) + b'\\x00'
+    elif opSrc is sre_parse.NOT_LITERAL:
+        return b'(?:[^%b]\\x00)' % _getWideCharacter(avSrc)
+    elif opSrc is sre_parse.ANY:
+        return b'(?:[^\\n]\\x00)'
+    elif opSrc is sre_parse.IN:
+        return b'(?:[%b]\\x00)' % b''.join(_getWideSetItem(setOp, setAv) for setOp, setAv in avSrc)
+    elif opSrc is sre_parse.AT and avSrc in WIDE_ANCHORS:
+        return WIDE_ANCHORS[avSrc]
+    elif opSrc is sre_parse.SUBPATTERN:
+        group, addFlags, delFlags, items = avSrc
+        if addFlags or delFlags:
+            raise CrawlerPatternError("Inline flags are not supported")
+        return (b'(%b)' if group is not None else b'(?:%b)') % _getWideSequence(list(items))
+    elif opSrc is sre_parse.BRANCH:
+        return b'(?:%b)' % b'|'.join(_getWideSequence(list(branch)) for branch in avSrc[1])
+    elif opSrc in REPEAT_OPS:
+        minCount, maxCount, items = avSrc
+        repeat = b'{%d,}' % minCount if maxCount is sre_parse.MAXREPEAT else b'{%d,%d}' % (minCount, maxCount)
+        if opSrc is sre_parse.MIN_REPEAT:
+            repeat += b'?'
+        elif opSrc is not sre_parse.MAX_REPEAT:
+            repeat += b'+'
+        return b'(?:%b)%b' % (_getWideSequence(list(items)), repeat)
+    elif opSrc in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        direction, items = avSrc
+        prefix = (b'(?<' if direction < 0 else b'(?') + (b'=' if opSrc is sre_parse.ASSERT else b'!')
+        return prefix + _getWideSequence(list(items)) + b')'
+    elif opSrc is sre_parse.GROUPREF:
+        return b'(?:\\%d)' % avSrc
+    raise CrawlerPatternError("Unsupported regex item %s" %(opSrc))
+# end def _getWideItem
+
+## Returns the source of an item of a character set for the wide string variant
+def _getWideSetItem(opSrc, avSrc) -> bytes:
+    if opSrc is sre_parse.NEGATE:
+        return b'^'
+    elif opSrc is sre_parse.LITERAL:
+        return _getWideCharacter(avSrc)
+    elif opSrc is sre_parse.RANGE:
+        return _getWideCharacter(avSrc[0]) + b'-' + _getWideCharacter(avSrc[1])
+    elif opSrc is sre_parse.CATEGORY and avSrc in WIDE_CATEGORIES:
+        return WIDE_CATEGORIES[avSrc]
+    raise CrawlerPatternError("Unsupported set item %s" %(opSrc))
+# end def _getWideSetItem
+
+## Returns the escaped source of an ascii character
+def _getWideCharacter(charSrc:int) -> bytes:
+    if charSrc > 0x7f:
+        raise CrawlerPatternError("Non ascii literals are not supported")
+    return b'\\x%02x' % charSrc
+# end def _getWideCharacter
+
+## --------------------------------------------------------------------------------------------------------------------
+## Returns the literals which are required by every match of the pattern
+#  @param patternSrc - compiled bytes pattern
+#  @return list of byte strings, one of them is part of every match. None if there is no required literal.
+def getRequiredLiterals(patternSrc) -> list:
+    if patternSrc.flags & re.IGNORECASE:
+        return None
+    try:
+        parsed = sre_parse.parse(patternSrc.pattern, patternSrc.flags)
+    except Exception as e:
+        raise CrawlerPatternError(getattr(e, 'message', repr(e)))
+
+    anchors = _getSequenceLiterals(list(parsed))
+    if anchors and len(anchors) <= MAX_ANCHOR_ALTERNATIVES and min(len(x) for x in anchors) > 0:
+        return sorted(anchors, key=len, reverse=True)
+    return None
+# end def getRequiredLiterals
+
+## Returns the best literal set of a sequence of parsed regex items
+#  - consecutive literals are combined to a string
+#  - the best set is the set with the longest shortest literal and the fewest alternatives
+def _getSequenceLiterals(itemsSrc:list) -> set:
+    candidates = []
+    run = b''
+    for op, av in itemsSrc:
+        if op is sre_parse.LITERAL:
+            run += bytes([av])
+            continue
+        if run:
+            candidates.append({run})
+            run = b''
+        literals = _getItemLiterals(op, av)
+        if literals:
+            candidates.append(literals)
+    if run:
+        candidates.append({run})
+
+    if not candidates:
+        return None
+    return max(candidates, key=lambda x: (min(len(y) for y in x), -len(x)))
+# end def _getSequenceLiterals
+
+## Returns the literal set of a single parsed regex item
+def _getItemLiterals(opSrc, avSrc) -> set:
+    if opSrc is sre_parse.SUBPATTERN:
+        addFlags, delFlags = avSrc[1], avSrc[2]
+        if addFlags & re.IGNORECASE:
+            return None
+        return _getSequenceLiterals(list(avSrc[3]))
+    elif opSrc is sre_parse.BRANCH:
+        literals = set()
+        for branch in avSrc[1]:
+            branchLiterals = _getSequenceLiterals(list(branch))
+            if not branchLiterals:
+                return None
+            literals |= branchLiterals
+        return literals
+    elif opSrc in REPEAT_OPS:
+        if avSrc[0] < 1:
+            return None
+        return _getSequenceLiterals(list(avSrc[2]))
+    elif opSrc is sre_parse.IN:
+        literals = set()
+        for setOp, setAv in avSrc:
+            if setOp is not sre_parse.LITERAL:
+                return None
+            literals.add(bytes([setAv]))
+        return literals
+    return None
+# end def _getItemLiterals
+
+## --------------------------------------------------------------------------------------------------------------------
+## Trigger of a pattern
+#  The trigger is a fixed width factor of the pattern, which is part of every match, e.g. "\.[0-9]" of the ip pattern.
+#  The pattern is only searched in the runs of alphabet characters (the characters of all items of the pattern) around
+#  the hits of the trigger:
+#  - every character of a match is in the alphabet, so a match begins and ends in a run and contains a hit of the run
+#  - a not found hit overlaps a found hit (the hits are not overlapping) and is in the same run
+#  - the search of a run is the same as the search of finditer in the run, because the pattern has no anchors and no
+#    lookarounds (see getTrigger), so the character after the run fails in both searches
+#  So the matches are the same as the matches of finditer and the runs are searched only once.
+class CrawlerPatternTrigger:
+
+    ## constructor
+    #  @param factorSrc - list of character sets of the trigger
+    #  @param alphabetSrc - character set of the pattern
+    def __init__(self, factorSrc:list, alphabetSrc:frozenset) -> None:
+        self.search = re.compile(b''.join(_getSetSource(x) for x in factorSrc))
+        self.run    = re.compile(_getSetSource(alphabetSrc) + b'*')
+        self.table  = bytes(1 if x in alphabetSrc else 0 for x in range(256)) # translate table, 0 - not in alphabet
+
+    ## Returns the source of the trigger
+    def getSource(self) -> bytes:
+        return self.search.pattern
+
+    ## Searches the matches of a pattern with the trigger
+    #  @param patternSrc - compiled pattern of the trigger
+    #  @param bufferSrc - bytes like object (bytes, mmap)
+    #  @param startPos - begin of the search in the buffer
+    #  @param endPos - end of the search in the buffer
+    #  @return iterator of match objects, the same matches as patternSrc.finditer(bufferSrc, startPos, endPos)
+    def finditer(self, patternSrc, bufferSrc, startPos:int, endPos:int):
+        spanStart = spanEnd = startPos
+        lastHit   = None
+        for hit in self.search.finditer(bufferSrc, startPos, endPos):
+            # the runs of close hits are searched together, a short gap is faster in the regex search
+            if lastHit is not None and hit.start() - lastHit.end() > TRIGGER_MAX_GAP:
+                spanEnd = self.run.match(bufferSrc, lastHit.start(), endPos).end()
+                if spanEnd < hit.start():
+                    yield from patternSrc.finditer(bufferSrc, spanStart, spanEnd)
+                    lastHit = None
+            if lastHit is None:
+                spanStart = self._getRunStart(bufferSrc, hit.start(), spanEnd)
+            lastHit = hit
+
+        if lastHit is not None:
+            spanEnd = self.run.match(bufferSrc, lastHit.start(), endPos).end()
+            yield from patternSrc.finditer(bufferSrc, spanStart, spanEnd)
+    # end def finditer
+
+    ## Returns the begin of the run of alphabet characters before a position
+    #  @param limitSrc - the run begins not before this position
+    def _getRunStart(self, bufferSrc, posSrc:int, limitSrc:int) -> int:
+        step = TRIGGER_RUN_STEP
+        while posSrc > limitSrc:
+            begin = max(limitSrc, posSrc - step)
+            index = bufferSrc[begin:posSrc].translate(self.table).rfind(b'\x00')
+            if index != -1:
+                return begin + index + 1
+            posSrc = begin
+            step  *= 2
+        return limitSrc
+    # end def _getRunStart
+
+# end class CrawlerPatternTrigger
+
+## Returns the trigger of a pattern
+#  The factors of the pattern are taken from the sequences, which are part of every match:
+#  - the runs of single characters with the character sets before and after the run, e.g. "[0-9]\.[0-9]" of the ip
+#    pattern
+#  - the end and the begin of two adjacent items, e.g. "\.[a-zA-Z][a-zA-Z]" of the domain pattern
+#  The factor or the part of a factor which begins with a literal with the lowest estimated cost is the trigger.
+#  - patterns with a literal prefix are found fast by the regex search and have no trigger
+#  - patterns with anchors, lookarounds, group references, flags and patterns which match an empty string have no
+#    trigger, because a match at a position can differ from the try of finditer at the position
+#  @param patternSrc - compiled bytes pattern
+#  @return CrawlerPatternTrigger, None if the pattern has no trigger
+def getTrigger(patternSrc):
+    if not isinstance(patternSrc.pattern, bytes) or patternSrc.flags & (re.IGNORECASE | re.LOCALE | re.DOTALL):
+        return None
+    try:
+        parsed = sre_parse.parse(patternSrc.pattern, patternSrc.flags)
+    except Exception as e:
+        raise CrawlerPatternError(getattr(e, 'message', repr(e)))
+
+    items    = list(parsed)
+    alphabet = _getAlphabet(items)
+    if alphabet is None or parsed.getwidth()[0] == 0:
+        return None
+    first = _getEdges(items)[1]
+    if len(first) == 1:
+        return None
+
+    factors = []
+    _addFactors(items, None, None, factors)
+    candidates = []
+    for factor in factors:
+        candidates.append(factor)
+        for index in range(1, len(factor)):
+            if len(factor[index]) == 1:
+                candidates.append(factor[index:])
+                break
+    if not candidates:
+        return None
+
+    best = min(candidates, key=_getTriggerCost)
+    if _getTriggerCost(best) >= TRIGGER_SET_COST + TRIGGER_VERIFY_COST * _getHitRate(first):
+        return None
+    return CrawlerPatternTrigger(best, alphabet)
+# end def getTrigger
+
+## Returns the estimated cost of a trigger per byte of the buffer
+def _getTriggerCost(factorSrc:list) -> float:
+    hitRate = 1.0
+    for chars in factorSrc:
+        hitRate *= _getHitRate(chars)
+    searchCost = TRIGGER_LITERAL_COST if len(factorSrc[0]) == 1 else TRIGGER_SET_COST
+    return searchCost + hitRate * TRIGGER_VERIFY_COST
+# end def _getTriggerCost
+
+## Returns the estimated hit rate of a character set
+#  - the frequent characters have a higher weight, see FREQUENT_CHARACTERS
+def _getHitRate(charsSrc:frozenset) -> float:
+    total    = len(FREQUENT_CHARACTERS) * FREQUENT_WEIGHT + 256 - len(FREQUENT_CHARACTERS)
+    frequent = len(charsSrc & FREQUENT_CHARACTERS)
+    return (frequent * FREQUENT_WEIGHT + len(charsSrc) - frequent) / total
+# end def _getHitRate
+
+## Returns the regex source of a character set
+def _getSetSource(charsSrc:frozenset) -> bytes:
+    if len(charsSrc) == 1:
+        return b'\\x%02x' % next(iter(charsSrc))
+    return b'[%b]' % b''.join(b'\\x%02x' % x for x in sorted(charsSrc))
+# end def _getSetSource
+
+## Adds the factors of a sequence of parsed regex items
+#  @param itemsSrc - items of a sequence, which is part of every match
+#  @param beforeSrc - characters before the sequence, None if the sequence can begin the match
+#  @param afterSrc - characters after the sequence, None if the sequence can end the match
+#  @param factorsSrc - list of the factors, a factor is a list of character sets
+def _addFactors(itemsSrc:list, beforeSrc, afterSrc, factorsSrc:list) -> None:
+    index = 0
+    while index < len(itemsSrc):
+        op, av = itemsSrc[index]
+        before = _getBefore(itemsSrc, index, beforeSrc)
+        if _getCharacters(op, av) is not None:
+            run = []
+            while index < len(itemsSrc) and _getCharacters(*itemsSrc[index]) is not None:
+                run.append(_getCharacters(*itemsSrc[index]))
+                index += 1
+            after = _getAfter(itemsSrc, index, afterSrc)
+            factorsSrc.append(([before] if before else []) + run + ([after] if after else []))
+            continue
+
+        after = _getAfter(itemsSrc, index + 1, afterSrc)
+        if index + 1 < len(itemsSrc) and not _getItemEdges(op, av)[0] and not _getItemEdges(*itemsSrc[index + 1])[0]:
+            factorsSrc.append(_getTail(op, av) + _getHead(*itemsSrc[index + 1]))
+
+        if op is sre_parse.SUBPATTERN:
+            _addFactors(list(av[3]), before, after, factorsSrc)
+        elif op in REPEAT_OPS and av[0] > 0:
+            minCount, maxCount, body = av
+            if maxCount > 1:
+                nullable, first, last = _getEdges(list(body))
+                before = before | last if before is not None else None
+                after  = after | first if after is not None else None
+            _addFactors(list(body), before, after, factorsSrc)
+        index += 1
+# end def _addFactors
+
+## Returns the character sets at the begin of every match of an item
+#  - the begin of a repeat of a single character are the characters of the minimal count
+def _getHead(opSrc, avSrc) -> list:
+    if opSrc in REPEAT_OPS and len(avSrc[2]) == 1 and _getCharacters(*avSrc[2][0]) is not None:
+        return [_getCharacters(*avSrc[2][0])] * min(avSrc[0], TRIGGER_MAX_REPEAT)
+    return [_getItemEdges(opSrc, avSrc)[1]]
+# end def _getHead
+
+## Returns the character sets at the end of every match of an item, see _getHead
+def _getTail(opSrc, avSrc) -> list:
+    if opSrc in REPEAT_OPS and len(avSrc[2]) == 1 and _getCharacters(*avSrc[2][0]) is not None:
+        return [_getCharacters(*avSrc[2][0])] * min(avSrc[0], TRIGGER_MAX_REPEAT)
+    return [_getItemEdges(opSrc, avSrc)[2]]
+# end def _getTail
+
+## Returns the characters before an item of a sequence
+#  @return set of the last characters of the items before, None if the item can begin the match
+def _getBefore(itemsSrc:list, indexSrc:int, beforeSrc):
+    chars = frozenset()
+    for op, av in reversed(itemsSrc[:indexSrc]):
+        nullable, first, last = _getItemEdges(op, av)
+        chars |= last
+        if not nullable:
+            return chars
+    return chars | beforeSrc if beforeSrc is not None else None
+# end def _getBefore
+
+## Returns the characters after an item of a sequence
+#  @param indexSrc - index of the item after
+#  @return set of the first characters of the items after, None if the item can end the match
+def _getAfter(itemsSrc:list, indexSrc:int, afterSrc):
+    chars = frozenset()
+    for op, av in itemsSrc[indexSrc:]:
+        nullable, first, last = _getItemEdges(op, av)
+        chars |= first
+        if not nullable:
+            return chars
+    return chars | afterSrc if afterSrc is not None else None
+# end def _getAfter
+
+## Returns the edges of a sequence of parsed regex items
+#  @return tuple (matches an empty string, set of the first characters, set of the last characters)
+def _getEdges(itemsSrc:list) -> tuple:
+    first = _getAfter(itemsSrc, 0, frozenset())
+    last  = _getBefore(itemsSrc, len(itemsSrc), frozenset())
+    return all(_getItemEdges(op, av)[0] for op, av in itemsSrc), first, last
+# end def _getEdges
+
+## Returns the edges of a single parsed regex item, see _getEdges
+def _getItemEdges(opSrc, avSrc) -> tuple:
+    chars = _getCharacters(opSrc, avSrc)
+    if chars is not None:
+        return False, chars, chars
+    elif opSrc is sre_parse.SUBPATTERN:
+        return _getEdges(list(avSrc[3]))
+    elif opSrc is sre_parse.BRANCH:
+        edges = [_getEdges(list(branch)) for branch in avSrc[1]]
+        return (any(x[0] for x in edges), frozenset().union(*(x[1] for x in edges)),
+                frozenset().union(*(x[2] for x in edges)))
+    elif opSrc in REPEAT_OPS:
+        nullable, first, last = _getEdges(list(avSrc[2]))
+        return nullable or avSrc[0] == 0, first, last
+    return True, ALL_CHARACTERS, ALL_CHARACTERS
+# end def _getItemEdges
+
+## Returns the alphabet of a sequence of parsed regex items
+#  @return set of all characters of the items, None if an item is not supported by the trigger
+def _getAlphabet(itemsSrc:list):
+    alphabet = frozenset()
+    for op, av in itemsSrc:
+        chars = _getCharacters(op, av)
+        if chars is None:
+            if op is sre_parse.SUBPATTERN and not av[1] and not av[2]:
+                chars = _getAlphabet(list(av[3]))
+            elif op is sre_parse.BRANCH:
+                chars = frozenset()
+                for branch in av[1]:
+                    branchChars = _getAlphabet(list(branch))
+                    if branchChars is None:
+                        return None
+                    chars |= branchChars
+            elif op in REPEAT_OPS:
+                chars = _getAlphabet(list(av[2]))
+            if chars is None:
+                return None
+        alphabet |= chars
+    return alphabet
+# end def _getAlphabet
+
+## Returns the character set of a single character item
+#  @return set of the characters, None if the item is not a single character
+def _getCharacters(opSrc, avSrc):
+    if opSrc is sre_parse.LITERAL:
+        return frozenset((avSrc,))
+    elif opSrc is sre_parse.NOT_LITERAL:
+        return ALL_CHARACTERS - {avSrc}
+    elif opSrc is sre_parse.ANY:
+        return ALL_CHARACTERS - {ord('\n')}
+    elif opSrc is sre_parse.IN:
+        chars  = frozenset()
+        negate = False
+        for setOp, setAv in avSrc:
+            if setOp is sre_parse.NEGATE:
+                negate = True
+            elif setOp is sre_parse.LITERAL:
+                chars |= {setAv}
+            elif setOp is sre_parse.RANGE:
+                chars |= frozenset(range(setAv[0], setAv[1] + 1))
+            elif setOp is sre_parse.CATEGORY and setAv in CATEGORY_CHARACTERS:
+                chars |= CATEGORY_CHARACTERS[setAv]
+            elif setOp is sre_parse.CATEGORY and setAv in NOT_CATEGORIES:
+                chars |= ALL_CHARACTERS - CATEGORY_CHARACTERS[NOT_CATEGORIES[setAv]]
+            else:
+                return None
+        return ALL_CHARACTERS - chars if negate else chars
+    return None
+# end def _getCharacters
+
+## --------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,280 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import asyncio         # for the asynchronous scan
+import json            # for the service protocol
+import logging         # for log
+import os              # for the socket file
+import queue           # for the results of the scan thread
+import socketserver    # for the scan service
+import threading       # for the scan thread
+
+from .crawler        import Crawler
+from .crawlererr     import CrawlerError
+from .crawlerdata    import CrawlerMatchVo
+from .cache          import CACHE_DEFAULT_SIZE
+from .patternset     import getPatternSet
+from .workerpool     import CrawlerWorkerPool
+
+## --------------------------------------------------------------------------------------------------------------------
+
+LOG = logging.getLogger('IocCrawlerLog')
+
+# max count of result objects between the scan thread and the consumer, the workers wait for a slow consumer
+SCANNER_QUEUE_SIZE = 64
+
+# size of the result lines which are send together by the scan service
+SERVICE_BATCH_SIZE = 64 * 1024
+
+## --------------------------------------------------------------------------------------------------------------------
+## Reusable scanner
+#  The scanner keeps a warm pool of worker processes with the loaded patterns and the whitelist, so many paths can be
+#  scanned without starting the processes again. Every scan runs the crawler in a thread, the results are returned
+#  while the crawler is running.
+#  - scan() returns an iterator of CrawlerMatchVo
+#  - scanAsync() returns an asynchronous iterator of CrawlerMatchVo for asyncio applications
+#  - summary has the result summary of the last scan, see Crawler.getResultSummary
+#  - whitelistHits has the hits of the whitelist rules of the last scan, see Crawler.getWhitelistRuleHits
+#  Only one scan runs at the same time, further scans wait until the running scan is finished. The scanner can be used
+#  as context manager, otherwise the worker processes have to be stopped with close().
+#
+#  Example:
+#      with CrawlerScanner(4, "pattern.ini") as scanner:
+#          for match in scanner.scan("/mnt/image"):
+#              print(match.path, match.iocType, match.match, match.offset)
+class CrawlerScanner:
+
+    ## constructor
+    #  - the worker processes are started with the first scan
+    #  @param threadsSrc - count of the worker processes
+    #  @param patternSrc - path of the pattern file
+    #  @param sectionsSrc - list of the ioc types (lower case), None selects all ioc types of the pattern file
+    #  see Crawler for the other parameters
+    def __init__(self, threadsSrc:int, patternSrc:str, sectionsSrc:list=None, matchSizeSrc:int=256,
+                 whitelistSrc:str=None, beforeSrc:int=0, afterSrc:int=0, cacheFileSrc:str=None,
+                 cacheSizeSrc:int=CACHE_DEFAULT_SIZE, archivesSrc:bool=False, wideSrc:bool=False,
+                 dedupSrc:bool=True) -> None:
+        self.pattern       = patternSrc
+        self.sections      = sectionsSrc
+        self.matchSize     = matchSizeSrc
+        self.whitelist     = whitelistSrc
+        self.before        = beforeSrc
+        self.after         = afterSrc
+        self.cacheFile     = cacheFileSrc
+        self.cacheSize     = cacheSizeSrc
+        self.archives      = archivesSrc
+        self.wide          = wideSrc
+        self.dedup         = dedupSrc
+        self.pool          = CrawlerWorkerPool(threadsSrc)
+        self.lock          = threading.Lock()
+        self.summary       = {}
+        self.whitelistHits = []
+
+        if self.sections is None:
+            self.sections = getPatternSet(patternSrc).getSections()
+    # end init
+
+    ## Scans a file or a directory
+    #  - the matches of a file are returned together, the files are returned in the order of the processing
+    #  @param pathSrc - path of the file or directory
+    #  @return iterator of CrawlerMatchVo
+    def scan(self, pathSrc:str):
+        for cvo in self._iterResults(pathSrc):
+            yield from _iterMatchObjects(cvo)
+    # end def scan
+
+    ## Scans a file or a directory for asyncio applications
+    #  - the crawler runs in a thread, the event loop is not blocked while waiting for the results
+    #  @param pathSrc - path of the file or directory
+    #  @return asynchronous iterator of CrawlerMatchVo
+    async def scanAsync(self, pathSrc:str):
+        loop    = asyncio.get_running_loop()
+        results = self._iterResults(pathSrc)
+        try:
+            while True:
+                cvo = await loop.run_in_executor(None, next, results, None)
+                if cvo is None:
+                    break
+                for match in _iterMatchObjects(cvo):
+                    yield match
+        finally:
+            await loop.run_in_executor(None, results.close)
+    # end def scanAsync
+
+    ## Runs the crawler in a thread and returns the result objects
+    #  - if the iterator is closed before the end, the remaining results are dropped
+    #  @return iterator of CrawlerVo
+    def _iterResults(self, pathSrc:str):
+        with self.lock:
+            crawler  = Crawler(pathSrc, self.pool.processCount, self.pattern, False, [], self.sections, False,
+                               self.matchSize, self.whitelist, self.before, self.after, self.cacheFile, self.cacheSize,
+                               self.archives, self.pool, wideSrc=self.wide, quietSrc=True, dedupSrc=self.dedup)
+            exporter = _CrawlerQueueExporter()
+            errors   = []
+
+            ## Runs the crawler and marks the end of the results
+            def _runCrawler():
+                try:
+                    crawler.do(exporter, False)
+                except CrawlerError as ce:
+                    errors.append(ce)
+                finally:
+                    exporter.finish()
+            # end _runCrawler
+
+            thread = threading.Thread(target=_runCrawler, daemon=True)
+            thread.start()
+            try:
+                while True:
+                    cvo = exporter.results.get()
+                    if cvo is None:
+                        break
+                    yield cvo
+            finally:
+                exporter.cancel()
+                thread.join()
+
+            self.summary       = crawler.getResultSummary()
+            self.whitelistHits = crawler.getWhitelistRuleHits()
+            if errors:
+                raise errors[0]
+    # end def _iterResults
+
+    ## Stops the worker processes
+    def close(self) -> None:
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> None:
+        self.close()
+
+# end class CrawlerScanner
+
+## Returns the match objects of a result object
+def _iterMatchObjects(cvo):
+    if cvo.hasContext():
+        for iocType, matchString, offset, before, after in cvo.iterContextMatches():
+            yield CrawlerMatchVo(cvo.path, iocType, matchString, offset, before, after)
+    else:
+        for iocType, matchString, offsets in cvo.iterMatches():
+            for offset in offsets:
+                yield CrawlerMatchVo(cvo.path, iocType, matchString, offset)
+# end def _iterMatchObjects
+
+## --------------------------------------------------------------------------------------------------------------------
+## Exporter for the scanner
+#  The result writer of the crawler puts the result objects into a bounded queue, None marks the end of the results.
+#  After cancel() the results are dropped, so the crawler finishes without a consumer.
+class _CrawlerQueueExporter:
+
+    def __init__(self) -> None:
+        self.results   = queue.Queue(SCANNER_QUEUE_SIZE)
+        self.cancelled = threading.Event()
+
+    ## Adds a result object to the queue, waits for a free place
+    def writeResult(self, fileResult) -> None:
+        while not self.cancelled.is_set():
+            try:
+                self.results.put(fileResult, timeout=1)
+                return
+            except queue.Full:
+                continue
+    # end def writeResult
+
+    ## Marks the end of the results
+    def finish(self) -> None:
+        self.writeResult(None)
+
+    ## Drops the queued and the following results
+    def cancel(self) -> None:
+        self.cancelled.set()
+        try:
+            while True:
+                self.results.get_nowait()
+        except queue.Empty:
+            pass
+    # end def cancel
+
+# end class _CrawlerQueueExporter
+
+## --------------------------------------------------------------------------------------------------------------------
+## Scan service
+#  The service accepts scan jobs on a unix socket and streams the results back, the jobs are processed by a
+#  CrawlerScanner. The protocol uses json lines:
+#  - a job is a line with the path to scan: {"path": "/mnt/image"}, a client can send several jobs
+#  - every match is returned as line: {"path": ..., "ioc": ..., "match": ..., "offset": ...} (and the context)
+#  - the end of a job is returned as line: {"done": "/mnt/image", "summary": {...}, "whitelistHits": [[rule, hits], ...]}
+#    or {"error": "message"}
+#  The jobs of all clients are processed one after the other.
+class CrawlerScanService(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    ## constructor
+    #  - an existing socket file is replaced
+    #  @param socketPathSrc - path of the unix socket
+    #  @param scannerSrc - CrawlerScanner for the jobs
+    def __init__(self, socketPathSrc:str, scannerSrc:CrawlerScanner) -> None:
+        self.socketPath = socketPathSrc
+        self.scanner    = scannerSrc
+        if os.path.exists(socketPathSrc):
+            os.remove(socketPathSrc)
+        super().__init__(socketPathSrc, _CrawlerScanHandler)
+    # end init
+
+    ## Stops the service and removes the socket file
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.socketPath):
+            os.remove(self.socketPath)
+
+# end class CrawlerScanService
+
+## Handler of a client connection of the scan service
+class _CrawlerScanHandler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+                self._runJob(job["path"])
+                self._send([json.dumps({"done": job["path"], "summary": self.server.scanner.summary,
+                                        "whitelistHits": self.server.scanner.whitelistHits})])
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            except CrawlerError as ce:
+                self._send([json.dumps({"error": ce.msg})])
+            except Exception as e:
+                self._send([json.dumps({"error": getattr(e, 'message', repr(e))})])
+    # end def handle
+
+    ## Scans a path and sends the matches in batches
+    def _runJob(self, pathSrc:str) -> None:
+        matches = self.server.scanner.scan(pathSrc)
+        try:
+            lines = []
+            size  = 0
+            for match in matches:
+                lines.append(json.dumps(match.toDict()))
+                size += len(lines[-1])
+                if size >= SERVICE_BATCH_SIZE:
+                    self._send(lines)
+                    lines = []
+                    size  = 0
+            self._send(lines)
+        finally:
+            matches.close()
+    # end def _runJob
+
+    ## Sends json lines to the client
+    def _send(self, linesSrc:list) -> None:
+        if linesSrc:
+            self.wfile.write("".join(line + "\n" for line in linesSrc).encode("utf-8"))
+            self.wfile.flush()
+
+# end class _CrawlerScanHandler
@@ -0,0 +1,231 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import csv             # for reading csv export files
+import gzip            # for reading compressed export files
+import hashlib         # for the partitioning
+import json            # for the summary files and json lines export files
+import logging         # for log
+import os              # for the summary files
+import sqlite3         # for reading sqlite export files
+
+from .crawlererr     import CrawlerConfigError, CrawlerExportError
+from .exporter       import createStreamExporter
+
+## --------------------------------------------------------------------------------------------------------------------
+
+LOG = logging.getLogger('IocCrawlerLog')
+
+# version of the summary file format
+SHARD_SUMMARY_VERSION = 1
+
+# the summary of a shard is written next to the export file with this suffix
+SHARD_SUMMARY_SUFFIX  = ".summary.json"
+
+# summary entries of the listing, every shard lists all files, so the entries are not summed up
+SHARD_LISTING_ENTRIES = ("Whitelisted directories", "Whitelisted files")
+
+# summary entries which are only valid for one shard, the hits of the whitelist rules are summed up instead
+SHARD_LOCAL_ENTRIES   = ("Files of other shards", "Whitelist rules without hits")
+
+# count of rows which are read and written together while merging
+MERGE_BATCH_ROWS      = 10000
+
+## --------------------------------------------------------------------------------------------------------------------
+## Sharding
+#  A large source can be crawled by several nodes, every node scans a disjoint share (shard) of the same mounted path
+#  (see the shard argument of Crawler). The files are partitioned by a stable hash of the path relative to the source,
+#  so every node selects the same files without communication. The shard outputs are combined with mergeShards.
+
+## Parses a shard argument
+#  @param shardSrc - string "i/N", i is the index of the shard (1 to N) and N is the count of shards
+#  @return tuple (index, count)
+def parseShard(shardSrc:str) -> tuple:
+    try:
+        index, count = [int(x) for x in shardSrc.split("/")]
+    except ValueError:
+        raise CrawlerConfigError("Invalid shard %s, use i/N, e.g. 1/4" %(shardSrc))
+    if not 1 <= index <= count:
+        raise CrawlerConfigError("Invalid shard %s, the index has to be between 1 and %d" %(shardSrc, max(1, count)))
+    return (index, count)
+# end def parseShard
+
+## Returns the shard of a partitioning key
+#  - the hash does not depend on the process or the python version, so every node returns the same shard
+#  @param keySrc - path relative to the source, with the range index for ranges of large files
+#  @param countSrc - count of shards
+#  @return index of the shard (1 to countSrc)
+def getShardIndex(keySrc:str, countSrc:int) -> int:
+    digest = hashlib.blake2b(keySrc.encode('utf-8', 'surrogateescape'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % countSrc + 1
+# end def getShardIndex
+
+## Writes the summary of a shard next to the export file
+#  @param exportFileSrc - path of the export file of the shard
+#  @param shardSrc - tuple (index, count)
+#  @param columnsSrc - columns of the export file
+#  @param summarySrc - result summary, see Crawler.getResultSummary
+#  @param whitelistHitsSrc - hits of the whitelist rules, see Crawler.getWhitelistRuleHits
+#  @param fingerprintSrc - fingerprint of the settings, only shards with the same settings are merged
+#  @return path of the summary file
+def writeShardSummary(exportFileSrc:str, shardSrc:tuple, columnsSrc:list, summarySrc:dict, whitelistHitsSrc:list,
+                      fingerprintSrc:str) -> str:
+    summaryFile = exportFileSrc + SHARD_SUMMARY_SUFFIX
+    tempFile    = "%s.%d" %(summaryFile, os.getpid())
+    try:
+        with open(tempFile, 'w', encoding='utf-8') as f:
+            json.dump({"version"       : SHARD_SUMMARY_VERSION,
+                       "shard"         : list(shardSrc),
+                       "columns"       : list(columnsSrc),
+                       "fingerprint"   : fingerprintSrc,
+                       "summary"       : summarySrc,
+                       "whitelistHits" : whitelistHitsSrc}, f, indent=1)
+        os.replace(tempFile, summaryFile)
+        return summaryFile
+    except Exception as e:
+        if os.path.exists(tempFile):
+            os.remove(tempFile)
+        raise CrawlerExportError(getattr(e, 'message', repr(e)))
+# end def writeShardSummary
+
+## Loads the summary of a shard, see writeShardSummary
+def _loadShardSummary(exportFileSrc:str) -> dict:
+    summaryFile = exportFileSrc + SHARD_SUMMARY_SUFFIX
+    try:
+        with open(summaryFile, 'r', encoding='utf-8') as f:
+            summary = json.load(f)
+    except FileNotFoundError:
+        raise CrawlerConfigError("%s has no shard summary (%s)" %(exportFileSrc, summaryFile))
+    except ValueError:
+        raise CrawlerConfigError("%s is no shard summary" %(summaryFile))
+    if summary.get("version") != SHARD_SUMMARY_VERSION:
+        raise CrawlerConfigError("%s is no shard summary of this version" %(summaryFile))
+    return summary
+# end def _loadShardSummary
+
+## Merges the export files of all shards of a crawl
+#  - the shards have to be created with the same settings and columns, every shard has to be present once
+#  - the rows are copied in the order of the files, the format of the shard files is detected from the content
+#  - the summaries are merged: the match counters are summed up, the counters of the listing are taken once and the
+#    rules without hits are counted from the summed up hits of the whitelist rules
+#  @param exportFilesSrc - list of the export files of the shards
+#  @param mergeFileSrc - path of the merged export file
+#  @param exportFormatSrc - format of the merged export file, see EXPORT_FORMATS
+#  @param compressSrc - write a gzip compressed file (csv and json lines only)
+#  @return tuple (merged summary, list of tuples (whitelist rule, count of hits) sorted by the hits)
+def mergeShards(exportFilesSrc:list, mergeFileSrc:str, exportFormatSrc:str, compressSrc:bool=False) -> tuple:
+    summaries = [_loadShardSummary(exportFile) for exportFile in exportFilesSrc]
+    if os.path.abspath(mergeFileSrc) in [os.path.abspath(exportFile) for exportFile in exportFilesSrc]:
+        raise CrawlerConfigError("The merged file %s is a shard file" %(mergeFileSrc))
+
+    # check if the shards belong together
+    shardCount = summaries[0]["shard"][1]
+    columns    = summaries[0]["columns"]
+    indexes    = {}
+    for exportFile, summary in zip(exportFilesSrc, summaries):
+        index, count = summary["shard"]
+        if count != shardCount or summary["fingerprint"] != summaries[0]["fingerprint"] or summary["columns"] != columns:
+            raise CrawlerConfigError("%s is not a shard of the crawl of %s (count of shards, settings or columns)"
+                                     %(exportFile, exportFilesSrc[0]))
+        if index in indexes:
+            raise CrawlerConfigError("%s and %s are the same shard %d/%d" %(indexes[index], exportFile, index, count))
+        indexes[index] = exportFile
+    missing = [str(index) for index in range(1, shardCount + 1) if index not in indexes]
+    if missing:
+        raise CrawlerConfigError("Missing shards %s of %d" %(", ".join(missing), shardCount))
+
+    # copy the rows
+    exporter = createStreamExporter(mergeFileSrc, columns, exportFormatSrc, compressSrc)
+    try:
+        for exportFile in exportFilesSrc:
+            LOG.debug("Merging %s" %(exportFile))
+            for rows in _iterExportRows(exportFile, columns):
+                exporter.writeRows(rows)
+    finally:
+        exporter.close()
+
+    # merge the summaries
+    mergedSummary = {}
+    ruleHits      = {}
+    for summary in summaries:
+        for entry, value in summary["summary"].items():
+            if entry in SHARD_LOCAL_ENTRIES:
+                continue
+            elif entry in SHARD_LISTING_ENTRIES:
+                mergedSummary[entry] = max(mergedSummary.get(entry, 0), value)
+            else:
+                mergedSummary[entry] = mergedSummary.get(entry, 0) + value
+        for rule, hits in summary["whitelistHits"]:
+            ruleHits[rule] = ruleHits.get(rule, 0) + hits
+    # end for
+    unusedRules = sum(1 for hits in ruleHits.values() if hits == 0)
+    if unusedRules > 0:
+        mergedSummary["Whitelist rules without hits"] = unusedRules
+
+    return mergedSummary, sorted(ruleHits.items(), key=lambda x: x[1], reverse=True)
+# end def mergeShards
+
+## Reads the rows of an export file
+#  - csv, json lines (both optional gzip compressed) and sqlite files are supported
+#  @param columnsSrc - columns of the rows, they have to be in the export file
+#  @return iterator of lists of rows, every row is a tuple with the values of the columns
+def _iterExportRows(exportFileSrc:str, columnsSrc:list):
+    try:
+        with open(exportFileSrc, 'rb') as f:
+            magic = f.read(16)
+
+        if magic.startswith(b"SQLite format 3"):
+            connection = sqlite3.connect("file:%s?mode=ro" %(exportFileSrc), uri=True)
+            try:
+                cursor = connection.execute("SELECT %s FROM matches ORDER BY rowid"
+                                            %(", ".join('"%s"' %(column) for column in columnsSrc)))
+                for rows in iter(lambda: cursor.fetchmany(MERGE_BATCH_ROWS), []):
+                    yield rows
+            finally:
+                connection.close()
+            return
+        # end if
+
+        openFile = gzip.open if magic.startswith(b"\x1f\x8b") else open
+        with openFile(exportFileSrc, 'rt', encoding='utf-8', newline='') as f:
+            header = f.readline()
+            if not header:
+                # json lines file without matches
+                return
+            if header.startswith("{"):
+                # json lines
+                lines = [header]
+                for line in f:
+                    lines.append(line)
+                    if len(lines) >= MERGE_BATCH_ROWS:
+                        yield [_getJsonRow(line, columnsSrc) for line in lines if line.strip()]
+                        lines = []
+                yield [_getJsonRow(line, columnsSrc) for line in lines if line.strip()]
+                return
+            # end if
+
+            # csv with header, the offset is written as string
+            if next(csv.reader([header], delimiter='|'), []) != list(columnsSrc):
+                raise CrawlerExportError("The columns of %s are not %s" %(exportFileSrc, ", ".join(columnsSrc)))
+            offsetIndex = columnsSrc.index("offset") if "offset" in columnsSrc else None
+            rows = []
+            for row in csv.reader(f, delimiter='|'):
+                if offsetIndex is not None:
+                    row[offsetIndex] = int(row[offsetIndex])
+                rows.append(tuple(row))
+                if len(rows) >= MERGE_BATCH_ROWS:
+                    yield rows
+                    rows = []
+            yield rows
+    except CrawlerExportError as ee:
+        raise ee
+    except Exception as e:
+        raise CrawlerExportError("%s not read: %s" %(exportFileSrc, getattr(e, 'message', repr(e))))
+# end def _iterExportRows
+
+## Returns the row of a json line
+def _getJsonRow(lineSrc:str, columnsSrc:list) -> tuple:
+    record = json.loads(lineSrc)
+    return tuple(record[column] for column in columnsSrc)
+# end def _getJsonRow
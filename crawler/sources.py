@@ -0,0 +1,344 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import bz2             # for bz2 streams
+import gzip            # for gzip streams
+import logging         # for log
+import lzma            # for xz streams
+import os              # for path
+import tarfile         # for tar archives
+import zipfile         # for zip archives
+
+from .crawlererr     import CrawlerArchiveError # ioc crawler error handling
+
+## --------------------------------------------------------------------------------------------------------------------
+
+LOG = logging.getLogger('IocCrawlerLog')
+
+# separator between the path of an archive and the path of a member, e.g. archive.tar.gz!/var/log/x
+ARCHIVE_SEPARATOR      = "!/"
+
+# archive formats
+ARCHIVE_ZIP            = "zip"
+ARCHIVE_TAR            = "tar"
+ARCHIVE_GZIP           = "gzip"
+ARCHIVE_BZ2            = "bz2"
+ARCHIVE_XZ             = "xz"
+
+# guards against nested archives and decompression bombs
+ARCHIVE_MAX_DEPTH      = 4                  # max count of nested archive layers
+ARCHIVE_MAX_RATIO      = 200                # max ratio of decompressed to compressed bytes
+ARCHIVE_RATIO_MIN_SIZE = 16 * 1024 * 1024   # the ratio is checked above this decompressed size
+
+# size of the header for the format detection (the tar magic is at offset 257)
+ARCHIVE_HEADER_SIZE    = 265
+
+# suffixes which are removed from the name of a compressed file, e.g. x.log.gz!/x.log
+COMPRESSED_SUFFIXES    = {".gz": "", ".tgz": ".tar", ".bz2": "", ".tbz2": ".tar", ".xz": "", ".txz": ".tar"}
+
+## --------------------------------------------------------------------------------------------------------------------
+## Returns the archive format of a header
+#  - the format is detected by the magic bytes, not by the file name
+#  @param headerSrc - first bytes of the data, see ARCHIVE_HEADER_SIZE
+#  @return format name or None if the data is not an archive
+def getArchiveFormat(headerSrc:bytes) -> str:
+    if headerSrc.startswith(b'PK\x03\x04'):
+        return ARCHIVE_ZIP
+    if headerSrc.startswith(b'\x1f\x8b'):
+        return ARCHIVE_GZIP
+    if headerSrc.startswith(b'BZh'):
+        return ARCHIVE_BZ2
+    if headerSrc.startswith(b'\xfd7zXZ\x00'):
+        return ARCHIVE_XZ
+    if headerSrc[257:262] == b'ustar':
+        return ARCHIVE_TAR
+    return None
+# end def getArchiveFormat
+
+## Returns the archive format of a file
+#  @return format name or None if the file is not an archive or can not be read
+def getFileFormat(filePathSrc:str) -> str:
+    try:
+        with open(filePathSrc, 'rb') as f:
+            return getArchiveFormat(f.read(ARCHIVE_HEADER_SIZE))
+    except OSError:
+        return None
+# end def getFileFormat
+
+## Lists the members of a zip archive
+#  - the members are processed as separate files, so the members of an archive are processed in parallel
+#  @param filePathSrc - path of the archive
+#  @return list of tuples (virtual path, uncompressed size), None if the archive can not be read
+def listZipMembers(filePathSrc:str) -> list:
+    try:
+        with zipfile.ZipFile(filePathSrc) as archive:
+            return [(filePathSrc + ARCHIVE_SEPARATOR + info.filename, info.file_size)
+                    for info in archive.infolist() if not info.is_dir()]
+    except (OSError, zipfile.BadZipFile, ValueError) as e:
+        LOG.debug("Can not list %s: %s" %(filePathSrc, repr(e)))
+        return None
+# end def listZipMembers
+
+## Splits a virtual path into the path of the archive and the name of the member
+#  - the archive is the first part of the path which is a file, so member names can contain the separator
+#  @return tuple (archive path, member name), None if the path is not a virtual path
+def splitVirtualPath(pathSrc:str) -> tuple:
+    idx = pathSrc.find(ARCHIVE_SEPARATOR)
+    while idx >= 0:
+        if os.path.isfile(pathSrc[:idx]):
+            return (pathSrc[:idx], pathSrc[idx + len(ARCHIVE_SEPARATOR):])
+        idx = pathSrc.find(ARCHIVE_SEPARATOR, idx + 1)
+    return None
+# end def splitVirtualPath
+
+## Opens a member of a zip archive
+#  @param archiveSrc - opened zipfile.ZipFile
+#  @param memberNameSrc - name of the member
+#  @param virtualPathSrc - virtual path of the member, used for the messages
+#  @return tuple (stream, function which returns the compressed size)
+def openZipMember(archiveSrc:zipfile.ZipFile, memberNameSrc:str, virtualPathSrc:str) -> tuple:
+    info = archiveSrc.getinfo(memberNameSrc)
+    _checkZipMember(info, virtualPathSrc)
+    inputSize = lambda: info.compress_size
+    return (_GuardedReader(archiveSrc.open(info), virtualPathSrc, inputSize), inputSize)
+# end def openZipMember
+
+## Returns all data streams of a file or stream
+#  - archives are opened as streams, nothing is extracted to the disk or read into the memory
+#  - nested archives are opened until ARCHIVE_MAX_DEPTH, deeper archives are returned as raw data
+#  - an archive which can not be opened is returned as raw data
+#  - every stream has to be read completely before the next stream is requested
+#  @param fileObjSrc - file object, only zip archives need a seekable file object
+#  @param pathSrc - (virtual) path of the data
+#  @param depthSrc - count of the archive layers above the data
+#  @param inputSizeSrc - function which returns the count of compressed bytes read from the disk,
+#                        it is used for the decompression ratio of all nested layers
+#  @return generator of tuples (virtual path, stream)
+def iterSources(fileObjSrc, pathSrc:str, depthSrc:int=0, inputSizeSrc=None):
+    header, fileObj = _peekHeader(fileObjSrc)
+    archiveFormat   = getArchiveFormat(header)
+
+    if archiveFormat is None:
+        yield (pathSrc, _TolerantReader(fileObj, pathSrc))
+        return
+    if depthSrc >= ARCHIVE_MAX_DEPTH:
+        LOG.info("[!] Archive %s is nested too deep, the raw data is searched" %(pathSrc))
+        yield (pathSrc, _TolerantReader(fileObj, pathSrc))
+        return
+
+    if archiveFormat == ARCHIVE_ZIP:
+        if not _isSeekable(fileObj):
+            LOG.info("[!] Zip archive %s can not be read as stream, the raw data is searched" %(pathSrc))
+            yield (pathSrc, _TolerantReader(fileObj, pathSrc))
+            return
+        try:
+            archive = zipfile.ZipFile(fileObj)
+        except (zipfile.BadZipFile, ValueError, OSError) as e:
+            LOG.debug("Can not open %s: %s" %(pathSrc, repr(e)))
+            fileObj.seek(0)
+            yield (pathSrc, _TolerantReader(fileObj, pathSrc))
+            return
+        with archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                virtualPath = pathSrc + ARCHIVE_SEPARATOR + info.filename
+                try:
+                    stream, inputSize = openZipMember(archive, info.filename, virtualPath)
+                except (CrawlerArchiveError, RuntimeError, NotImplementedError, zipfile.BadZipFile) as e:
+                    LOG.info("[!] Skipping %s: %s" %(virtualPath, getattr(e, 'msg', repr(e))))
+                    continue
+                with stream:
+                    yield from iterSources(stream, virtualPath, depthSrc + 1, inputSizeSrc or inputSize)
+        return
+    # end zip
+
+    if archiveFormat == ARCHIVE_TAR:
+        try:
+            archive = tarfile.open(fileobj=fileObj, mode='r|')
+            for member in archive:
+                if not member.isreg():
+                    continue
+                virtualPath = pathSrc + ARCHIVE_SEPARATOR + member.name.lstrip('/')
+                yield from iterSources(archive.extractfile(member), virtualPath, depthSrc + 1, inputSizeSrc)
+        except tarfile.TarError as e:
+            raise CrawlerArchiveError("%s: %s" %(pathSrc, repr(e)))
+        return
+    # end tar
+
+    # compressed streams
+    counter   = _CountingReader(fileObj)
+    inputSize = inputSizeSrc or counter.getCount
+    if archiveFormat == ARCHIVE_GZIP:
+        stream = gzip.GzipFile(fileobj=counter, mode='rb')
+    elif archiveFormat == ARCHIVE_BZ2:
+        stream = bz2.BZ2File(counter, mode='rb')
+    else:
+        stream = lzma.LZMAFile(counter, mode='rb')
+    # the decompressed stream can not be seeked back, the compressed input is not seekable
+    stream = _GuardedReader(stream, pathSrc, inputSize, False)
+
+    # a compressed tar archive is one layer, e.g. archive.tar.gz!/var/log/x
+    header, stream = _peekHeader(stream)
+    if getArchiveFormat(header) == ARCHIVE_TAR:
+        yield from iterSources(stream, pathSrc, depthSrc, inputSize)
+    else:
+        yield from iterSources(stream, pathSrc + ARCHIVE_SEPARATOR + _getDecompressedName(pathSrc), depthSrc + 1, inputSize)
+# end def iterSources
+
+## Returns the name of the decompressed data of a compressed file
+def _getDecompressedName(pathSrc:str) -> str:
+    name = os.path.basename(pathSrc.rstrip('/'))
+    root, ext = os.path.splitext(name)
+    if ext.lower() in COMPRESSED_SUFFIXES:
+        return root + COMPRESSED_SUFFIXES[ext.lower()]
+    return name
+# end def _getDecompressedName
+
+## Checks the header of a zip member before it is opened
+def _checkZipMember(infoSrc:zipfile.ZipInfo, virtualPathSrc:str) -> None:
+    if infoSrc.flag_bits & 0x1:
+        raise CrawlerArchiveError("%s is encrypted" %(virtualPathSrc))
+    if infoSrc.file_size > ARCHIVE_RATIO_MIN_SIZE and infoSrc.file_size > ARCHIVE_MAX_RATIO * max(1, infoSrc.compress_size):
+        raise CrawlerArchiveError("Decompression ratio of %s is above %d" %(virtualPathSrc, ARCHIVE_MAX_RATIO))
+# end def _checkZipMember
+
+## Returns True if a file object supports seek()
+def _isSeekable(fileObjSrc) -> bool:
+    try:
+        return fileObjSrc.seekable()
+    except (AttributeError, OSError, ValueError):
+        return False
+# end def _isSeekable
+
+## Reads the header of a file object without loosing the data
+#  @return tuple (header, file object which returns the data from the begin)
+def _peekHeader(fileObjSrc) -> tuple:
+    if _isSeekable(fileObjSrc):
+        pos = fileObjSrc.tell()
+        header = fileObjSrc.read(ARCHIVE_HEADER_SIZE)
+        fileObjSrc.seek(pos)
+        return (header, fileObjSrc)
+
+    parts  = []
+    length = 0
+    while length < ARCHIVE_HEADER_SIZE:
+        data = fileObjSrc.read(ARCHIVE_HEADER_SIZE - length)
+        if not data:
+            break
+        parts.append(data)
+        length += len(data)
+    header = b''.join(parts)
+    return (header, _ChainReader(header, fileObjSrc))
+# end def _peekHeader
+
+## --------------------------------------------------------------------------------------------------------------------
+## Stream which returns the read header and then the rest of the stream
+class _ChainReader:
+
+    def __init__(self, headerSrc:bytes, fileObjSrc) -> None:
+        self.header  = headerSrc
+        self.fileObj = fileObjSrc
+
+    def read(self, sizeSrc:int=-1) -> bytes:
+        if not self.header:
+            return self.fileObj.read(sizeSrc)
+        if sizeSrc is None or sizeSrc < 0:
+            data, self.header = self.header + self.fileObj.read(), b''
+            return data
+        data, self.header = self.header[:sizeSrc], self.header[sizeSrc:]
+        return data
+
+    def close(self) -> None:
+        pass
+
+# end class _ChainReader
+
+## Stream which ends at the first read error
+#  - truncated or corrupt archives are common on images, the data until the error is searched
+class _TolerantReader:
+
+    def __init__(self, fileObjSrc, pathSrc:str) -> None:
+        self.fileObj = fileObjSrc
+        self.path    = pathSrc
+        self.failed  = False
+
+    def read(self, sizeSrc:int=-1) -> bytes:
+        if self.failed:
+            return b''
+        try:
+            return self.fileObj.read(sizeSrc)
+        except CrawlerArchiveError as ae:
+            LOG.info(ae.msg)
+        except Exception as e:
+            LOG.info("[!] Error while reading archive %s: %s" %(self.path, repr(e)))
+        self.failed = True
+        return b''
+
+    def close(self) -> None:
+        pass
+
+# end class _TolerantReader
+
+## Stream which counts the read bytes
+class _CountingReader:
+
+    def __init__(self, fileObjSrc) -> None:
+        self.fileObj = fileObjSrc
+        self.count   = 0
+
+    def read(self, sizeSrc:int=-1) -> bytes:
+        data = self.fileObj.read(sizeSrc)
+        self.count += len(data)
+        return data
+
+    def getCount(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        pass
+
+# end class _CountingReader
+
+## Stream which stops the decompression if the decompression ratio is too high
+class _GuardedReader:
+
+    ## constructor
+    #  @param inputSizeSrc - function which returns the count of compressed bytes
+    #  @param seekableSrc - False for the decompressed streams of gzip, bz2 and xz. They report to be seekable, but
+    #                       seeking back rewinds the compressed input, which is read as stream.
+    def __init__(self, streamSrc, pathSrc:str, inputSizeSrc, seekableSrc:bool=True) -> None:
+        self.stream    = streamSrc
+        self.path      = pathSrc
+        self.inputSize = inputSizeSrc
+        self.count     = 0
+        self.canSeek   = seekableSrc
+
+    def read(self, sizeSrc:int=-1) -> bytes:
+        data = self.stream.read(sizeSrc)
+        self.count += len(data)
+        if self.count > ARCHIVE_RATIO_MIN_SIZE and self.count > ARCHIVE_MAX_RATIO * max(1, self.inputSize()):
+            raise CrawlerArchiveError("Decompression ratio of %s is above %d" %(self.path, ARCHIVE_MAX_RATIO))
+        return data
+
+    ## nested zip archives need a seekable stream, the seeking is done by the decompressed stream
+    def seekable(self) -> bool:
+        return self.canSeek and _isSeekable(self.stream)
+
+    def seek(self, offsetSrc:int, whenceSrc:int=0) -> int:
+        return self.stream.seek(offsetSrc, whenceSrc)
+
+    def tell(self) -> int:
+        return self.stream.tell()
+
+    def close(self) -> None:
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> None:
+        self.close()
+
+# end class _GuardedReader
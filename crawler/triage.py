@@ -0,0 +1,286 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import bisect          # for the positions of the printable runs
+import heapq           # for merging the printable runs
+import logging         # for log
+import math            # for the entropy
+import os              # for reading the samples
+import re              # for the printable runs
+import stat            # for file types
+import threading       # for the walker threads
+
+from .crawlererr     import CrawlerConfigError
+
+## --------------------------------------------------------------------------------------------------------------------
+
+LOG = logging.getLogger('IocCrawlerLog')
+
+# size of the samples at the begin and in the middle of a file
+TRIAGE_SAMPLE_SIZE   = 4096
+
+# share of printable bytes (bytes above 0x7f included) of text files, text files have no zero bytes
+TRIAGE_TEXT_RATIO    = 0.95
+
+# entropy (bits per byte) of encrypted and compressed data
+TRIAGE_RANDOM_BITS   = 7.5
+
+# content classes
+TRIAGE_TEXT          = "text"       # text, logs, source code
+TRIAGE_DOCUMENT      = "document"   # pdf and ole documents
+TRIAGE_EXECUTABLE    = "executable" # pe, elf, mach-o, java and dex files
+TRIAGE_ARCHIVE       = "archive"    # compressed files and archives
+TRIAGE_MEDIA         = "media"      # images, audio and video
+TRIAGE_DISK          = "disk"       # virtual disks and forensic images
+TRIAGE_RANDOM        = "random"     # encrypted or compressed data without known header
+TRIAGE_SPARSE        = "sparse"     # zero filled data, e.g. unused space of disk images
+TRIAGE_BINARY        = "binary"     # other binary data
+TRIAGE_CLASSES       = (TRIAGE_TEXT, TRIAGE_DOCUMENT, TRIAGE_EXECUTABLE, TRIAGE_ARCHIVE, TRIAGE_MEDIA, TRIAGE_DISK,
+                        TRIAGE_RANDOM, TRIAGE_SPARSE, TRIAGE_BINARY)
+
+# actions of the policy
+TRIAGE_SCAN          = "scan"       # search the whole data
+TRIAGE_STRINGS       = "strings"    # search only the printable runs, see CrawlerPrintableRuns
+TRIAGE_SKIP          = "skip"       # do not search the file
+TRIAGE_LAST          = "last"       # search the whole data after all other files
+TRIAGE_ACTIONS       = (TRIAGE_SCAN, TRIAGE_STRINGS, TRIAGE_SKIP, TRIAGE_LAST)
+
+# default policy, every file is searched, but the binary data only in the printable runs
+TRIAGE_DEFAULT_POLICY = {TRIAGE_TEXT       : TRIAGE_SCAN,
+                         TRIAGE_DOCUMENT   : TRIAGE_SCAN,
+                         TRIAGE_EXECUTABLE : TRIAGE_STRINGS,
+                         TRIAGE_ARCHIVE    : TRIAGE_STRINGS,
+                         TRIAGE_MEDIA      : TRIAGE_LAST,
+                         TRIAGE_DISK       : TRIAGE_STRINGS,
+                         TRIAGE_RANDOM     : TRIAGE_LAST,
+                         TRIAGE_SPARSE     : TRIAGE_STRINGS,
+                         TRIAGE_BINARY     : TRIAGE_STRINGS}
+
+# known file headers, list of tuples (offset, magic bytes, content class)
+TRIAGE_MAGICS = [(0,    b"%PDF-",                              TRIAGE_DOCUMENT),
+                 (0,    b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",   TRIAGE_DOCUMENT),
+                 (0,    b"MZ",                                 TRIAGE_EXECUTABLE),
+                 (0,    b"\x7fELF",                            TRIAGE_EXECUTABLE),
+                 (0,    b"\xfe\xed\xfa\xce",                   TRIAGE_EXECUTABLE),
+                 (0,    b"\xfe\xed\xfa\xcf",                   TRIAGE_EXECUTABLE),
+                 (0,    b"\xce\xfa\xed\xfe",                   TRIAGE_EXECUTABLE),
+                 (0,    b"\xcf\xfa\xed\xfe",                   TRIAGE_EXECUTABLE),
+                 (0,    b"\xca\xfe\xba\xbe",                   TRIAGE_EXECUTABLE),
+                 (0,    b"dex\n",                              TRIAGE_EXECUTABLE),
+                 (0,    b"PK\x03\x04",                         TRIAGE_ARCHIVE),
+                 (0,    b"PK\x05\x06",                         TRIAGE_ARCHIVE),
+                 (0,    b"\x1f\x8b",                           TRIAGE_ARCHIVE),
+                 (0,    b"BZh",                                TRIAGE_ARCHIVE),
+                 (0,    b"\xfd7zXZ\x00",                       TRIAGE_ARCHIVE),
+                 (0,    b"7z\xbc\xaf\x27\x1c",                 TRIAGE_ARCHIVE),
+                 (0,    b"Rar!\x1a\x07",                       TRIAGE_ARCHIVE),
+                 (0,    b"\x28\xb5\x2f\xfd",                   TRIAGE_ARCHIVE),
+                 (0,    b"MSCF",                               TRIAGE_ARCHIVE),
+                 (0,    b"\xff\xd8\xff",                       TRIAGE_MEDIA),
+                 (0,    b"\x89PNG\r\n\x1a\n",                  TRIAGE_MEDIA),
+                 (0,    b"GIF8",                               TRIAGE_MEDIA),
+                 (0,    b"RIFF",                               TRIAGE_MEDIA),
+                 (0,    b"ID3",                                TRIAGE_MEDIA),
+                 (0,    b"OggS",                               TRIAGE_MEDIA),
+                 (0,    b"fLaC",                               TRIAGE_MEDIA),
+                 (0,    b"\x1a\x45\xdf\xa3",                   TRIAGE_MEDIA),
+                 (0,    b"\x00\x00\x01\xba",                   TRIAGE_MEDIA),
+                 (4,    b"ftyp",                               TRIAGE_MEDIA),
+                 (0,    b"QFI\xfb",                            TRIAGE_DISK),
+                 (0,    b"KDMV",                               TRIAGE_DISK),
+                 (0,    b"vhdxfile",                           TRIAGE_DISK),
+                 (0,    b"conectix",                           TRIAGE_DISK),
+                 (0,    b"EVF\x09\x0d\x0a\xff\x00",            TRIAGE_DISK),
+                 (0x40, b"\x7f\x10\xda\xbe",                   TRIAGE_DISK)]
+
+# printable bytes of the printable runs, text files can have also bytes above 0x7f (utf-8)
+PRINTABLE_BYTES      = bytes(range(0x20, 0x7f)) + b"\t\n\r"
+TEXT_BYTES           = PRINTABLE_BYTES + bytes(range(0x80, 0x100))
+
+# min length of a printable run, the runs are separated by a zero byte
+PRINTABLE_MIN_SIZE   = 4
+PRINTABLE_SEPARATOR  = b"\x00"
+PRINTABLE_PATTERN    = re.compile(rb"[\t\n\r\x20-\x7e]{%d,}" %(PRINTABLE_MIN_SIZE))
+PRINTABLE_WIDE       = re.compile(rb"(?:[\t\n\r\x20-\x7e]\x00){%d,}" %(PRINTABLE_MIN_SIZE))
+
+## --------------------------------------------------------------------------------------------------------------------
+## Content triage
+#  The walker threads read two small samples of every file (the begin and the middle) and classify the content by
+#  the file header, the share of printable bytes and the entropy. The policy selects the processing of a content
+#  class: search the whole data, search only the printable runs, skip the file or search it after all other files
+#  (see Crawler._addSource). Files which can not be read and no regular files are not classified, they are searched.
+class CrawlerTriage:
+
+    ## constructor
+    #  @param policySrc - dict [KEY - content class] : VALUE - action, see parseTriagePolicy
+    def __init__(self, policySrc:dict) -> None:
+        self.policy  = dict(TRIAGE_DEFAULT_POLICY, **policySrc)
+        self.classes = {} # [KEY - content class] : VALUE - list [count of files, count of bytes]
+        self.lock    = threading.Lock()
+    # end init
+
+    ## Classifies a file and returns the action of the policy
+    #  - is called from the walker threads
+    #  @param countSrc - count the file in the summary of the classes
+    #  @return action, see TRIAGE_ACTIONS
+    def getAction(self, filePathSrc:str, fileSizeSrc:int, countSrc:bool=True) -> str:
+        contentClass = self._classifyFile(filePathSrc, fileSizeSrc)
+        if contentClass is None:
+            return TRIAGE_SCAN
+        if countSrc:
+            with self.lock:
+                counters = self.classes.setdefault(contentClass, [0, 0])
+                counters[0] += 1
+                counters[1] += fileSizeSrc
+        LOG.debug("%s classified as %s" %(filePathSrc, contentClass))
+        return self.policy[contentClass]
+    # end def getAction
+
+    ## Returns the count of skipped files and bytes
+    #  @return tuple (count of files, count of bytes)
+    def getSkipped(self) -> tuple:
+        skipped = [self.classes.get(contentClass, [0, 0]) for contentClass, action in self.policy.items()
+                   if action == TRIAGE_SKIP]
+        return sum(x[0] for x in skipped), sum(x[1] for x in skipped)
+    # end def getSkipped
+
+    ## Returns the summary of the classified files
+    #  @return list of tuples (content class, count of files, count of bytes, action) in the order of TRIAGE_CLASSES
+    def getSummary(self) -> list:
+        return [(contentClass, self.classes[contentClass][0], self.classes[contentClass][1], self.policy[contentClass])
+                for contentClass in TRIAGE_CLASSES if contentClass in self.classes]
+    # end def getSummary
+
+    ## Reads the samples of a file and returns the content class
+    #  - the file is opened non blocking, so pipes found by the listing do not block the walker thread
+    #  @return content class, None if the file is empty, no regular file or can not be read
+    def _classifyFile(self, filePathSrc:str, fileSizeSrc:int):
+        if fileSizeSrc == 0:
+            return None
+        try:
+            fd = os.open(filePathSrc, os.O_RDONLY | os.O_NONBLOCK)
+        except OSError as e:
+            LOG.debug("%s not classified: %s" %(filePathSrc, repr(e)))
+            return None
+        try:
+            if not stat.S_ISREG(os.fstat(fd).st_mode):
+                return None
+            header = os.pread(fd, TRIAGE_SAMPLE_SIZE, 0)
+            middle = b''
+            if fileSizeSrc > 2 * TRIAGE_SAMPLE_SIZE:
+                middle = os.pread(fd, TRIAGE_SAMPLE_SIZE, fileSizeSrc // 2 - fileSizeSrc // 2 % TRIAGE_SAMPLE_SIZE)
+        except OSError as e:
+            LOG.debug("%s not classified: %s" %(filePathSrc, repr(e)))
+            return None
+        finally:
+            os.close(fd)
+        return getContentClass(header, middle)
+    # end def _classifyFile
+
+# end class CrawlerTriage
+
+## Returns the content class of the samples of a file
+#  - the header selects the class of known formats, the other files are classified by the samples:
+#    zero filled - sparse, printable without zero bytes - text, high entropy - random, otherwise binary
+#  @param headerSrc - sample at the begin of the file
+#  @param middleSrc - sample in the middle of the file, empty for small files
+#  @return content class, see TRIAGE_CLASSES
+def getContentClass(headerSrc:bytes, middleSrc:bytes=b'') -> str:
+    for offset, magic, contentClass in TRIAGE_MAGICS:
+        if headerSrc.startswith(magic, offset):
+            return contentClass
+
+    sample = headerSrc + middleSrc
+    if not sample:
+        return TRIAGE_TEXT
+    if sample.count(0) == len(sample):
+        return TRIAGE_SPARSE
+    if 0 not in sample:
+        printable = len(sample) - len(sample.translate(None, TEXT_BYTES))
+        if printable >= len(sample) * TRIAGE_TEXT_RATIO:
+            return TRIAGE_TEXT
+    if _getEntropy(sample) >= TRIAGE_RANDOM_BITS:
+        return TRIAGE_RANDOM
+    return TRIAGE_BINARY
+# end def getContentClass
+
+## Returns the entropy of data in bits per byte
+def _getEntropy(dataSrc:bytes) -> float:
+    size = len(dataSrc)
+    return -sum(count / size * math.log2(count / size) for count in map(dataSrc.count, range(256)) if count)
+# end def _getEntropy
+
+## Parses the rules of a triage policy
+#  @param rulesSrc - list of strings "class=action", e.g. ["media=skip", "binary=scan"]
+#  @return dict [KEY - content class] : VALUE - action
+def parseTriagePolicy(rulesSrc:list) -> dict:
+    policy = {}
+    for rule in rulesSrc:
+        contentClass, separator, action = rule.lower().partition("=")
+        if not separator or contentClass.strip() not in TRIAGE_CLASSES or action.strip() not in TRIAGE_ACTIONS:
+            raise CrawlerConfigError("Invalid triage rule %s, use class=action with the classes %s and the actions %s"
+                                     %(rule, ", ".join(TRIAGE_CLASSES), ", ".join(TRIAGE_ACTIONS)))
+        policy[contentClass.strip()] = action.strip()
+    return policy
+# end def parseTriagePolicy
+
+## --------------------------------------------------------------------------------------------------------------------
+## Printable runs of a buffer
+#  The runs of printable characters (like strings) are joined with a zero byte, so the scan engine searches only the
+#  joined runs instead of the whole buffer. The positions in the joined runs are mapped to the positions in the
+#  buffer, so the offsets and the context of the matches are the same as in a search of the whole buffer.
+#  - with wide strings also the runs of UTF-16LE characters are joined, overlapping runs are merged (the last
+#    character of a printable run can be the first character of a wide string)
+#  - a match over the separator of two runs is no match in the buffer, see getMatchPositions
+class CrawlerPrintableRuns:
+
+    ## constructor
+    #  @param bufferSrc - bytes like object (bytes or mmap)
+    #  @param startSrc, endSrc - range of the buffer
+    #  @param wideSrc - join also the wide string runs
+    def __init__(self, bufferSrc, startSrc:int, endSrc:int, wideSrc:bool=False) -> None:
+        self.starts = [] # start of every run in the buffer
+        self.ends   = [] # end of every run in the buffer
+        self.joined = [] # start of every run in the joined runs
+
+        runs = PRINTABLE_PATTERN.finditer(bufferSrc, startSrc, endSrc)
+        if wideSrc:
+            runs = heapq.merge(runs, PRINTABLE_WIDE.finditer(bufferSrc, startSrc, endSrc), key=lambda item: item.start())
+        for item in runs:
+            start, end = item.span()
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+        position = 0
+        for start, end in zip(self.starts, self.ends):
+            self.joined.append(position)
+            position += end - start + len(PRINTABLE_SEPARATOR)
+        self.data = PRINTABLE_SEPARATOR.join([bufferSrc[start:end] for start, end in zip(self.starts, self.ends)])
+    # end init
+
+    ## Returns the position in the joined runs of a position in the buffer
+    #  - a position between two runs is mapped to the begin of the next run
+    def getPosition(self, bufferPosSrc:int) -> int:
+        index = bisect.bisect_right(self.ends, bufferPosSrc)
+        if index >= len(self.starts):
+            return len(self.data)
+        return self.joined[index] + max(0, bufferPosSrc - self.starts[index])
+    # end def getPosition
+
+    ## Returns the positions of a match in the buffer
+    #  @param startSrc, endSrc - positions of the match in the joined runs
+    #  @return tuple (start, end), None if the match is not in one run
+    def getMatchPositions(self, startSrc:int, endSrc:int):
+        index = bisect.bisect_right(self.joined, startSrc) - 1
+        start = self.starts[index] + startSrc - self.joined[index]
+        end   = self.starts[index] + endSrc - self.joined[index]
+        if start >= self.ends[index] or end > self.ends[index]:
+            return None
+        return start, end
+    # end def getMatchPositions
+
+# end class CrawlerPrintableRuns
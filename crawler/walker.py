@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import logging         # for log
+import os              # for scandir
+import queue           # for the directory queue
+import threading       # for the walker threads
+
+## --------------------------------------------------------------------------------------------------------------------
+
+LOG = logging.getLogger('IocCrawlerLog')
+
+## --------------------------------------------------------------------------------------------------------------------
+## Parallel directory walker
+#  The walker lists the directories with several threads, so the latency of network shares is hidden. Every found
+#  file is passed to a callback as soon as it is found, so the processing can start before the listing is finished.
+#  - the size and the id (device, inode) of a file are taken from the directory entry
+#  - whitelisted directories are not listed, the whole subtree is skipped
+#  - symbolic links to directories are not followed (like os.walk)
+#  - unreadable directories are skipped (like os.walk)
+class CrawlerWalker:
+
+    ## constructor
+    #  @param threadCountSrc - count of the walker threads
+    #  @param isWhitelistedDirSrc - function(path) -> bool, True if the directory and its subtree is whitelisted
+    #  @param isWhitelistedFileSrc - function(path) -> bool, True if the file is whitelisted
+    def __init__(self, threadCountSrc:int, isWhitelistedDirSrc=None, isWhitelistedFileSrc=None) -> None:
+        self.threadCount       = max(1, threadCountSrc)
+        self.isWhitelistedDir  = isWhitelistedDirSrc
+        self.isWhitelistedFile = isWhitelistedFileSrc
+        self.whitelistedDirs   = 0
+        self.whitelistedFiles  = 0
+        self.lock              = threading.Lock()
+
+    ## Walks through the directory tree
+    #  - returns when all directories are listed
+    #  @param rootPathSrc - root directory
+    #  @param onFileSrc - function(path, size, (device, inode)), is called from the walker threads for every file
+    def walk(self, rootPathSrc:str, onFileSrc) -> None:
+        dirQueue = queue.Queue()
+
+        ## List directories from the queue until the sentinel is found
+        def _walkQueue():
+            while True:
+                dirPath = dirQueue.get()
+                if dirPath is None:
+                    break
+                try:
+                    self._scanDir(dirPath, dirQueue, onFileSrc)
+                except Exception as e:
+                    LOG.info("[!] Error while listing %s: %s" %(dirPath, getattr(e, 'message', repr(e))))
+                finally:
+                    dirQueue.task_done()
+        # end _walkQueue
+
+        dirQueue.put(rootPathSrc)
+        threads = [threading.Thread(target=_walkQueue, daemon=True) for x in range(self.threadCount)]
+        for thread in threads:
+            thread.start()
+
+        # wait until every directory is listed, then stop the threads
+        dirQueue.join()
+        for thread in threads:
+            dirQueue.put(None)
+        for thread in threads:
+            thread.join()
+    # end def walk
+
+    ## Lists a directory
+    #  - sub directories are added to the queue
+    def _scanDir(self, dirPathSrc:str, dirQueueSrc, onFileSrc) -> None:
+        try:
+            entries = os.scandir(dirPathSrc)
+        except OSError as e:
+            LOG.debug("Can not list %s: %s" %(dirPathSrc, repr(e)))
+            return
+
+        with entries:
+            for entry in entries:
+                try:
+                    isDir = entry.is_dir()
+                except OSError:
+                    isDir = False
+
+                if isDir:
+                    if entry.is_symlink():
+                        continue
+                    if self.isWhitelistedDir and self.isWhitelistedDir(entry.path):
+                        LOG.debug("%s whitelisted." %(entry.path))
+                        with self.lock:
+                            self.whitelistedDirs += 1
+                        continue
+                    dirQueueSrc.put(entry.path)
+                else:
+                    if self.isWhitelistedFile and self.isWhitelistedFile(entry.path):
+                        LOG.debug("%s whitelisted." %(entry.path))
+                        with self.lock:
+                            self.whitelistedFiles += 1
+                        continue
+                    try:
+                        fileStat = entry.stat()
+                        size     = fileStat.st_size
+                        fileId   = (fileStat.st_dev, fileStat.st_ino)
+                    except OSError:
+                        # broken links etc., the error is reported while processing
+                        size   = 0
+                        fileId = None
+                    onFileSrc(entry.path, size, fileId)
+            # end for
+    # end def _scanDir
+
+# end class CrawlerWalker
@@ -0,0 +1,761 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import logging         # for log
+import mmap            # for memory mapped file reading
+import multiprocessing # for the name of the worker process
+import os              # for file handling
+import signal          # for the watchdog of the pattern search
+import stat            # for file types
+import timeit          # for the metrics
+import zipfile         # for the members of zip archives
+
+from configparser    import ConfigParser, ExtendedInterpolation # for loading config files
+from .crawlererr     import CrawlerConfigError, CrawlerError, CrawlerProcessError, CrawlerMatchError, CrawlerPatternTimeout # ioc crawler error handling
+from .crawlerdata    import CrawlerVo, CrawlerUniqueData, CrawlerWhitelistData, escapeContext # data objects
+from .scanengine     import CrawlerScanEngine # pattern search
+from .patternset     import getPatternSet # compiled patterns
+from .cache          import CrawlerResultCache, getPatternFingerprint # result cache
+from .metrics        import CrawlerWorkerMetrics # processing metrics
+from .sources        import getArchiveFormat, iterSources, openZipMember, splitVirtualPath, ARCHIVE_HEADER_SIZE, ARCHIVE_SEPARATOR # archives
+from .triage         import CrawlerPrintableRuns # search of the printable runs
+
+## --------------------------------------------------------------------------------------------------------------------
+
+LOG = logging.getLogger('IocCrawlerLog')
+
+# file reading
+READ_BUFFER_SIZE   = 32384            # read buffer
+READ_OVERLAP_SIZE  = 1024             # overlap reading size
+MMAP_MIN_SIZE      = 1024 * 1024      # files above this size are searched in a memory mapping
+PROGRESS_LOG_SIZE  = 256 * 1024 * 1024 # the reading position of large streams is logged after this size
+CONTEXT_MAX_SIZE   = READ_OVERLAP_SIZE # max count of bytes before or after a match
+
+# result streaming
+RESULT_BATCH_SIZE  = 10000            # max count of matches in a result object before it is send to the writer
+UNIQUE_BATCH_SIZE  = 100000           # max count of distinct matches in a unique aggregate before it is send
+
+# stdout output
+OUTPUT_BATCH_SIZE  = 256 * 1024       # size of the formatted output lines before they are send to the writer
+MATCH_HIGHLIGHT    = ("\x1b[0;30;41m", "\x1b[0m") # terminal colors of a highlighted match
+
+# watchdog of the pattern search
+PATTERN_TIMEOUT    = 2.0              # default time budget of a pattern pass in seconds per MB of searched data
+PATTERN_BUDGET_MIN = 1024 * 1024      # smaller passes get the budget of this size
+WATCHDOG_INTERVAL  = 0.5              # seconds between two checks of the watchdog
+
+## --------------------------------------------------------------------------------------------------------------------
+## Loads pattern from config or personal file
+#  - patterns will only loaded if they are selected from user
+#  - the pattern file is parsed once per process and cached, see CrawlerPatternSet
+#  @param patternFileSrc - all search pattern
+#  @param sectionsSrc - list of the selected ioc types (lower case)
+#  @return - a patterns dict
+def loadPatterns(patternFileSrc:str, sectionsSrc:list) -> dict:
+    try:
+        LOG.debug('Load patterns')
+        return getPatternSet(patternFileSrc).getPatterns(sectionsSrc)
+    except CrawlerConfigError as ce:
+        raise ce
+    except Exception as e:
+        raise CrawlerConfigError(getattr(e, 'message', repr(e)))
+# end def loadPatterns
+
+## Loads whitelist from config or personal file
+#  @param whitelistFileSrc
+#  @return - a whitelist object
+def loadWhitelist(whitelistFileSrc:str) -> CrawlerWhitelistData:
+    try:
+        LOG.debug('Load whitelist')
+        whitelistCfg = ConfigParser(interpolation=ExtendedInterpolation())
+        whitelistCfg.read(whitelistFileSrc)
+
+        whitelistObj = CrawlerWhitelistData()
+        for wh_section in whitelistCfg.sections():
+            for option in whitelistCfg.options(wh_section):
+                whitelistObj.addWhiteListItem(wh_section, option, whitelistCfg[wh_section][option].strip().split('\n'))
+            # end for
+        # end for
+        whitelistObj.compile()
+        return whitelistObj
+    except CrawlerConfigError as ce:
+        raise ce
+    except Exception as e:
+        raise CrawlerConfigError(getattr(e, 'message', repr(e)))
+# end def loadWhitelist
+
+## Formats a result line for stdout
+#  @param printDictSrc - dict with the values of the columns (strings)
+#  @param columnsSrc - list of the printed columns
+#  @param highlightSrc - highlight the match with terminal colors
+#  @return line with new line character
+def formatOutputLine(printDictSrc:dict, columnsSrc:list, highlightSrc:bool) -> str:
+    if highlightSrc:
+        return " ".join(MATCH_HIGHLIGHT[0] + printDictSrc[item] + MATCH_HIGHLIGHT[1] if item == "match" else printDictSrc[item]
+                        for item in columnsSrc) + "\n"
+    return " ".join([printDictSrc[item] for item in columnsSrc]) + "\n"
+# end def formatOutputLine
+
+## --------------------------------------------------------------------------------------------------------------------
+## Settings of the worker processes
+#  The settings are passed to the worker processes instead of the crawler object, so only file names and flags are
+#  pickled. Every worker loads the pattern and the whitelist itself, see CrawlerWorker.
+class CrawlerWorkerConfig:
+
+    ## constructor
+    def __init__(self, patternFileSrc:str, sectionsSrc:list, matchSizeSrc:int, whitelistFileSrc:str=None,
+                 printToStdoutSrc:bool=False, resultColumnFormatSrc:list=None, matchHighlightingSrc:bool=False,
+                 beforeSrc:int=0, afterSrc:int=0, cacheFileSrc:str=None, archivesSrc:bool=False,
+                 metricsSrc:bool=False, profileDirSrc:str=None, uniqueSrc:bool=False,
+                 orderedOutputSrc:bool=False, wideSrc:bool=False, patternTimeoutSrc:float=PATTERN_TIMEOUT) -> None:
+        self.patternFile       = patternFileSrc
+        self.sections          = list(sectionsSrc)
+        self.matchSize         = matchSizeSrc
+        self.whitelistFile     = whitelistFileSrc
+        self.printToStdOut     = printToStdoutSrc
+        self.resultColumns     = list(resultColumnFormatSrc or [])
+        self.matchHighlighting = matchHighlightingSrc
+        self.before            = beforeSrc
+        self.after             = afterSrc
+        self.cacheFile         = cacheFileSrc
+        self.archives          = archivesSrc
+        self.metrics           = metricsSrc
+        self.profileDir        = profileDirSrc
+        self.unique            = uniqueSrc
+        self.orderedOutput     = orderedOutputSrc
+        self.wide              = wideSrc
+        self.patternTimeout    = patternTimeoutSrc
+
+    ## Returns the key of the settings
+    #  - workers with the same key can be reused, the modification time of the pattern and whitelist file is part
+    #    of the key, so a changed file is loaded again
+    def getKey(self) -> tuple:
+        mtimes = []
+        for fileName in (self.patternFile, self.whitelistFile):
+            try:
+                mtimes.append(os.stat(fileName).st_mtime_ns if fileName else 0)
+            except OSError:
+                mtimes.append(0)
+        return (self.patternFile, tuple(self.sections), self.matchSize, self.whitelistFile, self.printToStdOut,
+                tuple(self.resultColumns), self.matchHighlighting, self.before, self.after, self.cacheFile,
+                self.archives, self.metrics, self.profileDir, self.unique, self.orderedOutput,
+                self.wide, self.patternTimeout, tuple(mtimes))
+    # end def getKey
+
+# end class CrawlerWorkerConfig
+
+## --------------------------------------------------------------------------------------------------------------------
+## Scan context of a worker process
+#  The worker is created once per process, so the pattern are compiled and the whitelist is loaded only once. The
+#  worker processes blocks of file ranges and sends the messages to the result queue:
+#  - ("result", scanId, blockId, CrawlerVo) - results of a file, large results are send in several messages
+#  - ("done", scanId, blockId, stats) - the block is processed, stats is a dict with the counters of the block (a
+#    failed block has the key failed, see _workerMain)
+#  - ("metrics", scanId, blockId, metrics) - with enabled metrics, the metrics of a long block since the last message
+#  - ("unique", scanId, blockId, CrawlerUniqueData) - in unique mode the aggregated results of the files are send
+#    instead of the result objects
+#  - ("output", scanId, blockId, bytes) - in stdout mode the formatted result lines, they are written by the result
+#    writer. With ordered output, the lines of a file (or a range of a large file) are sorted by offset and send in
+#    one message, so they are not mixed with the lines of other files.
+#
+#  A watchdog stops runaway patterns: while a block is processed, a timer signal checks the current pattern pass
+#  periodically. A pass which needs more than the pattern timeout (seconds per MB of searched data) is stopped, the
+#  pattern is skipped for the rest of the file and the pattern/file pair is reported in the stats of the block
+#  (patternTimeouts). The regex engine checks for signals while searching, so also a single match attempt with
+#  catastrophic backtracking is stopped.
+class CrawlerWorker:
+
+    ## constructor
+    #  @param configSrc - CrawlerWorkerConfig
+    #  @param resultQueueSrc - queue for the messages
+    def __init__(self, configSrc:CrawlerWorkerConfig, resultQueueSrc) -> None:
+        self.resultQueue       = resultQueueSrc
+        self.printToStdOut     = configSrc.printToStdOut
+        self.result_columns    = configSrc.resultColumns
+        self.matchHighligting  = configSrc.matchHighlighting
+        self.orderedOutput     = configSrc.orderedOutput
+        self.outputLines       = []
+        self.outputSize        = 0
+        self.before            = configSrc.before
+        self.after             = configSrc.after
+        self.matchSize         = configSrc.matchSize
+        self.archives          = configSrc.archives
+        self.wide              = configSrc.wide
+        self.unique            = configSrc.unique
+        self.uniqueMatches     = None
+        self.splitRange        = False
+        self.printableOnly     = False
+        self.openArchives      = {}
+        self.beginnRootRelPath = 0
+        self.scanId            = 0
+        self.blockId           = 0
+        self.stats             = {}
+        self.whitlist          = None
+        self.resultCache       = None
+        self.cacheEntry        = None
+        self.metrics           = None
+        self.patternTimeout    = configSrc.patternTimeout if hasattr(signal, 'setitimer') else 0
+        self.watchedPattern    = None    # pattern of the current pass, checked by the watchdog
+        self.watchedStart      = 0.0
+        self.watchedBudget     = 0.0
+        self.skippedPatterns   = set()   # patterns stopped by the watchdog, skipped for the rest of the file
+
+        self.patterns   = loadPatterns(configSrc.patternFile, configSrc.sections)
+        self.scanEngine = CrawlerScanEngine(self.patterns, configSrc.wide, getPatternSet(configSrc.patternFile))
+        LOG.debug('Pattern loaded: ' + str(len(self.patterns)))
+
+        if configSrc.metrics:
+            self.metrics = CrawlerWorkerMetrics(multiprocessing.current_process().name, self.scanEngine.getPatternNames())
+
+        if configSrc.whitelistFile:
+            self.whitlist = loadWhitelist(configSrc.whitelistFile)
+        if configSrc.cacheFile:
+            self.resultCache = CrawlerResultCache(configSrc.cacheFile, getPatternFingerprint(self.patterns, self.matchSize,
+                                                                                             self.before, self.after,
+                                                                                             configSrc.wide))
+        if self.patternTimeout:
+            signal.signal(signal.SIGALRM, self._checkWatchdog)
+    # end init
+
+    ## Process files from block
+    #  - do pattern search
+    #  - check for whitelist etc
+    #  @param scanIdSrc, blockIdSrc - ids of the scan and the block, they are send with every message
+    #  @param pathOffsetSrc - begin of the relative path in the file paths
+    #  @param blockFiles - the files to process, list of tuples (path, start, end, printable only). Of the files with
+    #                     printable only only the printable runs are searched, see CrawlerPrintableRuns.
+    #  @return dict with the counters of the block, with enabled metrics also the metrics of the block (see
+    #          CrawlerWorkerMetrics.getBlockMetrics). The pattern/file pairs stopped by the watchdog are a list of
+    #          tuples (relative path, pattern name, seconds) in patternTimeouts.
+    def processBlock(self, scanIdSrc:int, blockIdSrc:int, pathOffsetSrc:int, blockFiles:list) -> dict:
+        self.scanId            = scanIdSrc
+        self.blockId           = blockIdSrc
+        self.beginnRootRelPath = pathOffsetSrc
+        self.stats             = {"processedFiles": 0, "whitelistedMatches": 0, "overMaxMatchSize": 0, "cachedRanges": 0,
+                                  "patternTimeouts": []}
+        if self.patternTimeout:
+            signal.setitimer(signal.ITIMER_REAL, WATCHDOG_INTERVAL, WATCHDOG_INTERVAL)
+        if self.metrics:
+            # the busy time of the worker starts with the block
+            self.metrics.reset()
+        if self.unique:
+            self.uniqueMatches = CrawlerUniqueData()
+        try:
+            for file, start, end, printableOnly in blockFiles:
+                if self.metrics:
+                    fileStart = timeit.default_timer()
+                    fileBytes = self.metrics.bytes
+                self.splitRange      = False
+                self.printableOnly   = printableOnly
+                self.skippedPatterns = set()
+
+                # send large aggregates between the files, the results of a file have to be in the same aggregate
+                if self.uniqueMatches is not None and len(self.uniqueMatches) >= UNIQUE_BATCH_SIZE:
+                    self._emitUnique()
+                try:
+                    # members of zip archives are added as separate files
+                    if self.archives and ARCHIVE_SEPARATOR in file and not os.path.lexists(file):
+                        if self._processArchiveMember(file):
+                            self.stats["processedFiles"] += 1
+                            if self.metrics:
+                                self.metrics.addFile(file[self.beginnRootRelPath:], timeit.default_timer() - fileStart,
+                                                     self.metrics.bytes - fileBytes, True)
+                            continue
+
+                    # create value object for the results - save only the relative path to the results
+                    cvo = CrawlerVo(file[self.beginnRootRelPath:])
+
+                    with open(file, 'rb') as f:
+                        LOG.debug("Processing %s [%d:%d]" %(file, start, end))
+                        fileStat = os.fstat(f.fileno())
+                        fileSize = fileStat.st_size
+
+                        # pipes, devices and files of virtual file systems like /proc have no reliable size,
+                        # they are read until the end of the data
+                        if not stat.S_ISREG(fileStat.st_mode) or fileSize == 0:
+                            cvo = self._processBuffered(file, f, cvo, 0, None)
+                        elif self.archives and start == 0 and self._processArchive(file, f):
+                            # archives are not split into ranges and not cached
+                            end = fileSize
+                        else:
+                            # the file was shrinking since reading the file list
+                            end = min(end, fileSize)
+                            self.splitRange = start > 0 or end < fileSize
+
+                            # replay the matches of an unchanged file from the cache
+                            # - the cache has the matches of the whole data, not of the printable runs
+                            cacheEntry = None
+                            if self.resultCache and not printableOnly:
+                                cacheEntry = self.resultCache.lookup(file, start, end, fileStat)
+
+                            if cacheEntry is not None:
+                                LOG.debug("Read %s [%d:%d] from cache" %(file, start, end))
+                                cvo = self._replayMatches(file, cvo, cacheEntry)
+                                self.stats["cachedRanges"] += 1
+                            else:
+                                if self.resultCache and not printableOnly:
+                                    self.cacheEntry = {"matches": [], "overMaxMatchSize": 0}
+
+                                mappedCvo = None
+                                if fileSize >= MMAP_MIN_SIZE:
+                                    mappedCvo = self._processMapped(file, f, cvo, start, end, fileSize)
+                                cvo = mappedCvo if mappedCvo is not None else self._processBuffered(file, f, cvo, start, end)
+
+                                if self.cacheEntry is not None:
+                                    self.resultCache.store(file, start, end, fileStat, self.cacheEntry)
+                                    self.cacheEntry = None
+                            # end if
+                        # end if
+                    # end with file
+
+                    # send the remaining results of the file to the result writer
+                    self._emitResult(cvo)
+                    if self.orderedOutput:
+                        self._emitOutput()
+
+                    # a file is processed with its last byte range
+                    if end >= fileSize:
+                        self.stats["processedFiles"] += 1
+
+                    if self.metrics:
+                        self.metrics.addFile(file[self.beginnRootRelPath:], timeit.default_timer() - fileStart,
+                                             self.metrics.bytes - fileBytes, end >= fileSize)
+                except IOError as ioe:
+                    LOG.info("[!] " + getattr(ioe, 'message', repr(ioe)))
+            # end for
+
+            # write the new cache entries of the block
+            if self.resultCache:
+                self.resultCache.flush()
+
+            if self.whitlist:
+                self.stats["whitelistHits"] = self.whitlist.popHits()
+            if self.metrics:
+                self.stats["metrics"] = self.metrics.getBlockMetrics()
+            return self.stats
+        except Exception as e:
+            raise CrawlerProcessError(getattr(e, 'message', repr(e)))
+        finally:
+            if self.patternTimeout:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+            self._closeArchives()
+            self._emitOutput()
+            if self.uniqueMatches is not None:
+                self._emitUnique()
+                self.uniqueMatches = None
+    # end processBlock
+
+    ## Process a file if it is an archive
+    #  - the archive is read as stream, the matches are reported with the virtual path of the member
+    #  @param f - the opened file, it is read from the begin
+    #  @return True if the file was an archive
+    def _processArchive(self, file, f) -> bool:
+        if getArchiveFormat(f.read(ARCHIVE_HEADER_SIZE)) is None:
+            f.seek(0)
+            return False
+        f.seek(0)
+        self._processSources(f, file, 0, None)
+        return True
+    # end _processArchive
+
+    ## Process a member of a zip archive
+    #  - the archives are kept open until the end of the block, so the directory of an archive is read once
+    #  @param file - virtual path of the member
+    #  @return False if the path is not a virtual path
+    def _processArchiveMember(self, file) -> bool:
+        virtualPath = splitVirtualPath(file)
+        if virtualPath is None:
+            return False
+
+        archivePath, memberName = virtualPath
+        try:
+            if archivePath not in self.openArchives:
+                self.openArchives[archivePath] = zipfile.ZipFile(archivePath)
+            stream, inputSize = openZipMember(self.openArchives[archivePath], memberName, file)
+        except CrawlerError as ce:
+            LOG.info(ce.msg)
+            return True
+        except Exception as e:
+            LOG.info("[!] Error while reading archive %s: %s" %(file, getattr(e, 'message', repr(e))))
+            return True
+
+        with stream:
+            self._processSources(stream, file, 1, inputSize)
+        return True
+    # end _processArchiveMember
+
+    ## Searches all data streams of an archive
+    #  - nested archives are opened, see sources.iterSources
+    #  - an error stops the reading of the archive, the results until the error are kept
+    def _processSources(self, fileObj, file, depth, inputSize) -> None:
+        try:
+            for sourcePath, stream in iterSources(fileObj, file, depth, inputSize):
+                LOG.debug("Processing %s" %(sourcePath))
+                cvo = CrawlerVo(sourcePath[self.beginnRootRelPath:])
+                cvo = self._processBuffered(sourcePath, stream, cvo, 0, None)
+                self._emitResult(cvo)
+                if self.orderedOutput:
+                    self._emitOutput()
+        except CrawlerError as ce:
+            LOG.info(ce.msg)
+        except Exception as e:
+            LOG.info("[!] Error while reading archive %s: %s" %(file, getattr(e, 'message', repr(e))))
+    # end _processSources
+
+    ## Closes the zip archives of a block
+    def _closeArchives(self) -> None:
+        for archive in self.openArchives.values():
+            archive.close()
+        self.openArchives = {}
+    # end _closeArchives
+
+    ## Process a byte range of a file with a memory mapping
+    #  - the scan engine searches directly in the mapping, there is no copy of the data and no overlap reading
+    #  - the search of a range ends after the longest possible match, so matches at the end of the range are complete
+    #  - the search of a range starts before the range, so it continues at the same positions as the
+    #    search of the previous range
+    #  @return value object with the not emitted results, None if the file can not be mapped
+    def _processMapped(self, file, f, cvo, start, end, fileSize) -> CrawlerVo:
+        if self.metrics:
+            readStart = timeit.default_timer()
+        try:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError) as e:
+            LOG.debug("Memory mapping of %s failed: %s" %(file, repr(e)))
+            return None
+
+        if self.metrics:
+            self.metrics.addTime("read", timeit.default_timer() - readStart)
+            self.metrics.bytes += end - start
+
+        with mapping:
+            searchStart = max(0, start - READ_OVERLAP_SIZE)
+            searchEnd   = min(fileSize, end + max(READ_OVERLAP_SIZE, self.matchSize * 4))
+            cvo = self._scanBuffer(file, cvo, mapping, searchStart, searchEnd, start, end, 0, b'')
+        return cvo
+    # end _processMapped
+
+    ## Process a byte range of a file with a read buffer
+    #  - the range is read in blocks, every block is searched with the overlap of the following block or range
+    #  - the overlap of a block is kept for the next block, so the file is never seeked back
+    #  - with match context the block is read with the context after the overlap, it is not searched. The context
+    #    before the block is kept from the previous block.
+    #  @param end - end of the range, None reads until the end of the data
+    #  @return value object with the not emitted results
+    def _processBuffered(self, file, f, cvo, start, end) -> CrawlerVo:
+        bufSize = READ_BUFFER_SIZE
+        overlap = READ_OVERLAP_SIZE
+        filePos = start # current position in file
+        logPos  = start + PROGRESS_LOG_SIZE
+        prefix  = b''   # context before the block
+
+        if start > 0:
+            if self.before > 0:
+                f.seek(max(0, start - self.before))
+                prefix = self._readData(f, start - max(0, start - self.before))
+            else:
+                f.seek(start)
+
+        readSize = bufSize if end is None else min(bufSize, end - filePos)
+        buffer   = self._readData(f, readSize + overlap + self.after)
+
+        while buffer:
+
+            # log status of large files and streams
+            if filePos >= logPos:
+                LOG.debug("Processing %s; read %d bytes" %(file, filePos))
+                logPos += PROGRESS_LOG_SIZE
+
+            cvo = self._scanBuffer(file, cvo, buffer, 0, min(len(buffer), readSize + overlap), 0, readSize, filePos, prefix)
+
+            # set new offset
+            filePos += readSize
+            if end is not None and filePos >= end:
+                break
+
+            # the overlap of the current block is the begin of the next block
+            if self.before > 0:
+                prefix = (prefix + buffer[:readSize])[-self.before:]
+            buffer   = buffer[readSize:]
+            readSize = bufSize if end is None else min(bufSize, end - filePos)
+            buffer  += self._readData(f, readSize)
+        # end while
+
+        return cvo
+    # end _processBuffered
+
+    ## Reads data from a file
+    #  - pipes can return less data then requested, so reading is repeated until the size or the end is reached
+    def _readData(self, f, sizeSrc:int) -> bytes:
+        if self.metrics:
+            readStart = timeit.default_timer()
+        data = f.read(sizeSrc)
+        if data and len(data) < sizeSrc:
+            parts = [data]
+            length = len(data)
+            while length < sizeSrc:
+                data = f.read(sizeSrc - length)
+                if not data:
+                    break
+                parts.append(data)
+                length += len(data)
+            data = b''.join(parts)
+
+        if self.metrics:
+            self.metrics.addTime("read", timeit.default_timer() - readStart)
+            self.metrics.bytes += len(data)
+        return data
+    # end _readData
+
+    ## Searches all patterns in a buffer and adds the matches to the value object
+    #  @param bufferSrc - bytes like object to search in (bytes or mmap)
+    #  @param searchStart, searchEnd - positions of the search in the buffer
+    #  @param keepStart, keepEnd - only matches which begins in this range are added
+    #  @param offsetSrc - file offset of the buffer begin
+    #  @param prefixSrc - data before the buffer begin for the match context
+    #  @param runsSrc - CrawlerPrintableRuns of the buffer, the positions are positions in the joined runs
+    #  @return value object for the next results, a full value object is send to the result writer
+    def _scanBuffer(self, file, cvo, bufferSrc, searchStart, searchEnd, keepStart, keepEnd, offsetSrc, prefixSrc,
+                    runsSrc=None) -> CrawlerVo:
+        # search only the printable runs of the buffer, the matches are mapped to the positions in the buffer
+        if self.printableOnly and runsSrc is None:
+            runs = CrawlerPrintableRuns(bufferSrc, searchStart, searchEnd, self.wide)
+            if not runs.data:
+                return cvo
+            return self._scanBuffer(file, cvo, bufferSrc, 0, len(runs.data), runs.getPosition(keepStart),
+                                    runs.getPosition(keepEnd), offsetSrc, prefixSrc, runs)
+
+        if self.metrics:
+            lastTime, lastExcluded = self.metrics.startScan()
+
+        searchBuffer = bufferSrc if runsSrc is None else runsSrc.data
+        for ioc_type, pattern, searchRes in self.scanEngine.scan(searchBuffer, searchStart, searchEnd):
+            if pattern in self.skippedPatterns:
+                continue
+            if self.patternTimeout:
+                searchRes = self._watchMatches(searchRes, pattern, searchEnd - searchStart, cvo.path)
+
+            matchFound = False
+            encoding   = self.scanEngine.getEncoding(pattern)
+            if self.metrics:
+                matchCount = self.metrics.matches
+
+            for item in searchRes:
+                if item.start() >= keepEnd:
+                    break
+                if item.start() < keepStart:
+                    continue
+                start, end = item.span()
+                if runsSrc is not None:
+                    positions = runsSrc.getMatchPositions(start, end)
+                    if positions is None:
+                        continue
+                    start, end = positions
+
+                try:
+                    matchString = item.group(0).decode(encoding)
+
+                    # Check match size
+                    if len(matchString) > self.matchSize:
+                        raise CrawlerMatchError("Match for %s is greater then %d." %(item, self.matchSize))
+
+                    context = None
+                    if self.before > 0 or self.after > 0:
+                        context = self._getContext(bufferSrc, prefixSrc, start, end)
+
+                    # the cache stores the matches before whitelisting
+                    if self.cacheEntry is not None:
+                        if context is None:
+                            self.cacheEntry["matches"].append((ioc_type, matchString, offsetSrc + start))
+                        else:
+                            self.cacheEntry["matches"].append((ioc_type, matchString, offsetSrc + start,
+                                                               context[0].decode("latin-1"), context[1].decode("latin-1")))
+
+                    if self._acceptMatch(file, ioc_type, matchString, offsetSrc + start, context):
+                        cvo.addMatch(ioc_type, matchString, offsetSrc + start, context)
+                        matchFound = True
+                # end try
+                except UnicodeDecodeError as ude:
+                    LOG.debug("Decoding error while Processing %s" %(item))
+                except CrawlerMatchError as me:
+                    self.stats["overMaxMatchSize"] += 1
+                    if self.cacheEntry is not None:
+                        self.cacheEntry["overMaxMatchSize"] += 1
+                    LOG.debug(me)
+            # end for item in searchRes
+
+            # send large results in batches, so the memory of the process keeps small
+            if matchFound:
+                if cvo.getMatchCount() >= RESULT_BATCH_SIZE:
+                    self._emitResult(cvo)
+                    cvo = CrawlerVo(cvo.path)
+
+            if self.metrics:
+                lastTime, lastExcluded = self.metrics.addPattern(pattern, lastTime, lastExcluded,
+                                                                 self.metrics.matches - matchCount)
+        # end for pattern
+
+        # the metrics of a long block are send while processing
+        if self.metrics and self.metrics.isDue():
+            self.resultQueue.put(("metrics", self.scanId, self.blockId, self.metrics.getBlockMetrics()))
+
+        return cvo
+    # end _scanBuffer
+
+    ## Returns the matches of a pattern pass under the control of the watchdog
+    #  - the budget of the pass is the pattern timeout per MB of the searched data (at least PATTERN_BUDGET_MIN)
+    #  - the watchdog stops the pass only in this generator, so the processing of a match is never interrupted
+    #  - a stopped pattern is skipped for the rest of the file, the results of the range are not cached
+    #  @param matchesSrc - iterator of the match objects of the pass
+    #  @param sizeSrc - count of the searched bytes
+    #  @param pathSrc - relative path of the file for the report
+    #  @return iterator of match objects
+    def _watchMatches(self, matchesSrc, patternSrc, sizeSrc:int, pathSrc:str):
+        self.watchedStart   = timeit.default_timer()
+        self.watchedBudget  = self.patternTimeout * max(sizeSrc, PATTERN_BUDGET_MIN) / (1024 * 1024)
+        self.watchedPattern = patternSrc
+        try:
+            for item in matchesSrc:
+                yield item
+        except CrawlerPatternTimeout as pte:
+            self.skippedPatterns.add(patternSrc)
+            self.cacheEntry = None
+            name = self.scanEngine.getPatternNames().get(patternSrc, repr(patternSrc.pattern))
+            self.stats["patternTimeouts"].append((pathSrc, name, timeit.default_timer() - self.watchedStart))
+            LOG.info("%s Pattern %s in %s, it is skipped for the rest of the file." %(pte.msg, name, pathSrc))
+        finally:
+            self.watchedPattern = None
+    # end _watchMatches
+
+    ## Signal handler of the watchdog, it is called every WATCHDOG_INTERVAL seconds while a block is processed
+    #  - the exception is only raised inside of the match iterator of the pass (see _watchMatches). The current frame
+    #    can also be a frame of the search called by the iterator, e.g. the trigger search of the scan engine.
+    def _checkWatchdog(self, signumSrc, frameSrc) -> None:
+        if self.watchedPattern is None:
+            return
+        while frameSrc is not None and frameSrc.f_code is not self._watchMatches.__code__:
+            frameSrc = frameSrc.f_back
+        if frameSrc is None:
+            return
+        seconds = timeit.default_timer() - self.watchedStart
+        if seconds > self.watchedBudget:
+            self.watchedPattern = None
+            raise CrawlerPatternTimeout("Time budget of %.1f s exceeded after %.1f s." %(self.watchedBudget, seconds))
+    # end _checkWatchdog
+
+    ## Returns the context of a match, the context is sliced from the buffer or the mapping without reading
+    #  - the context before the buffer begin is taken from the prefix
+    #  - the context ends at the end of the buffer, it is shorter at the begin and the end of the data
+    #  @return tuple (bytes before, bytes after)
+    def _getContext(self, bufferSrc, prefixSrc:bytes, startSrc:int, endSrc:int) -> tuple:
+        before = b''
+        if self.before > 0:
+            if startSrc >= self.before or not prefixSrc:
+                before = bufferSrc[max(0, startSrc - self.before):startSrc]
+            else:
+                before = prefixSrc[max(0, len(prefixSrc) - self.before + startSrc):] + bufferSrc[:startSrc]
+        return before, bufferSrc[endSrc:endSrc + self.after]
+    # end _getContext
+
+    ## Checks the whitelist for a match and prints the match
+    #  @param contextSrc - tuple (bytes before, bytes after) or None
+    #  @return True if the match is not whitelisted
+    def _acceptMatch(self, file, ioc_type, matchString, offset, contextSrc=None) -> bool:
+        if self.whitlist:
+            if self.metrics:
+                checkStart  = timeit.default_timer()
+                whitelisted = self.whitlist.containsMatch(matchString)
+                self.metrics.addTime("whitelist", timeit.default_timer() - checkStart)
+            else:
+                whitelisted = self.whitlist.containsMatch(matchString)
+            if whitelisted:
+                self.stats["whitelistedMatches"] += 1
+                return False
+
+        if self.metrics:
+            self.metrics.matches += 1
+
+        if self.printToStdOut:
+            # hint: save only relative path
+            printDict = {"path" : file[self.beginnRootRelPath:], "ioc" : ioc_type, "match": matchString, "offset": str(offset)}
+            if contextSrc is not None:
+                printDict["before"] = escapeContext(contextSrc[0])
+                printDict["after"]  = escapeContext(contextSrc[1])
+            self._addOutput(printDict, offset)
+        return True
+    # end _acceptMatch
+
+    ## Adds the cached matches of a file range to the value object
+    #  - the whitelist is applied to the cached matches, so whitelist changes need no new search
+    #  @param cacheEntrySrc - dict with the matches and the count of matches above the max match size
+    #                        -> a match is a list [ioc type, match, offset] or with context [..., before, after]
+    #  @return value object with the not emitted results
+    def _replayMatches(self, file, cvo, cacheEntrySrc) -> CrawlerVo:
+        for entry in cacheEntrySrc["matches"]:
+            ioc_type, matchString, offset = entry[:3]
+            context = (entry[3].encode("latin-1"), entry[4].encode("latin-1")) if len(entry) > 3 else None
+            if self._acceptMatch(file, ioc_type, matchString, offset, context):
+                cvo.addMatch(ioc_type, matchString, offset, context)
+
+        self.stats["overMaxMatchSize"] += cacheEntrySrc["overMaxMatchSize"]
+        return cvo
+    # end _replayMatches
+
+    ## Sends a value object to the result writer
+    #  - value objects without matches are not send
+    #  - in unique mode the results are added to the aggregate of the block
+    def _emitResult(self, cvo) -> None:
+        if cvo.mColumns and self.uniqueMatches is not None:
+            self.uniqueMatches.addResult(cvo, self.splitRange)
+        elif cvo.mColumns:
+            if self.metrics:
+                emitStart = timeit.default_timer()
+                self.resultQueue.put(("result", self.scanId, self.blockId, cvo))
+                self.metrics.addTime("emit", timeit.default_timer() - emitStart)
+            else:
+                self.resultQueue.put(("result", self.scanId, self.blockId, cvo))
+    # end _emitResult
+
+    ## Sends the unique aggregate to the result writer and starts a new aggregate
+    def _emitUnique(self) -> None:
+        if self.uniqueMatches:
+            self.resultQueue.put(("unique", self.scanId, self.blockId, self.uniqueMatches))
+        self.uniqueMatches = CrawlerUniqueData()
+    # end _emitUnique
+
+    ## Adds a result line for stdout
+    #  - the lines are send in batches to the result writer, with ordered output at the end of every file
+    def _addOutput(self, printDictSrc:dict, offsetSrc:int) -> None:
+        line = formatOutputLine(printDictSrc, self.result_columns, self.matchHighligting)
+        self.outputSize += len(line)
+        if self.orderedOutput:
+            self.outputLines.append((offsetSrc, len(self.outputLines), line))
+        else:
+            self.outputLines.append(line)
+            if self.outputSize >= OUTPUT_BATCH_SIZE:
+                self._emitOutput()
+    # end _addOutput
+
+    ## Sends the result lines to the result writer
+    def _emitOutput(self) -> None:
+        if not self.outputLines:
+            return
+        if self.metrics:
+            emitStart = timeit.default_timer()
+
+        if self.orderedOutput:
+            self.outputLines.sort()
+            data = "".join([line for offset, index, line in self.outputLines])
+        else:
+            data = "".join(self.outputLines)
+        # paths with undecodable characters are written with the original bytes
+        self.resultQueue.put(("output", self.scanId, self.blockId, data.encode("utf-8", "surrogateescape")))
+        self.outputLines = []
+        self.outputSize  = 0
+
+        if self.metrics:
+            self.metrics.addTime("emit", timeit.default_timer() - emitStart)
+    # end _emitOutput
+
+# end class CrawlerWorker
@@ -0,0 +1,300 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import collections     # for the message buffer
+import cProfile        # for the profile of the workers
+import logging         # for log
+import multiprocessing # for the worker processes
+import os              # for the profile files
+import queue           # for queue timeouts
+import signal          # for ignoring the user interrupt in the workers
+import threading       # for the block ids
+import timeit          # for the shutdown timeout
+
+from .crawlererr     import CrawlerError, CrawlerProcessError # ioc crawler error handling
+from .worker         import CrawlerWorker, CrawlerWorkerConfig # scan context of the workers
+
+## --------------------------------------------------------------------------------------------------------------------
+
+LOG = logging.getLogger('IocCrawlerLog')
+
+# state of the current block of a worker
+WORKER_NOT_READY   = -2               # the worker is loading the pattern and the whitelist
+WORKER_IDLE        = -1               # the worker has not processed a block yet
+
+# time to wait for the workers on shutdown
+WORKER_JOIN_TIMEOUT = 10
+
+## --------------------------------------------------------------------------------------------------------------------
+## Main function of a worker process
+#  - the pattern and the whitelist are loaded once, then blocks are taken from the task queue until the sentinel
+#  - the id of the current block is written to shared memory, so the block of a crashed worker is known
+#  - with a profile directory in the config, the worker is profiled and the profile is written to
+#    <profile directory>/<process name>-<pid>.prof when the worker is stopped
+#  @param configSrc - CrawlerWorkerConfig
+#  @param scanIdSrc - shared id of the current scan, blocks of older scans are skipped
+#  @param currentBlockSrc - shared id of the current block of the worker
+def _workerMain(configSrc, taskQueueSrc, resultQueueSrc, scanIdSrc, currentBlockSrc) -> None:
+    # the user interrupt is handled by the main process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    profiler = None
+    if configSrc.profileDir:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    worker = CrawlerWorker(configSrc, resultQueueSrc)
+    currentBlockSrc.value = WORKER_IDLE
+
+    while True:
+        task = taskQueueSrc.get()
+        if task is None:
+            break
+
+        scanId, blockId, pathOffset, blockFiles = task
+        currentBlockSrc.value = blockId
+        stats = {}
+        try:
+            if scanId == scanIdSrc.value:
+                LOG.debug("Processing block %d" %(blockId))
+                stats = worker.processBlock(scanId, blockId, pathOffset, blockFiles)
+        except CrawlerError as ce:
+            LOG.info(ce.msg)
+            stats = dict(worker.stats, failed=True, error=ce.msg, files=_getBlockPaths(pathOffset, blockFiles))
+        except Exception as e:
+            LOG.info("[!] Error while processing block %d: %s" %(blockId, getattr(e, 'message', repr(e))))
+            stats = dict(worker.stats, failed=True, error=getattr(e, 'message', repr(e)),
+                         files=_getBlockPaths(pathOffset, blockFiles))
+        # the block is finished, also if it was skipped or failed
+        resultQueueSrc.put(("done", scanId, blockId, stats))
+    # end while
+
+    if worker.resultCache:
+        worker.resultCache.close()
+
+    if profiler:
+        profiler.disable()
+        process = multiprocessing.current_process()
+        profiler.dump_stats(os.path.join(configSrc.profileDir, "%s-%d.prof" %(process.name, process.pid)))
+# end def _workerMain
+
+## Returns the relative paths of the files of a block, the ranges of a file are listed once
+def _getBlockPaths(pathOffsetSrc:int, blockFilesSrc:list) -> list:
+    return list(dict.fromkeys(path[pathOffsetSrc:] for path, start, end, printableOnly in blockFilesSrc))
+
+## --------------------------------------------------------------------------------------------------------------------
+## Persistent pool of worker processes
+#  The workers are started once and keep the loaded pattern and whitelist, so several scans can be done with the same
+#  pool. The workers are started again only if the settings of a scan are different (see CrawlerWorkerConfig.getKey).
+#  Only one scan can run at the same time.
+#
+#  A scan is done in the following steps:
+#  - configure() starts the workers with the settings of the scan
+#  - startScan() returns the id of the new scan
+#  - submit() adds a block of file ranges, the blocks are taken by the next free worker
+#  - getMessage() returns the messages of the workers, see CrawlerWorker. A failed block is finished with the error
+#    and the relative paths of its files in the data of the "done" message (failed, error, files). If a worker
+#    crashed, it is started again and a ("lost", scanId, blockId, info) message is returned for its block, the info
+#    contains also the relative paths of the files.
+#
+#  The pool is stopped with close(), every worker gets a sentinel and finishes its current block.
+class CrawlerWorkerPool:
+
+    ## constructor
+    #  - the workers are started with the first configure()
+    #  @param processCountSrc - count of the worker processes
+    def __init__(self, processCountSrc:int) -> None:
+        self.processCount = max(1, processCountSrc)
+        self.context      = multiprocessing.get_context()
+        self.taskQueue    = None
+        self.resultQueue  = None
+        self.workers      = []  # list of tuples (process, shared id of the current block)
+        self.config       = None
+        self.configKey    = None
+        self.scanId       = self.context.Value('q', 0)
+        self.nextBlockId  = 0
+        self.openBlocks   = {}  # block id : tuple (scan id, relative paths of the files)
+        self.messages     = collections.deque()
+        self.lock         = threading.Lock()
+    # end init
+
+    ## Starts the workers with the settings of a scan
+    #  - running workers are reused if the settings are the same
+    #  @param configSrc - CrawlerWorkerConfig
+    def configure(self, configSrc:CrawlerWorkerConfig) -> None:
+        configKey = configSrc.getKey()
+        if self.workers and configKey == self.configKey:
+            return
+
+        self._stopWorkers()
+        self.config      = configSrc
+        self.configKey   = configKey
+        self.taskQueue   = self.context.Queue()
+        self.resultQueue = self.context.Queue()
+        self.messages.clear()
+        self.openBlocks  = {}
+        LOG.debug("Using %d processes for processing." %(self.processCount))
+        for index in range(self.processCount):
+            self.workers.append(self._startWorker(index))
+    # end def configure
+
+    ## Starts a worker process
+    #  @return tuple (process, shared id of the current block)
+    def _startWorker(self, indexSrc:int) -> tuple:
+        LOG.debug("Create Process")
+        currentBlock = self.context.Value('q', WORKER_NOT_READY, lock=False)
+        process = self.context.Process(target=_workerMain, name="CrawlerWorker-%d" %(indexSrc),
+                                       args=(self.config, self.taskQueue, self.resultQueue, self.scanId, currentBlock))
+        process.daemon = True
+        process.start()
+        return (process, currentBlock)
+    # end def _startWorker
+
+    ## Starts a new scan
+    #  - not processed blocks of a previous scan are skipped by the workers
+    #  @return id of the scan
+    def startScan(self) -> int:
+        with self.lock:
+            self.scanId.value += 1
+            self.openBlocks = {}
+            self.messages.clear()
+            return self.scanId.value
+    # end def startScan
+
+    ## Cancels the current scan
+    #  - the workers skip the not processed blocks of the scan, the messages of the scan are dropped
+    def cancelScan(self) -> None:
+        self.startScan()
+
+    ## Adds a block to the task queue
+    #  - is called from the walker threads
+    #  @param scanIdSrc - id of the scan
+    #  @param pathOffsetSrc - begin of the relative path in the file paths
+    #  @param blockFilesSrc - list of tuples (path, start, end)
+    #  @return id of the block
+    def submit(self, scanIdSrc:int, pathOffsetSrc:int, blockFilesSrc:list) -> int:
+        with self.lock:
+            self.nextBlockId += 1
+            blockId = self.nextBlockId
+            self.openBlocks[blockId] = (scanIdSrc, _getBlockPaths(pathOffsetSrc, blockFilesSrc))
+        self.taskQueue.put((scanIdSrc, blockId, pathOffsetSrc, blockFilesSrc))
+        return blockId
+    # end def submit
+
+    ## Returns the next message of a scan
+    #  - messages of other scans are dropped
+    #  @param scanIdSrc - id of the scan
+    #  @param timeoutSrc - max time to wait in seconds
+    #  @return message tuple (type, scan id, block id, data) or None if there was no message
+    def getMessage(self, scanIdSrc:int, timeoutSrc:float=1) -> tuple:
+        while True:
+            if self.messages:
+                message = self.messages.popleft()
+            else:
+                try:
+                    message = self._readMessage(timeoutSrc)
+                except queue.Empty:
+                    # a crashed worker never finishes its block
+                    self._checkWorkers()
+                    if not self.messages:
+                        return None
+                    continue
+            # end if
+
+            if message[1] == scanIdSrc:
+                return message
+        # end while
+    # end def getMessage
+
+    ## Reads a message from the result queue and marks finished blocks
+    def _readMessage(self, timeoutSrc:float=None) -> tuple:
+        if timeoutSrc is None:
+            message = self.resultQueue.get_nowait()
+        else:
+            message = self.resultQueue.get(timeout=timeoutSrc)
+        if message[0] == "done":
+            with self.lock:
+                self.openBlocks.pop(message[2], None)
+        return message
+    # end def _readMessage
+
+    ## Starts crashed workers again
+    #  - the block of a crashed worker is reported with a "lost" message
+    #  - a worker which crashed while loading the pattern or the whitelist raises an error
+    def _checkWorkers(self) -> None:
+        crashed = [index for index, (process, currentBlock) in enumerate(self.workers) if process.exitcode is not None]
+        if not crashed:
+            return
+
+        # read the messages which are send before the crash
+        while True:
+            try:
+                self.messages.append(self._readMessage())
+            except queue.Empty:
+                break
+
+        for index in crashed:
+            process, currentBlock = self.workers[index]
+            LOG.info("[!] Process %s exited with code %d" %(process.name, process.exitcode))
+            if currentBlock.value == WORKER_NOT_READY:
+                raise CrawlerProcessError("Process %s could not be initialized." %(process.name))
+
+            with self.lock:
+                block = self.openBlocks.pop(currentBlock.value, None)
+            if block is not None:
+                self.messages.append(("lost", block[0], currentBlock.value, {"process": process.name,
+                                                                            "exitcode": process.exitcode,
+                                                                            "files": block[1]}))
+            self.workers[index] = self._startWorker(index)
+        # end for
+    # end def _checkWorkers
+
+    ## Stops the workers
+    #  - every worker gets a sentinel, workers which do not finish in time are terminated
+    #  - a worker exits after its messages are read from the result queue, so the messages which are left (e.g. of a
+    #    cancelled scan) are dropped while waiting
+    def _stopWorkers(self) -> None:
+        for process, currentBlock in self.workers:
+            self.taskQueue.put(None)
+        deadline = timeit.default_timer() + WORKER_JOIN_TIMEOUT
+        for process, currentBlock in self.workers:
+            while process.exitcode is None and timeit.default_timer() < deadline:
+                self._dropMessages()
+                process.join(0.1)
+            if process.exitcode is None:
+                process.terminate()
+                process.join()
+        self.workers = []
+    # end def _stopWorkers
+
+    ## Drops the messages of the result queue
+    def _dropMessages(self) -> None:
+        while True:
+            try:
+                self.resultQueue.get_nowait()
+            except queue.Empty:
+                break
+    # end def _dropMessages
+
+    ## Stops the workers and closes the pool
+    def close(self) -> None:
+        self._stopWorkers()
+        self.configKey = None
+    # end def close
+
+    ## Terminates the workers without waiting for the current blocks
+    def terminate(self) -> None:
+        for process, currentBlock in self.workers:
+            process.terminate()
+        self.workers = []
+        self.configKey = None
+    # end def terminate
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> None:
+        self.close()
+
+# end class CrawlerWorkerPool
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import os              # for paths
+import tempfile        # for the test files
+import unittest        # for the tests
+import unittest.mock   # for the small chunks
+
+import crawler.crawler
+
+from crawler.benchmark import DEFAULT_PATTERN_FILE
+from crawler.crawler   import Crawler
+from crawler.worker    import READ_BUFFER_SIZE
+
+## --------------------------------------------------------------------------------------------------------------------
+## Tests of the result cache
+class TestResultCache(unittest.TestCase):
+
+    ## Runs a crawler with the result cache
+    #  @return tuple (crawler, sorted list of the matches)
+    def _crawl(self, sourceSrc:str, cacheFileSrc:str, threadsSrc:int) -> tuple:
+        ioccrawler = Crawler(sourceSrc, threadsSrc, DEFAULT_PATTERN_FILE, False, ['path', 'ioc', 'match', 'offset'], ['ip'],
+                             False, 256, cacheFileSrc=cacheFileSrc, quietSrc=True)
+        ioccrawler.do(keepResultsSrc=True)
+        matches = [(cvo.path, ioc, match, offsets) for cvo in ioccrawler.resultList for ioc, match, offsets in cvo.iterMatches()]
+        return ioccrawler, sorted(matches)
+
+    ## The ranges of a split file are found in the cache if the process count is changed
+    def test_processCount(self):
+        with tempfile.TemporaryDirectory() as tempDir, \
+             unittest.mock.patch.object(crawler.crawler, "BLOCK_MIN_SIZE", READ_BUFFER_SIZE), \
+             unittest.mock.patch.object(crawler.crawler, "CHUNK_MIN_SIZE", READ_BUFFER_SIZE), \
+             unittest.mock.patch.object(crawler.crawler, "CACHE_CHUNK_SIZE", 4 * READ_BUFFER_SIZE):
+            os.makedirs(os.path.join(tempDir, "d"))
+            with open(os.path.join(tempDir, "d", "large.txt"), "w") as f:
+                for index in range(20000):
+                    f.write("line %d connect 10.1.%d.%d\n" %(index, index // 256 % 256, index % 256))
+            source    = os.path.join(tempDir, "d")
+            cacheFile = os.path.join(tempDir, "results.cache")
+
+            first, firstMatches = self._crawl(source, cacheFile, 1)
+            self.assertNotIn("Files (ranges) read from cache", first.getResultSummary())
+            second, secondMatches = self._crawl(source, cacheFile, 4)
+            self.assertEqual(secondMatches, firstMatches)
+            self.assertEqual(second.getResultSummary()["Files (ranges) read from cache"], second.submittedBlocks)
+            self.assertGreater(second.submittedBlocks, 1)
+
+# end class TestResultCache
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import pickle          # for the transfer between the processes
+import unittest        # for the tests
+
+from crawler.crawlerdata import CrawlerVo, escapeContext
+
+## --------------------------------------------------------------------------------------------------------------------
+## Tests of the columnar value object of the results
+class TestCrawlerVo(unittest.TestCase):
+
+    def test_matches(self):
+        cvo = CrawlerVo("d/a.txt")
+        for iocType, matchString, offset in (("IP", "10.1.2.3", 5), ("DOMAIN", "a.example", 9), ("IP", "10.9.9.9", 20),
+                                             ("IP", "10.1.2.3", 31)):
+            cvo.addMatch(iocType, matchString, offset)
+        self.assertEqual(list(cvo.iterMatches()), [("IP", "10.1.2.3", [5, 31]), ("IP", "10.9.9.9", [20]),
+                                                   ("DOMAIN", "a.example", [9])])
+        self.assertEqual(cvo.mResults, {"IP": {"10.1.2.3": ["5", "31"], "10.9.9.9": ["20"]}, "DOMAIN": {"a.example": ["9"]}})
+        self.assertEqual(cvo.mCount, {"IP": 3, "DOMAIN": 1})
+        self.assertEqual(cvo.getMatchCount(), 4)
+        self.assertFalse(cvo.hasContext())
+        self.assertEqual(cvo.fileName, "a.txt")
+
+    ## The matches without context get an empty context if context is added for later matches
+    def test_context(self):
+        cvo = CrawlerVo("a.txt")
+        cvo.addMatch("IP", "10.1.2.3", 5)
+        cvo.addMatch("IP", "10.9.9.9", 20, (b"to ", b"\n\\"))
+        cvo.addMatch("IP", "10.1.2.3", 31, (b"", b"!"))
+        self.assertTrue(cvo.hasContext())
+        self.assertEqual(list(cvo.iterContextMatches()), [("IP", "10.1.2.3", 5, b"", b""), ("IP", "10.1.2.3", 31, b"", b"!"),
+                                                          ("IP", "10.9.9.9", 20, b"to ", b"\n\\")])
+        self.assertEqual(escapeContext(b"to\n\\\xff"), "to\\x0a\\\\\\xff")
+
+    ## The index of the match strings is created again after the transfer, so matches can be added
+    def test_pickle(self):
+        cvo = CrawlerVo("a.txt")
+        cvo.addMatch("IP", "10.1.2.3", 5)
+        copy = pickle.loads(pickle.dumps(cvo))
+        copy.addMatch("IP", "10.1.2.3", 31)
+        self.assertEqual(list(copy.iterMatches()), [("IP", "10.1.2.3", [5, 31])])
+        self.assertEqual(list(cvo.iterMatches()), [("IP", "10.1.2.3", [5])])
+
+    ## A copy for a duplicate file has the matches of the primary file
+    def test_copy(self):
+        cvo = CrawlerVo("d/a.txt")
+        cvo.addMatch("IP", "10.1.2.3", 5, (b"a", b"b"))
+        duplicate = cvo.copy("d/sub/b.txt")
+        self.assertEqual((duplicate.path, duplicate.fileName), ("d/sub/b.txt", "b.txt"))
+        self.assertEqual(list(duplicate.iterContextMatches()), list(cvo.iterContextMatches()))
+
+# end class TestCrawlerVo
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    unittest.main()
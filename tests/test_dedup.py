@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import contextlib      # for the redirect of stdout
+import io              # for the captured stdout
+import os              # for paths and the working directory
+import tempfile        # for the test files
+import unittest        # for the tests
+
+from crawler.benchmark import DEFAULT_PATTERN_FILE
+from crawler.crawler   import Crawler
+
+## --------------------------------------------------------------------------------------------------------------------
+## Tests of the deduplication of files with the same content
+class TestDedup(unittest.TestCase):
+
+    ## Runs a crawler with the relative source d, which has a duplicate in a subdirectory
+    #  @return tuple (crawler, stdout output)
+    def _crawl(self, dedupSrc:bool) -> tuple:
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tempDir:
+            os.makedirs(os.path.join(tempDir, "d", "sub"))
+            for path, content in (("d/a.txt", "connect 10.1.2.3\n"), ("d/sub/b.txt", "connect 10.1.2.3\n"),
+                                  ("d/c.txt", "connect 10.9.9.9\n")):
+                with open(os.path.join(tempDir, path), "w") as f:
+                    f.write(content)
+            os.chdir(tempDir)
+            try:
+                crawler = Crawler("d", 1, DEFAULT_PATTERN_FILE, True, ['path', 'ioc', 'match', 'offset'], ['ip'], False, 256,
+                                  quietSrc=True, dedupSrc=dedupSrc)
+                stdout = io.StringIO()
+                with contextlib.redirect_stdout(stdout):
+                    crawler.do(keepResultsSrc=True)
+            finally:
+                os.chdir(cwd)
+            return crawler, stdout.getvalue()
+
+    def test_relativePaths(self):
+        crawler, stdout = self._crawl(True)
+        self.assertEqual(crawler.getResultSummary()["Duplicate files (scanned once)"], 1)
+        self.assertEqual(sorted(stdout.splitlines()), sorted(self._crawl(False)[1].splitlines()))
+        self.assertIn("d/sub/b.txt IP 10.1.2.3 8", stdout.splitlines())
+        self.assertEqual(sorted(cvo.path for cvo in crawler.resultList), ["d/a.txt", "d/c.txt", "d/sub/b.txt"])
+
+    def test_fileCount(self):
+        crawler, stdout = self._crawl(True)
+        self.assertEqual(crawler.fileListSize, 3)
+        self.assertEqual(crawler._getProcessStatus(), "100.0")
+
+# end class TestDedup
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import os              # for paths
+import tempfile        # for the export files
+import unittest        # for the tests
+
+from crawler.crawlerdata import CrawlerVo
+from crawler.exporter    import createStreamExporter, EXPORT_CSV, EXPORT_JSONL, EXPORT_SQLITE
+from crawler.shard       import _iterExportRows
+
+## --------------------------------------------------------------------------------------------------------------------
+
+COLUMNS = ['path', 'ioc', 'match', 'offset', 'before', 'after']
+
+## --------------------------------------------------------------------------------------------------------------------
+## Tests of the stream exporters
+class TestStreamExporter(unittest.TestCase):
+
+    ## Returns a result object with a match and its context
+    def _getResult(self, pathSrc:str, offsetSrc:int) -> CrawlerVo:
+        cvo = CrawlerVo(pathSrc)
+        cvo.addMatch("IP", "10.1.2.3", offsetSrc, (b"to |", b"\"\n\xff"))
+        cvo.addMatch("DOMAIN", "bücher.example", offsetSrc + 20, (b"", b","))
+        return cvo
+
+    ## Returns the rows of an export file as strings
+    def _readExport(self, exportFileSrc:str) -> list:
+        return [tuple(str(x) for x in row) for rows in _iterExportRows(exportFileSrc, COLUMNS) for row in rows]
+
+    ## A resumed export file is continued at the position of the checkpoint
+    def test_resume(self):
+        expected = [("d/a.txt", "IP", "10.1.2.3", "5", "to |", "\"\\x0a\\xff"),
+                    ("d/a.txt", "DOMAIN", "bücher.example", "25", "", ","),
+                    ("d/c.txt", "IP", "10.1.2.3", "7", "to |", "\"\\x0a\\xff"),
+                    ("d/c.txt", "DOMAIN", "bücher.example", "27", "", ",")]
+        with tempfile.TemporaryDirectory() as tempDir:
+            for exportFormat, compress in ((EXPORT_CSV, False), (EXPORT_CSV, True), (EXPORT_JSONL, False),
+                                           (EXPORT_JSONL, True), (EXPORT_SQLITE, False)):
+                with self.subTest(exportFormat=exportFormat, compress=compress):
+                    exportFile = os.path.join(tempDir, "export-%s-%d" %(exportFormat, compress))
+                    with createStreamExporter(exportFile, COLUMNS, exportFormat, compress) as exporter:
+                        exporter.writeResult(self._getResult("d/a.txt", 5))
+                        position = exporter.checkpoint()
+                        exporter.writeResult(self._getResult("d/b.txt", 6))
+                    self.assertEqual(len(self._readExport(exportFile)), 4)
+
+                    with createStreamExporter(exportFile, COLUMNS, exportFormat, compress, position) as exporter:
+                        exporter.writeResult(self._getResult("d/c.txt", 7))
+                    self.assertEqual(self._readExport(exportFile), expected)
+
+# end class TestStreamExporter
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import contextlib      # for the redirect of stderr
+import io              # for the captured stderr
+import os              # for paths
+import tempfile        # for the test files
+import unittest        # for the tests
+import unittest.mock   # for the failing worker and the small blocks
+
+import crawler.crawler
+
+from crawler.benchmark import DEFAULT_PATTERN_FILE
+from crawler.crawler   import Crawler
+from crawler.exporter  import createStreamExporter
+from crawler.worker    import CrawlerWorker
+
+## --------------------------------------------------------------------------------------------------------------------
+
+COLUMNS = ['path', 'ioc', 'match', 'offset']
+
+# processBlock of the workers, it is replaced by the tests
+_processBlock = CrawlerWorker.processBlock
+
+## Processes a block, the block with the file c.txt fails like the block of an interrupted run
+def _interruptBlock(self, scanIdSrc, blockIdSrc, pathOffsetSrc, blockFiles):
+    if any(os.path.basename(path) == "c.txt" for path, start, end, printableOnly in blockFiles):
+        raise OSError("interrupted")
+    return _processBlock(self, scanIdSrc, blockIdSrc, pathOffsetSrc, blockFiles)
+
+## --------------------------------------------------------------------------------------------------------------------
+## Tests of the journal and of resumed runs
+class TestJournal(unittest.TestCase):
+
+    ## Runs a crawler with a csv export file
+    #  @return crawler
+    def _crawl(self, sourceSrc:str, exportFileSrc:str, journalFileSrc:str=None, resumeSrc:bool=False):
+        ioccrawler = Crawler(sourceSrc, 2, DEFAULT_PATTERN_FILE, False, COLUMNS, ['ip', 'domain'], False, 256, quietSrc=True,
+                             journalFileSrc=journalFileSrc, resumeSrc=resumeSrc)
+        exporter = createStreamExporter(exportFileSrc, COLUMNS, "csv", False, ioccrawler.getResumePosition())
+        try:
+            ioccrawler.do(exporter, False)
+        finally:
+            exporter.close()
+        return ioccrawler
+
+    ## Returns the sorted lines of an export file
+    def _readExport(self, exportFileSrc:str) -> list:
+        with open(exportFileSrc, encoding='utf-8') as f:
+            return sorted(f.read().splitlines())
+
+    ## A resumed run gives the same export as an uninterrupted run
+    #  - the first run does not finish the block of c.txt and writes rows after its last checkpoint
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as tempDir, \
+             unittest.mock.patch.object(crawler.crawler, "BLOCK_MAX_FILES", 1):
+            source = os.path.join(tempDir, "d")
+            os.makedirs(source)
+            for index, name in enumerate("abcdef"):
+                with open(os.path.join(source, name + ".txt"), "w") as f:
+                    f.write("connect 10.1.2.%d host%d.example.com\n" %(index, index) * (index + 1))
+
+            complete = self._crawl(source, os.path.join(tempDir, "complete.csv"))
+
+            exportFile  = os.path.join(tempDir, "resumed.csv")
+            journalFile = os.path.join(tempDir, "resumed.journal")
+            with unittest.mock.patch.object(CrawlerWorker, "processBlock", _interruptBlock), \
+                 contextlib.redirect_stderr(io.StringIO()):
+                interrupted = self._crawl(source, exportFile, journalFile)
+            self.assertEqual(len(interrupted.getFailedBlocks()), 1)
+            self.assertNotIn("c.txt", "".join(self._readExport(exportFile)))
+            with open(exportFile, "a", encoding='utf-8') as f:
+                f.write("%s|IP|10.9.9.9|0\n" %(os.path.join(source, "x.txt")))
+
+            resumed = self._crawl(source, exportFile, journalFile, True)
+            self.assertEqual(self._readExport(exportFile), self._readExport(os.path.join(tempDir, "complete.csv")))
+            self.assertEqual(resumed.getResultSummary(), complete.getResultSummary())
+            self.assertEqual(resumed.resumedFiles, 5)
+
+# end class TestJournal
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    unittest.main()
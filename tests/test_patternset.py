@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import os              # for the cache file
+import tempfile        # for the cache directory
+import unittest        # for the tests
+
+from crawler.benchmark  import DEFAULT_PATTERN_FILE
+from crawler.patternset import CrawlerPatternSet
+
+## --------------------------------------------------------------------------------------------------------------------
+## Tests of the cached pattern set
+class TestPatternSet(unittest.TestCase):
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            parsed = CrawlerPatternSet(DEFAULT_PATTERN_FILE, tempDir)
+            self.assertTrue(os.path.exists(parsed.cacheFile))
+            cached = CrawlerPatternSet(DEFAULT_PATTERN_FILE, tempDir)
+            self.assertFalse(cached.changed)
+            self.assertEqual(cached.getSections(), parsed.getSections())
+
+            sections = parsed.getSections()
+            parsedPatterns = parsed.getPatterns(sections)
+            cachedPatterns = cached.getPatterns(sections)
+            self.assertEqual(list(cachedPatterns), list(parsedPatterns))
+            for iocType in parsedPatterns:
+                for parsedPattern, cachedPattern in zip(parsedPatterns[iocType], cachedPatterns[iocType]):
+                    self.assertEqual((cachedPattern.pattern, cachedPattern.flags), (parsedPattern.pattern, parsedPattern.flags))
+                    self.assertEqual(cached.getAnchors(cachedPattern), parsed.getAnchors(parsedPattern))
+                    parsedWide = parsed.getWidePattern(parsedPattern)
+                    cachedWide = cached.getWidePattern(cachedPattern)
+                    self.assertEqual(cachedWide and cachedWide.pattern, parsedWide and parsedWide.pattern)
+
+    def test_inlineFlags(self):
+        patternSet = CrawlerPatternSet(DEFAULT_PATTERN_FILE, None)
+        entry   = patternSet._createEntry(rb'(?i)evil\.example', 0)
+        pattern = patternSet._compile(entry)
+        self.assertIsNotNone(pattern.search(b'EVIL.example'))
+        self.assertEqual(entry["anchors"], patternSet.getAnchors(pattern))
+
+# end class TestPatternSet
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    unittest.main()
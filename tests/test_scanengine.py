@@ -0,0 +1,40 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import re              # for pattern
+import unittest        # for the tests
+
+from crawler.benchmark  import createSyntheticBuffer, loadPatterns
+from crawler.scanengine import CrawlerScanEngine, getTrigger
+
+## --------------------------------------------------------------------------------------------------------------------
+## Tests of the pattern search
+class TestScanEngine(unittest.TestCase):
+
+    ## the patterns without a literal prefix are searched with a trigger
+    def test_triggers(self):
+        patterns = loadPatterns()
+        for ioc_type in ("IP", "DOMAIN", "MAIL"):
+            self.assertIsNotNone(getTrigger(patterns[ioc_type][0]), ioc_type)
+        for ioc_type in ("URL", "WIN_REGISTRY", "CRYPTO"):
+            self.assertIsNone(getTrigger(patterns[ioc_type][0]), ioc_type)
+        self.assertIsNone(getTrigger(re.compile(rb'\b[a-z]+\.[a-z]+')))
+        self.assertIsNone(getTrigger(re.compile(rb'[a-z]*')))
+
+    ## the engine finds the same matches as finditer, also in a part of the buffer
+    def test_sameMatches(self):
+        engine = CrawlerScanEngine(loadPatterns())
+        for kind in ("text", "dense", "binary"):
+            data = createSyntheticBuffer(256 * 1024, kind) + b'a.' * 4096 + b'1.2.3.4' + b'a-b@c.de' * 512
+            for start, end in ((0, len(data)), (1000, len(data) - 3000)):
+                for ioc_type, pattern, searchRes in engine.scan(data, start, end):
+                    self.assertEqual([item.span() for item in searchRes],
+                                     [item.span() for item in pattern.finditer(data, start, end)],
+                                     "%s %s" %(kind, ioc_type))
+
+# end class TestScanEngine
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    unittest.main()
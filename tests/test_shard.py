@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import os              # for paths
+import tempfile        # for the test files
+import unittest        # for the tests
+import unittest.mock   # for the small shard ranges
+
+import crawler.crawler
+
+from crawler.benchmark import DEFAULT_PATTERN_FILE
+from crawler.crawler   import Crawler
+from crawler.exporter  import createStreamExporter
+from crawler.shard     import mergeShards, writeShardSummary
+from crawler.worker    import READ_BUFFER_SIZE
+
+## --------------------------------------------------------------------------------------------------------------------
+
+COLUMNS = ['path', 'ioc', 'match', 'offset']
+
+## --------------------------------------------------------------------------------------------------------------------
+## Tests of the sharded crawl
+class TestShard(unittest.TestCase):
+
+    ## Runs a crawler with a csv export file
+    #  @param shardSrc - tuple (index, count) or None
+    #  @return crawler
+    def _crawl(self, sourceSrc:str, exportFileSrc:str, shardSrc:tuple=None):
+        ioccrawler = Crawler(sourceSrc, 2, DEFAULT_PATTERN_FILE, False, COLUMNS, ['ip', 'domain'], False, 256, quietSrc=True,
+                             shardSrc=shardSrc)
+        exporter = createStreamExporter(exportFileSrc, COLUMNS, "csv")
+        try:
+            ioccrawler.do(exporter, False)
+        finally:
+            exporter.close()
+        if shardSrc:
+            writeShardSummary(exportFileSrc, shardSrc, COLUMNS, ioccrawler.getResultSummary(),
+                              ioccrawler.getWhitelistRuleHits(), ioccrawler.getSettingsFingerprint())
+        return ioccrawler
+
+    ## Returns the sorted lines of an export file
+    def _readExport(self, exportFileSrc:str) -> list:
+        with open(exportFileSrc, encoding='utf-8') as f:
+            return sorted(f.read().splitlines())
+
+    ## The merge of the shards gives the same export and summary as a single crawl
+    #  - the large file is partitioned in ranges, the matches at the ends of the ranges are reported once
+    def test_merge(self):
+        shardCount = 3
+        with tempfile.TemporaryDirectory() as tempDir, \
+             unittest.mock.patch.object(crawler.crawler, "SHARD_RANGE_SIZE", 4 * READ_BUFFER_SIZE):
+            source = os.path.join(tempDir, "d")
+            os.makedirs(os.path.join(source, "sub"))
+            for index in range(12):
+                with open(os.path.join(source, "sub" if index % 2 else "", "%d.txt" %(index)), "w") as f:
+                    f.write("connect 10.1.2.%d host%d.example.com\n" %(index, index))
+            with open(os.path.join(source, "large.txt"), "w") as f:
+                for index in range(20000):
+                    f.write("line %d connect 10.1.%d.%d\n" %(index, index // 256 % 256, index % 256))
+
+            single = self._crawl(source, os.path.join(tempDir, "single.csv"))
+
+            shardFiles = [os.path.join(tempDir, "shard%d.csv" %(index)) for index in range(1, shardCount + 1)]
+            shards = [self._crawl(source, shardFile, (index, shardCount)) for index, shardFile in enumerate(shardFiles, 1)]
+            self.assertTrue(all(shard.submittedBlocks > 0 for shard in shards))
+
+            mergedFile = os.path.join(tempDir, "merged.csv")
+            summary, ruleHits = mergeShards(shardFiles, mergedFile, "csv")
+            self.assertEqual(self._readExport(mergedFile), self._readExport(os.path.join(tempDir, "single.csv")))
+            self.assertEqual(summary, single.getResultSummary())
+
+# end class TestShard
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    unittest.main()
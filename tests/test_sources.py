@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import bz2             # for bz2 samples
+import gzip            # for gzip samples
+import io              # for in memory files
+import lzma            # for xz samples
+import tarfile         # for tar samples
+import unittest        # for the tests
+
+from crawler.sources import iterSources, ARCHIVE_SEPARATOR
+
+## --------------------------------------------------------------------------------------------------------------------
+
+# decompressed data of the samples, small enough to fit in the read buffer of the decompressed stream
+SAMPLE_DATA = b'connect 10.1.2.3 http://evil.example.com/x\n'
+
+## Reads all streams of a sample
+#  @return list of tuples (virtual path, data)
+def readSources(dataSrc:bytes, pathSrc:str) -> list:
+    return [(path, stream.read()) for path, stream in iterSources(io.BufferedReader(io.BytesIO(dataSrc)), pathSrc)]
+
+## --------------------------------------------------------------------------------------------------------------------
+## Tests of the archive and compressed streams
+class TestSources(unittest.TestCase):
+
+    ## a small gzip payload was lost, the header check seeked back through the compressed input
+    def test_tinyGzip(self):
+        self.assertEqual(readSources(gzip.compress(SAMPLE_DATA), "log.gz"),
+                         [("log.gz" + ARCHIVE_SEPARATOR + "log", SAMPLE_DATA)])
+
+    def test_tinyBz2AndXz(self):
+        self.assertEqual(readSources(bz2.compress(SAMPLE_DATA), "log.bz2"),
+                         [("log.bz2" + ARCHIVE_SEPARATOR + "log", SAMPLE_DATA)])
+        self.assertEqual(readSources(lzma.compress(SAMPLE_DATA), "log.xz"),
+                         [("log.xz" + ARCHIVE_SEPARATOR + "log", SAMPLE_DATA)])
+
+    def test_tinyTarGzip(self):
+        tarData = io.BytesIO()
+        with tarfile.open(fileobj=tarData, mode='w') as archive:
+            info = tarfile.TarInfo("var/log/x")
+            info.size = len(SAMPLE_DATA)
+            archive.addfile(info, io.BytesIO(SAMPLE_DATA))
+        self.assertEqual(readSources(gzip.compress(tarData.getvalue()), "logs.tar.gz"),
+                         [("logs.tar.gz" + ARCHIVE_SEPARATOR + "var/log/x", SAMPLE_DATA)])
+
+# end class TestSources
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import os              # for paths and random data
+import tempfile        # for the test files
+import unittest        # for the tests
+
+from crawler.benchmark  import DEFAULT_PATTERN_FILE
+from crawler.crawler    import Crawler
+from crawler.crawlererr import CrawlerConfigError
+from crawler.triage     import getContentClass, parseTriagePolicy, CrawlerPrintableRuns
+
+## --------------------------------------------------------------------------------------------------------------------
+## Tests of the content triage
+class TestTriage(unittest.TestCase):
+
+    def test_contentClass(self):
+        self.assertEqual(getContentClass(b"connect 10.1.2.3\n"), "text")
+        self.assertEqual(getContentClass("bücher.example\n".encode("utf-8")), "text")
+        self.assertEqual(getContentClass(b"\x89PNG\r\n\x1a\n" + bytes(100)), "media")
+        self.assertEqual(getContentClass(b"MZ\x90\x00"), "executable")
+        self.assertEqual(getContentClass(bytes(4096)), "sparse")
+        self.assertEqual(getContentClass(os.urandom(4096)), "random")
+        self.assertEqual(getContentClass(b"\x01\x00\x02\x00" * 1024), "binary")
+
+    def test_policy(self):
+        self.assertEqual(parseTriagePolicy(["Media=skip", " binary = scan"]), {"media": "skip", "binary": "scan"})
+        for rule in ("media", "movie=skip", "media=drop"):
+            with self.assertRaises(CrawlerConfigError):
+                parseTriagePolicy([rule])
+
+    ## A match over the separator of two printable runs is no match
+    def test_printableRuns(self):
+        buffer = b"\x01\x02at 10.1.2.3\x00\xff10.1.\x0012.4"
+        runs   = CrawlerPrintableRuns(buffer, 0, len(buffer))
+        self.assertEqual(runs.data, b"at 10.1.2.3\x0010.1.\x0012.4")
+        start = runs.data.index(b"10.1.2.3")
+        self.assertEqual(runs.getMatchPositions(start, start + 8), (5, 13))
+        self.assertEqual(runs.getPosition(5), start)
+        start = runs.data.index(b"10.1.\x00")
+        self.assertIsNone(runs.getMatchPositions(start, start + 10))
+
+    ## The printable runs give the matches of a full search, the skipped files are not searched
+    def test_crawl(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            source = os.path.join(tempDir, "d")
+            os.makedirs(source)
+            with open(os.path.join(source, "a.txt"), "w") as f:
+                f.write("connect 10.1.2.3\n")
+            with open(os.path.join(source, "b.bin"), "wb") as f:
+                f.write(b"\x01\x00\x02\x00" * 1024 + b"\x00connect 10.1.2.4\x00\x01\x0210.1.2.5\xff\x00" + b"\x03\x00" * 512)
+            with open(os.path.join(source, "c.png"), "wb") as f:
+                f.write(b"\x89PNG\r\n\x1a\n" + b"\x00" * 64 + b"10.1.2.6\x00")
+
+            results = {}
+            for name, policy in (("full", None), ("triage", {}), ("skip", {"media": "skip"})):
+                ioccrawler = Crawler(source, 2, DEFAULT_PATTERN_FILE, False, ['path', 'ioc', 'match', 'offset'], ['ip'],
+                                     False, 256, quietSrc=True, triageSrc=policy)
+                ioccrawler.do(keepResultsSrc=True)
+                results[name] = sorted((os.path.basename(cvo.path), match, offsets) for cvo in ioccrawler.resultList
+                                       for ioc, match, offsets in cvo.iterMatches())
+                if policy is not None:
+                    self.assertEqual([x[:2] for x in ioccrawler.getTriageSummary()],
+                                     [("text", 1), ("media", 1), ("binary", 1)])
+
+            self.assertEqual(results["triage"], results["full"])
+            self.assertEqual(results["skip"], [x for x in results["full"] if x[0] != "c.png"])
+            self.assertIn("c.png", [x[0] for x in results["full"]])
+
+# end class TestTriage
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import csv             # for the export file
+import os              # for paths
+import tempfile        # for the test files
+import unittest        # for the tests
+import unittest.mock   # for the small chunks
+
+import crawler.crawler
+
+from crawler.benchmark import DEFAULT_PATTERN_FILE
+from crawler.crawler   import Crawler
+from crawler.exporter  import createStreamExporter
+from crawler.worker    import READ_BUFFER_SIZE
+
+## --------------------------------------------------------------------------------------------------------------------
+
+COLUMNS = ['path', 'ioc', 'match', 'offset']
+
+## --------------------------------------------------------------------------------------------------------------------
+## Tests of the unique mode
+class TestUnique(unittest.TestCase):
+
+    ## The distinct matches have the count of matches, the count of files and the first location of the matches
+    #  - the large file is split into ranges, it is counted once
+    def test_uniqueMatches(self):
+        with tempfile.TemporaryDirectory() as tempDir, \
+             unittest.mock.patch.object(crawler.crawler, "BLOCK_MIN_SIZE", READ_BUFFER_SIZE), \
+             unittest.mock.patch.object(crawler.crawler, "CHUNK_MIN_SIZE", READ_BUFFER_SIZE):
+            source = os.path.join(tempDir, "d")
+            os.makedirs(source)
+            for index in range(6):
+                with open(os.path.join(source, "%d.txt" %(index)), "w") as f:
+                    f.write("connect 10.1.2.%d 10.1.2.%d host%d.example.com\n" %(index % 3, index % 2, index % 4) * (index + 1))
+            with open(os.path.join(source, "large.txt"), "w") as f:
+                for index in range(20000):
+                    f.write("line %d connect 10.1.2.%d\n" %(index, index % 5))
+
+            ioccrawler = Crawler(source, 4, DEFAULT_PATTERN_FILE, False, COLUMNS, ['ip', 'domain'], False, 256, quietSrc=True)
+            ioccrawler.do(keepResultsSrc=True)
+            expected = {}
+            for cvo in ioccrawler.resultList:
+                for iocType, matchString, offsets in cvo.iterMatches():
+                    entry = expected.setdefault((iocType, matchString), [0, set(), []])
+                    entry[0] += len(offsets)
+                    entry[1].add(cvo.path)
+                    entry[2].extend((cvo.path, offset) for offset in offsets)
+            expected = {key: (count, len(paths), min(locations)) for key, (count, paths, locations) in expected.items()}
+
+            exportFile = os.path.join(tempDir, "unique.csv")
+            uniqueCrawler = Crawler(source, 4, DEFAULT_PATTERN_FILE, False, COLUMNS, ['ip', 'domain'], False, 256,
+                                    quietSrc=True, uniqueSrc=True)
+            exporter = createStreamExporter(exportFile, COLUMNS + ["count", "files"], "csv")
+            try:
+                uniqueCrawler.do(exporter, True)
+            finally:
+                exporter.close()
+
+            self.assertGreater(uniqueCrawler.submittedBlocks, 2)
+            self.assertEqual({(uvo.iocType, uvo.match): (uvo.count, uvo.fileCount, (uvo.path, uvo.offset))
+                              for uvo in uniqueCrawler.uniqueList}, expected)
+            with open(exportFile, newline='', encoding='utf-8') as f:
+                rows = list(csv.reader(f, delimiter='|'))
+            self.assertEqual(rows[0], COLUMNS + ["count", "files"])
+            self.assertEqual({(ioc, match): (int(count), int(files), (path, int(offset)))
+                              for path, ioc, match, offset, count, files in rows[1:]}, expected)
+            self.assertEqual(uniqueCrawler.getResultSummary(), ioccrawler.getResultSummary())
+
+# end class TestUnique
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    unittest.main()
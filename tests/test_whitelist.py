@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import os              # for paths
+import tempfile        # for the test files
+import unittest        # for the tests
+
+from crawler.crawlererr import CrawlerConfigError
+from crawler.worker     import loadWhitelist
+
+## --------------------------------------------------------------------------------------------------------------------
+## Loads a whitelist file with the content
+def readWhitelist(contentSrc:str):
+    with tempfile.TemporaryDirectory() as tempDir:
+        whitelistFile = os.path.join(tempDir, "whitelist.ini")
+        with open(whitelistFile, "w") as f:
+            f.write(contentSrc)
+        return loadWhitelist(whitelistFile)
+
+## --------------------------------------------------------------------------------------------------------------------
+## Tests of the whitelist
+class TestWhitelist(unittest.TestCase):
+
+    ## global flags at the begin of a regex entry are valid in the combined regex
+    def test_inlineFlags(self):
+        whitelist = readWhitelist("[DOMAIN]\nvendors : re:(?i)microsoft\n  re:\\.example\\.com$$\n")
+        self.assertTrue(whitelist.containsMatch("update.MicroSoft.com"))
+        self.assertTrue(whitelist.containsMatch("www.example.com"))
+        self.assertFalse(whitelist.containsMatch("www.EXAMPLE.COM"))
+        self.assertFalse(whitelist.containsMatch("evil.com"))
+
+    ## invalid entries are reported while loading
+    def test_invalidEntries(self):
+        for entry in ("re:micro(?i)soft", "re:(a", "re:(a)\\1"):
+            with self.assertRaises(CrawlerConfigError, msg=entry):
+                readWhitelist("[DOMAIN]\nvendors : %s\n" %(entry))
+
+# end class TestWhitelist
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import os              # for paths
+import re              # for pattern
+import tempfile        # for the test files
+import timeit          # for run time
+import unittest        # for the tests
+
+from crawler.crawler    import Crawler
+from crawler.scanengine import getTrigger
+
+## --------------------------------------------------------------------------------------------------------------------
+
+# pattern with an exponential run time on the data, the pattern is searched with a trigger
+SLOW_PATTERN = rb'([ab]+)+\.cd[a-z]+!'
+SLOW_DATA    = b'x ' + b'ab' * 12 + b'.cde1 \n'
+
+## --------------------------------------------------------------------------------------------------------------------
+## Tests of the worker
+class TestWorker(unittest.TestCase):
+
+    ## the watchdog stops a pattern which is searched with a trigger
+    def test_watchdogWithTrigger(self):
+        self.assertIsNotNone(getTrigger(re.compile(SLOW_PATTERN)))
+        with tempfile.TemporaryDirectory() as tempDir:
+            patternFile = os.path.join(tempDir, "pattern.ini")
+            with open(patternFile, "w") as f:
+                f.write("[DOMAIN]\nslow : %s\n" %(SLOW_PATTERN.decode()))
+            os.mkdir(os.path.join(tempDir, "data"))
+            with open(os.path.join(tempDir, "data", "slow.txt"), "wb") as f:
+                f.write(SLOW_DATA)
+
+            crawler = Crawler(os.path.join(tempDir, "data"), 1, patternFile, False, ['path', 'ioc', 'match', 'offset'],
+                              ['domain'], False, 256, quietSrc=True, patternTimeoutSrc=0.05)
+            start = timeit.default_timer()
+            crawler.do()
+            self.assertLess(timeit.default_timer() - start, 2.5)
+            self.assertEqual([(os.path.basename(path), name) for path, name, seconds in crawler.getPatternTimeouts()],
+                             [("slow.txt", "DOMAIN[0]")])
+
+# end class TestWorker
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    unittest.main()
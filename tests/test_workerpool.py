@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+
+## --------------------------------------------------------------------------------------------------------------------
+
+import contextlib      # for the redirect of stderr
+import io              # for the captured stderr
+import os              # for paths, exit of the worker
+import tempfile        # for the test files
+import unittest        # for the tests
+import unittest.mock   # for the failing worker
+
+from crawler.benchmark import DEFAULT_PATTERN_FILE
+from crawler.crawler   import Crawler
+from crawler.worker    import CrawlerWorker
+
+## --------------------------------------------------------------------------------------------------------------------
+## Raises an error while processing a block
+def _failBlock(self, scanIdSrc, blockIdSrc, pathOffsetSrc, blockFiles):
+    raise OSError("disk error")
+
+## Stops the worker process while processing a block
+def _crashBlock(self, scanIdSrc, blockIdSrc, pathOffsetSrc, blockFiles):
+    os._exit(3)
+
+## --------------------------------------------------------------------------------------------------------------------
+## Tests of the failed and lost blocks of the worker pool
+class TestWorkerPool(unittest.TestCase):
+
+    ## Runs a crawler with a replaced processBlock of the workers
+    #  @return tuple (crawler, stderr output)
+    def _crawl(self, processBlockSrc) -> tuple:
+        with tempfile.TemporaryDirectory() as tempDir:
+            with open(os.path.join(tempDir, "a.txt"), "w") as f:
+                f.write("connect 10.1.2.3\n")
+            crawler = Crawler(tempDir, 1, DEFAULT_PATTERN_FILE, False, ['path', 'ioc', 'match', 'offset'], ['ip'], False, 256,
+                              quietSrc=True)
+            stderr = io.StringIO()
+            with unittest.mock.patch.object(CrawlerWorker, "processBlock", processBlockSrc), \
+                 contextlib.redirect_stderr(stderr):
+                crawler.do()
+            return crawler, stderr.getvalue()
+
+    def test_failedBlock(self):
+        crawler, stderr = self._crawl(_failBlock)
+        self.assertEqual([(error, [os.path.basename(x) for x in files]) for blockId, error, files in crawler.getFailedBlocks()],
+                         [("OSError('disk error')", ["a.txt"])])
+        self.assertIn("a.txt", stderr)
+        self.assertEqual(crawler.getResultSummary()["Files of failed blocks"], 1)
+
+    def test_lostBlock(self):
+        crawler, stderr = self._crawl(_crashBlock)
+        self.assertEqual([[os.path.basename(x) for x in files] for blockId, error, files in crawler.getFailedBlocks()],
+                         [["a.txt"]])
+        self.assertIn("exited with code 3", stderr)
+        self.assertEqual(crawler.getResultSummary()["Failed blocks (results incomplete)"], 1)
+
+# end class TestWorkerPool
+
+## --------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    unittest.main()